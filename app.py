@@ -7,7 +7,15 @@ import io
 import traceback
 from datetime import datetime
 import uuid
-from database import get_database_manager
+import zlib
+from database import get_database_manager, get_data_version
+from product_index import ProductIndex
+from order_report import build_order_details
+from search_index import BarcodeIndex, NGramIndex
+from catalog_filter import compile_filters
+from inventory_snapshot import InventorySnapshot
+from shared_snapshot import SharedSnapshot
+from product_import import stream_products, BarcodeMerger, ERROR_COLUMNS, DIFF_COLUMNS, MAX_REPORTED_ERRORS
 import locale
 import warnings
 import sys
@@ -32,6 +40,19 @@ try:
 except:
     pass
 
+# 写入诊断模式：开启后保存前后重新读取整表核对数量（仅排查问题时使用，会明显拖慢保存）
+WRITE_DEBUG = os.getenv('WRITE_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+# 商品目录查询方式：sql=在数据库中筛选和分页（默认），memory=加载全部商品后在进程内筛选
+CATALOG_QUERY_MODE = os.getenv('CATALOG_QUERY_MODE', 'sql').lower()
+
+# 商品列表展示方式：rows=每个商品一行控件（默认），table=整页商品放在一个可编辑表格中，元素少、重新运行更快
+PRODUCT_GRID_MODE = os.getenv('PRODUCT_GRID_MODE', 'rows').lower()
+
+# 商品页筛选选项 -> 查询条件取值
+STOCK_FILTER_OPTIONS = {"全部": None, "有库存": "in_stock", "库存充足(>10)": "plenty", "库存紧张(1-10)": "low", "缺货": "out"}
+LIMIT_FILTER_OPTIONS = {"全部": None, "限购商品": "limited", "不限购商品": "unlimited"}
+
 # 全局错误处理 - 完全静默DOM错误
 def global_exception_handler(exc_type, exc_value, exc_traceback):
     """全局异常处理器，静默处理DOM错误"""
@@ -60,7 +81,7 @@ import io
 import traceback
 from datetime import datetime
 import uuid
-from database import get_database_manager
+from database import get_database_manager, get_data_version
 import locale
 import warnings
 import sys
@@ -136,7 +157,7 @@ def optimized_file_upload_handler(existing_inventory):
     st.write("### 📦 批量导入商品 - 优化版")
     
     # 文件上传限制提示
-    st.info("💡 支持：系统已优化，可处理数千行数据，文件大小建议不超过5MB")
+    st.info("💡 支持：文件按块读取并逐块写入，大文件也不会一次性载入内存")
     
     # 使用更稳定的文件上传器
     uploaded_file = st.file_uploader(
@@ -155,187 +176,323 @@ def optimized_file_upload_handler(existing_inventory):
         }
         st.json(file_details)
         
-        # 文件大小检查
-        if uploaded_file.size > 5 * 1024 * 1024:  # 5MB限制
-            st.error("❌ 文件过大！请使用小于5MB的文件")
-            return
+        import_mode = st.radio(
+            "导入方式",
+            ["追加为新商品", "按条码合并"],
+            horizontal=True,
+            help="按条码合并：条码已存在的商品更新价格、库存和限购，其余作为新商品导入",
+            key="import_mode"
+        )
+        merge = import_mode == "按条码合并"
         
         # 处理按钮
+        if merge and st.button("🔍 预览差异（不写入）"):
+            process_file_safely(uploaded_file, existing_inventory, merge=True, dry_run=True)
         if st.button("🚀 开始处理文件", type="primary"):
-            process_file_safely(uploaded_file, existing_inventory)
+            process_file_safely(uploaded_file, existing_inventory, merge=merge)
+        
+        show_import_errors()
+
+def show_import_errors():
+    """显示最近一次导入的错误报告"""
+    errors = st.session_state.get('import_errors')
+    if errors:
+        error_count = st.session_state.get('import_error_count', len(errors))
+        with st.expander(f"⚠️ {error_count} 处数据有误，对应行未导入"):
+            if error_count > len(errors):
+                st.caption(f"仅显示前 {len(errors)} 条")
+            st.dataframe(pd.DataFrame(errors, columns=ERROR_COLUMNS), hide_index=True, use_container_width=True)
+
+def show_merge_summary(merger, total_rows, error_count, dry_run):
+    """显示按条码合并的新增、更新、无变化统计和字段差异"""
+    st.write("### 🔍 差异预览" if dry_run else "### 📊 合并摘要")
+    summary = merger.summary
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("文件行数", total_rows)
+    with col2:
+        st.metric("新增", summary['inserted'])
+    with col3:
+        st.metric("更新", summary['updated'])
+    with col4:
+        st.metric("无变化", summary['unchanged'])
+    with col5:
+        st.metric("错误", error_count)
+    if merger.changes:
+        with st.expander(f"📝 字段变化（{len(merger.changes)} 处）", expanded=dry_run):
+            st.dataframe(pd.DataFrame(merger.changes, columns=DIFF_COLUMNS), hide_index=True, use_container_width=True)
 
-def process_file_safely(uploaded_file, existing_inventory):
-    """安全地处理上传的文件"""
+def process_file_safely(uploaded_file, existing_inventory, merge=False, dry_run=False):
+    """安全地处理上传的文件：按块读取、校验并写入数据库
+    
+    merge 为 True 时按条码合并到现有商品；dry_run 为 True 时只统计差异，不写入。
+    """
+    total_rows = 0
+    valid_count = 0
+    imported_count = 0
     try:
         # 显示处理进度
         progress_bar = st.progress(0)
         status_text = st.empty()
+        status_text.text("📖 正在分块读取文件...")
+        
+        errors = []
+        error_count = 0
+        existing_ids = [product['id'] for product in existing_inventory]
+        merger = BarcodeMerger(existing_inventory) if merge else None
+        uploaded_file.seek(0)
+        for products, chunk_errors, row_count, progress in stream_products(uploaded_file, uploaded_file.name, existing_ids):
+            total_rows += row_count
+            valid_count += len(products)
+            error_count += len(chunk_errors)
+            # 错误报告只保留前若干条，避免超大文件占满内存
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            
+            if merger is not None:
+                products = merger.merge(products)
+            
+            # 每块转换后立即写入，不在内存中累积整个文件
+            if products and not dry_run:
+                imported_count += db.save_inventory(products)
+            
+            if progress is not None:
+                progress_bar.progress(min(99, int(progress * 100)))
+            if dry_run:
+                status_text.text(f"🔍 已检查 {total_rows} 行")
+            else:
+                status_text.text(f"💾 已处理 {total_rows} 行，已导入 {imported_count} 条")
         
-        # 步骤1: 读取文件
-        status_text.text("📖 正在读取文件...")
-        progress_bar.progress(10)
-        
-        # 读取文件数据
-        if uploaded_file.name.endswith('.xlsx'):
-            df = pd.read_excel(uploaded_file)
-        else:
-            df = pd.read_csv(uploaded_file, encoding='utf-8')
-        
-        progress_bar.progress(25)
+        # 错误报告保存在会话中，导入后刷新页面仍可查看
+        st.session_state.import_errors = errors
+        st.session_state.import_error_count = error_count
         
-        # 数据验证
-        if len(df) == 0:
+        if total_rows == 0:
             st.error("❌ 文件为空")
             return
-            
-        # 移除行数限制，但提供性能提示
-        if len(df) > 1000:
-            st.info(f"📊 检测到 {len(df)} 行数据，系统将使用批量处理模式以确保最佳性能")
-        elif len(df) > 500:
-            st.info(f"📊 检测到 {len(df)} 行数据，正在优化处理...")
-        
-        status_text.text(f"✅ 文件读取成功，共 {len(df)} 行数据")
-        progress_bar.progress(40)
-        
-        # 步骤2: 数据处理
-        status_text.text("🔄 正在处理数据...")
-        processed_data = []
         
-        for index, row in df.iterrows():
-            try:
-                # 处理单行数据
-                product_data = process_single_row(row)
-                if product_data:
-                    processed_data.append(product_data)
-                
-                # 动态调整进度更新频率
-                update_freq = max(1, len(df) // 50)  # 最多更新50次进度
-                if index % update_freq == 0 or index == len(df) - 1:
-                    progress = 40 + int((index / len(df)) * 40)
-                    progress_bar.progress(progress)
-                    
-            except Exception as e:
-                st.warning(f"第 {index + 1} 行处理失败: {str(e)}")
-        
-        progress_bar.progress(80)
-        status_text.text(f"📊 数据处理完成，有效数据 {len(processed_data)} 条")
-        
-        if len(processed_data) == 0:
+        if valid_count == 0:
             st.error("❌ 没有有效的数据可以导入")
             return
         
-        # 步骤3: 保存到数据库
-        status_text.text("💾 正在保存到数据库...")
-        progress_bar.progress(85)
-        
-        try:
-            # 合并所有数据并一次性保存（更高效）
-            combined_inventory = existing_inventory + processed_data
-            save_inventory(combined_inventory)
-            
-            progress_bar.progress(95)
-            status_text.text("✅ 数据保存完成")
-            
-        except Exception as e:
-            st.error(f"❌ 保存数据失败: {str(e)}")
-            return
+        progress_bar.progress(100)
+        if merger is not None:
+            show_merge_summary(merger, total_rows, error_count, dry_run)
+            if dry_run:
+                status_text.text("🔍 差异预览完成，未写入数据")
+                return
+            if imported_count == 0:
+                status_text.text("✅ 所有商品均无变化")
+                st.info("💡 所有商品均无变化，无需更新")
+                return
+            message = f"✅ 新增 {merger.summary['inserted']} 条，更新 {merger.summary['updated']} 条商品数据！"
+        else:
+            # 显示导入摘要
+            st.write("### 📊 导入摘要")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("文件行数", total_rows)
+            with col2:
+                st.metric("成功导入", imported_count)
+            with col3:
+                st.metric("错误", error_count)
+            message = f"✅ 成功导入 {imported_count} 条商品数据！"
         
         # 完成
-        progress_bar.progress(100)
         status_text.text("🎉 导入完成！")
-        
-        st.success(f"✅ 成功导入 {len(processed_data)} 条商品数据！")
+        st.success(message)
         st.balloons()
-        
-        # 显示导入摘要
-        st.write("### 📊 导入摘要")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("文件行数", len(df))
-        with col2:
-            st.metric("有效数据", len(processed_data))
-        with col3:
-            st.metric("成功导入", len(processed_data))
             
-        # 使用DOM安全的重新加载
-        dom_safe_rerun(0.8)
+        set_notice('page', 'success', message)
+        schedule_rerun()
             
     except Exception as e:
         st.error(f"❌ 文件处理失败: {str(e)}")
+        if imported_count:
+            # 已写入的块不会回滚
+            st.warning(f"⚠️ 出错前已处理 {total_rows} 行，其中 {imported_count} 条已导入")
         st.info("💡 建议：")
         st.write("- 检查文件格式是否正确")
-        st.write("- 尝试使用更小的文件")
         st.write("- 确保文件编码为UTF-8")
 
-def process_single_row(row):
-    """处理单行数据"""
+# 获取进程内共享的数据库管理器（所有会话复用同一个连接池）
+db = get_database_manager()
+
+# 缓存数据获取函数 - 优化性能和内存
+# 缓存以数据版本号为键：写入后版本号递增，下一次读取立即加载新数据，
+# 不需要等待过期，也不需要清空其他缓存。
+# 商品、订单、用户各在进程内保留一份只读快照，所有会话直接引用（不再逐会话反序列化副本），
+# 快照中的记录不可修改，需要修改时先复制
+@st.cache_resource(show_spinner=False)
+def get_shared_snapshots():
+    """进程内共享的只读数据快照"""
+    return {
+        "products": SharedSnapshot(get_inventory, key="id"),
+        "orders": SharedSnapshot(get_orders, key="order_id"),
+        "users": SharedSnapshot(get_users, key="username"),
+    }
+
+def load_inventory_version(products_version):
+    """按商品数据版本获取共享的只读库存数据"""
+    return get_shared_snapshots()["products"].get(products_version)
+
+def load_orders_version(orders_version):
+    """按订单数据版本获取共享的只读订单数据"""
+    return get_shared_snapshots()["orders"].get(orders_version)
+
+def load_users_version(users_version):
+    """按用户数据版本获取共享的只读用户数据"""
+    return get_shared_snapshots()["users"].get(users_version)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_product_index_version(products_version):
+    """按商品数据版本构建商品索引（所有会话共享，只读）"""
+    return ProductIndex(load_inventory_version(products_version), version=products_version)
+
+def get_product_index():
+    """获取当前商品数据版本的商品索引"""
     try:
-        # 提取数据
-        name = str(row.get("商品名称", row.get("name", ""))).strip()
-        if not name or name == 'nan':
-            return None
-            
-        price = row.get("价格", row.get("price", 0))
-        stock = row.get("库存", row.get("stock", 0))
-        description = str(row.get("描述", row.get("description", ""))).strip()
-        barcode = str(row.get("条码", row.get("code", row.get("barcode", "")))).strip()
-        purchase_limit = row.get("限购数量", row.get("limit", row.get("purchase_limit", 0)))
-        
-        # 数据清理
-        price = float(price) if pd.notna(price) and price != "" else 0.0
-        stock = int(stock) if pd.notna(stock) and stock != "" else 0
-        purchase_limit = int(purchase_limit) if pd.notna(purchase_limit) and purchase_limit != "" else 0
-        
-        # 生成条码
-        if not barcode or barcode == 'nan':
-            barcode = f"{name[:3]}{str(uuid.uuid4())[:6]}"
-        
-        return {
-            "id": str(uuid.uuid4())[:8],
-            "name": name,
-            "price": price,
-            "stock": stock,
-            "description": description,
-            "barcode": barcode,
-            "purchase_limit": purchase_limit,
-            "created_at": datetime.now().isoformat()
-        }
-        
-    except Exception as e:
-        raise ValueError(f"数据处理错误: {str(e)}")
+        return load_product_index_version(get_data_version("products"))
+    except Exception:
+        return ProductIndex([])
 
-# 初始化数据库管理器
-db = get_database_manager()
+@st.cache_resource(show_spinner=False)
+def get_search_index():
+    """进程内共享的商品名称/描述搜索索引，随商品数据版本增量同步"""
+    return NGramIndex()
 
-# 获取数据库管理器
-@st.cache_resource
-def get_db():
-    return get_database_manager()
+def search_product_ids(query, product_index=None):
+    """按名称和描述关键词（空格分隔，需全部包含）搜索商品，返回按匹配质量排序的商品ID
+    
+    传入 product_index 时按该索引的数据版本同步，结果与调用方使用的商品数据一致。
+    """
+    if product_index is None:
+        product_index = get_product_index()
+    search_index = get_search_index()
+    search_index.sync(product_index.products, version=product_index.version)
+    return search_index.search(query)
+
+@st.cache_resource(show_spinner=False)
+def get_barcode_index():
+    """进程内共享的条码索引，随商品数据版本增量同步"""
+    return BarcodeIndex()
+
+def lookup_barcode_ids(query, product_index=None):
+    """按条码筛选商品：按条码前缀匹配（与SQL模式一致），完全相同的条码排在最前，返回商品ID"""
+    if product_index is None:
+        product_index = get_product_index()
+    barcode_index = get_barcode_index()
+    barcode_index.sync(product_index.products, version=product_index.version)
+    return barcode_index.lookup(query)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_order_details_version(orders_version, products_version):
+    """按订单和商品数据版本缓存展开后的订单明细表（所有会话共享，只读）"""
+    return build_order_details(load_orders_version(orders_version),
+                               load_product_index_version(products_version).products)
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_product_stats_version(products_version):
+    """按商品数据版本缓存商品总数和价格范围"""
+    return db.get_product_stats()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_catalog_page_version(products_version, filters, page, page_size):
+    """按商品数据版本缓存商品目录的筛选分页结果（各会话相同的查询共用）"""
+    return db.query_products(filters, page=page, page_size=page_size)
+
+def get_product_stats():
+    """获取商品总数和价格范围"""
+    try:
+        return load_product_stats_version(get_data_version("products"))
+    except Exception:
+        return {"count": 0, "min_price": 0, "max_price": 0}
 
-db = get_db()
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_order_stats_version(orders_version):
+    """按订单数据版本缓存订单数量和金额汇总"""
+    return db.get_order_stats()
+
+def get_order_stats():
+    """获取订单数量和金额汇总"""
+    try:
+        return load_order_stats_version(get_data_version("orders"))
+    except Exception:
+        return {"count": 0, "original_amount": 0, "discount_savings": 0,
+                "total_amount": 0, "cash_amount": 0, "voucher_amount": 0}
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_user_count_version(users_version):
+    """按用户数据版本缓存用户总数"""
+    return db.count_users()
+
+def get_user_count():
+    """获取用户总数"""
+    try:
+        return load_user_count_version(get_data_version("users"))
+    except Exception:
+        return 0
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_inventory_snapshot_version(products_version):
+    """按商品数据版本构建列式商品快照，行顺序与商品索引一致（所有会话共享，只读）"""
+    return InventorySnapshot(load_product_index_version(products_version).products, version=products_version)
+
+def get_inventory_snapshot():
+    """获取当前商品数据版本的列式商品快照"""
+    try:
+        return load_inventory_snapshot_version(get_data_version("products"))
+    except Exception:
+        return InventorySnapshot([])
+
+def compile_catalog_filters(filters, product_index=None):
+    """编译商品筛选条件，名称和条码通过进程内索引查找
+    
+    传入 product_index 时名称和条码索引按同一份商品数据同步，避免两次读取之间数据版本变化导致ID对不上。
+    """
+    return compile_filters(
+        filters,
+        name_search=lambda query: search_product_ids(query, product_index),
+        barcode_lookup=lambda query: lookup_barcode_ids(query, product_index),
+    )
+
+def filter_catalog_in_memory(product_index, filters, page, page_size):
+    """在进程内筛选并分页商品，返回结构与 db.query_products 相同（有关键词时按匹配质量排序）"""
+    table = load_inventory_snapshot_version(product_index.version)
+    indices = compile_catalog_filters(filters, product_index).indices(table)
+    total_pages = max(1, (len(indices) + page_size - 1) // page_size)
+    page = min(max(1, page), total_pages)
+    return {
+        "items": [product_index.products[i] for i in indices[(page - 1) * page_size:page * page_size]],
+        "total": len(indices),
+        "page": page,
+        "total_pages": total_pages
+    }
+
+def query_catalog(filters, page, page_size):
+    """按 CATALOG_QUERY_MODE 查询商品目录的一页"""
+    products_version = get_data_version("products")
+    if CATALOG_QUERY_MODE == 'memory':
+        return filter_catalog_in_memory(load_product_index_version(products_version), filters, page, page_size)
+    return load_catalog_page_version(products_version, filters, page, page_size)
 
-# 缓存数据获取函数 - 优化性能和内存
-@st.cache_data(ttl=20, max_entries=2, show_spinner=False)  # 缩短TTL，限制缓存条目
 def get_cached_inventory():
     """获取缓存的库存数据"""
     try:
-        return get_inventory()
+        return load_inventory_version(get_data_version("products"))
     except Exception:
         return []
 
-@st.cache_data(ttl=15, max_entries=2, show_spinner=False)  # 订单变化频繁，TTL更短
 def get_cached_orders():
     """获取缓存的订单数据"""
     try:
-        return get_orders()
+        return load_orders_version(get_data_version("orders"))
     except Exception:
         return []
 
-@st.cache_data(ttl=60, max_entries=2, show_spinner=False)  # 用户变化较少
 def get_cached_users():
     """获取缓存的用户数据"""
     try:
-        return get_users()
+        return load_users_version(get_data_version("users"))
     except Exception:
         return []
 
@@ -389,48 +546,33 @@ def is_render_environment():
 
 # 内存清理函数 - 防止Render内存泄漏
 def clear_memory_cache():
-    """清理缓存和释放内存"""
+    """释放内存（数据缓存按版本号失效且条目数有限，不再整体清空）"""
     try:
-        # 清除Streamlit缓存
-        st.cache_data.clear()
         # 强制垃圾回收
         import gc
         gc.collect()
     except:
         pass
 
-# DOM安全的重新加载函数 - 专门处理复杂操作
-def dom_safe_rerun(delay=0.2):
-    """DOM安全的重新加载函数，专门处理复杂操作"""
-    try:
-        with completely_silent():
-            # 标记DOM正在忙碌，防止并发操作
-            st.session_state._dom_busy = True
-            
-            # 给DOM足够时间完成当前操作
-            time.sleep(delay)
-            
-            # 清理可能导致冲突的状态
-            if hasattr(st.session_state, '_dom_busy'):
-                del st.session_state._dom_busy
-                
-            # 多重保护的重新加载
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                with contextlib.redirect_stderr(io.StringIO()):
-                    with contextlib.redirect_stdout(io.StringIO()):
-                        st.rerun()
-                        
-    except Exception as e:
-        # 任何错误都静默处理，包括DOM错误
-        error_msg = str(e).lower()
-        dom_keywords = ['dom', 'removechild', 'node', 'notfounderror', 'failed to execute', 'javascript']
-        if any(keyword in error_msg for keyword in dom_keywords):
-            # DOM错误完全静默
-            pass
+# 非阻塞的重新运行调度
+# 交互处理完成后不再 sleep 等待前端（原来每次 0.15-0.8 秒，期间会话线程被占住）：
+# 需要在下次运行中显示的提示（成功消息、气球动画）先登记到会话状态，然后立即结束本次运行并重新运行一次。
+# 合并只发生在提示队列里：本次运行中登记的所有提示都在下一次运行中一起显示。
+def set_notice(region, level, message=None):
+    """登记一条提示，在指定区域下次运行时显示（level 为提示函数名，如 success/error/balloons）"""
+    st.session_state.setdefault(f'_notice_{region}', []).append((level, message))
+
+def show_notices(region):
+    """显示并清除区域的提示"""
+    for level, message in st.session_state.pop(f'_notice_{region}', []):
+        if message is None:
+            getattr(st, level)()
         else:
-            # 其他错误也静默处理
-            st.session_state._needs_refresh = True
+            getattr(st, level)(message)
+
+def schedule_rerun():
+    """立即重新运行整个应用（即 st.rerun()，本身不合并多次调用），之前登记的页面提示在重新运行后显示"""
+    st.rerun()
 
 # 隐藏错误的上下文管理器
 
@@ -544,13 +686,29 @@ def get_inventory():
     return db.load_inventory()
 
 def save_inventory(inventory_data):
-    """保存库存数据 - 增强版本"""
+    """保存库存数据，按数据库返回的写入行数核对结果"""
+    if WRITE_DEBUG:
+        return save_inventory_debug(inventory_data)
+    try:
+        # 同一ID只会写入一次，没有ID的商品各自生成新ID
+        expected_count = len({item['id'] for item in inventory_data if item.get('id')}) + \
+            sum(1 for item in inventory_data if not item.get('id'))
+        written_count = db.save_inventory(inventory_data)
+        if written_count == expected_count:
+            st.success(f"✅ 已保存 {written_count} 条商品")
+        else:
+            st.error(f"❌ 数据保存验证失败! 期望写入 {expected_count} 条，实际写入 {written_count} 条")
+    except Exception as e:
+        st.error(f"❌ 数据库保存异常: {str(e)}")
+        st.code(traceback.format_exc())
+
+def save_inventory_debug(inventory_data):
+    """保存库存数据 - 诊断版本（WRITE_DEBUG开启时使用）"""
     try:
         # 显示保存前的状态
         st.info(f"🔄 正在保存 {len(inventory_data)} 条商品数据...")
         
         # 检查数据库环境
-        import os
         if 'DATABASE_URL' in os.environ:
             st.write("📊 生产环境: PostgreSQL")
         else:
@@ -561,12 +719,10 @@ def save_inventory(inventory_data):
         st.write(f"保存前商品数量: {before_count}")
         
         # 执行保存
-        db.save_inventory(inventory_data)
-        st.write("✅ 数据库保存操作已执行")
-        
-        # 立即验证保存结果
-        time.sleep(0.5)  # 等待数据库写入完成
+        written_count = db.save_inventory(inventory_data)
+        st.write(f"✅ 数据库保存操作已执行，写入 {written_count} 行")
         
+        # 重新读取整表核对
         saved_data = db.load_inventory()
         after_count = len(saved_data)
         st.write(f"保存后商品数量: {after_count}")
@@ -583,12 +739,31 @@ def save_inventory(inventory_data):
         st.error(f"❌ 数据库保存异常: {str(e)}")
         st.write("🔍 错误详情:")
         st.code(str(e))
-        import traceback
         st.write("🐛 完整错误堆栈:")
         st.code(traceback.format_exc())
 
+def apply_product_changes(changes):
+    """按变更集保存商品修改（只写入变化的商品和字段）"""
+    return db.apply_product_changes(changes)
+
+def place_order(order_data, items):
+    """原子下单：同一事务中扣减库存并保存订单，返回库存不足明细"""
+    return db.place_order(order_data, items)
+
 def add_order(order_data):
-    """添加订单 - 增强版本"""
+    """添加订单，按写入的明细行数核对结果"""
+    if WRITE_DEBUG:
+        return add_order_debug(order_data)
+    try:
+        written_items = db.add_order(order_data)
+        if written_items != len(order_data.get('items', [])):
+            st.error(f"❌ 订单保存验证失败! 明细写入 {written_items} 条，期望 {len(order_data.get('items', []))} 条")
+    except Exception as e:
+        st.error(f"❌ 订单保存异常: {str(e)}")
+        st.code(str(e))
+
+def add_order_debug(order_data):
+    """添加订单 - 诊断版本（WRITE_DEBUG开启时使用）"""
     try:
         # 显示保存前状态
         before_count = len(db.load_orders())
@@ -599,9 +774,7 @@ def add_order(order_data):
         db.add_order(order_data)
         st.write("✅ 订单保存操作已执行")
         
-        # 验证保存结果
-        time.sleep(0.5)
-        
+        # 重新读取整表核对
         saved_orders = db.load_orders()
         after_count = len(saved_orders)
         st.write(f"保存后订单数量: {after_count}")
@@ -640,18 +813,24 @@ def get_orders():
     """获取订单数据"""
     return db.load_orders() if db else []
 
+def get_user_purchase_map(user_name):
+    """获取用户的 {商品ID: 历史购买数量}，同一订单数据版本内只查询一次"""
+    orders_version = get_data_version("orders")
+    cached = st.session_state.get('_purchase_map')
+    if cached and cached['user_name'] == user_name and cached['version'] == orders_version:
+        return cached['quantities']
+    
+    quantities = db.get_user_purchase_quantities(user_name)
+    st.session_state['_purchase_map'] = {
+        'user_name': user_name,
+        'version': orders_version,
+        'quantities': quantities
+    }
+    return quantities
+
 def get_user_purchase_history(user_name, product_id):
     """获取用户对特定商品的历史购买数量"""
-    orders = get_orders()
-    total_purchased = 0
-    
-    for order in orders:
-        if order.get('user_name') == user_name:
-            for item in order.get('items', []):
-                if item.get('product_id') == product_id:
-                    total_purchased += item.get('quantity', 0)
-    
-    return total_purchased
+    return get_user_purchase_map(user_name).get(product_id, 0)
 
 # 检查限购限制（包含历史购买记录）
 def check_purchase_limit(user_name, product_id, current_cart_quantity, new_quantity, purchase_limit):
@@ -746,16 +925,7 @@ def authenticate_user(name):
 # 检查用户历史购买数量
 def get_user_purchase_history(user_name, product_id):
     """获取用户对特定商品的历史购买数量"""
-    orders = load_data(ORDERS_FILE)
-    total_purchased = 0
-    
-    for order in orders:
-        if order.get('user_name') == user_name:
-            for item in order.get('items', []):
-                if item.get('product_id') == product_id:
-                    total_purchased += item.get('quantity', 0)
-    
-    return total_purchased
+    return get_user_purchase_map(user_name).get(product_id, 0)
 
 # 检查限购限制（包含历史购买记录）
 def check_purchase_limit(user_name, product_id, current_cart_quantity, new_quantity, purchase_limit):
@@ -809,9 +979,8 @@ def login_page():
                             st.session_state.login_time = datetime.now().isoformat()
                             st.session_state.login_attempts = 0
                             
-                            st.success(f"✅ 欢迎, {user['name']}!")
-                            # 使用DOM安全的重新加载
-                            dom_safe_rerun(0.5)
+                            set_notice('page', 'success', f"✅ 欢迎, {user['name']}!")
+                            schedule_rerun()
                         else:
                             st.session_state.login_attempts += 1
                             st.error("❌ 登录失败，请重试")
@@ -833,43 +1002,53 @@ def admin_page():
     """管理员页面"""
     st.title("📊 管理员控制面板")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["库存管理", "订单管理", "用户管理", "🔍 数据库检查"])
+    # 概览统计卡片：来自按数据版本缓存的汇总查询，不加载商品、订单和用户行
+    product_stats = get_product_stats()
+    order_stats = get_order_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("商品总数", product_stats['count'])
+    with col2:
+        st.metric("订单总数", order_stats['count'])
+    with col3:
+        st.metric("订单应收总额", f"¥{order_stats['total_amount']:.2f}")
+    with col4:
+        st.metric("用户总数", get_user_count())
+    
+    # 只运行当前选中的面板：切换选项卡时重新运行，其他面板的查询不执行
+    tab1, tab2, tab3, tab4 = st.tabs(["库存管理", "订单管理", "用户管理", "🔍 数据库检查"],
+                                     key="admin_tab", on_change="rerun")
     
     with tab1:
-        inventory_management()
+        if tab1.open:
+            inventory_management()
     
     with tab2:
-        order_management()
+        if tab2.open:
+            order_management()
     
     with tab3:
-        user_management()
+        if tab3.open:
+            user_management()
     
     with tab4:
-        database_status_check()
+        if tab4.open:
+            database_status_check()
 
 # 库存管理
+@st.fragment(key="inventory_management")  # 面板内的操作只重新运行本面板
 def inventory_management():
     """库存管理"""
     
-    inventory = get_inventory()  # 使用数据库方法
+    inventory = get_cached_inventory()  # 按数据版本缓存，写入后立即刷新
     
     # 如果有库存数据，计算销售数据并补充字段
     if inventory:
-        # 计算销售数据
-        orders = get_orders()  # 使用数据库方法
-        sales_data = {}
-        
-        # 统计每个商品的销售数量
-        for order in orders:
-            for item in order.get('items', []):
-                product_id = item.get('product_id')
-                quantity = item.get('quantity', 0)
-                if product_id in sales_data:
-                    sales_data[product_id] += quantity
-                else:
-                    sales_data[product_id] = quantity
+        # 统计每个商品的销售数量（订单明细表按商品汇总）
+        sales_data = db.get_product_sales()
         
-        # 为每个商品添加销售数量和确保所有必需字段存在
+        # 为每个商品添加销售数量和确保所有必需字段存在（共享快照只读，先复制）
+        inventory = [dict(product) for product in inventory]
         for product in inventory:
             product['sold'] = sales_data.get(product['id'], 0)
             # 确保必需字段存在
@@ -887,22 +1066,20 @@ def inventory_management():
             if st.session_state.admin_name_filter is None:
                 st.session_state.admin_name_filter = ''
         
-        # 统计信息
+        # 统计信息（在列式快照上汇总）
+        snapshot = get_inventory_snapshot()
         col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
             st.metric("商品总数", len(inventory))
         with col2:
-            total_stock = sum(item['stock'] for item in inventory)
-            st.metric("总库存", total_stock)
+            st.metric("总库存", snapshot.total_stock())
         with col3:
             total_sold = sum(item['sold'] for item in inventory)
             st.metric("总销售量", total_sold)
         with col4:
-            total_value = sum(item['price'] * item['stock'] for item in inventory)
-            st.metric("总价值", f"¥{total_value:.2f}")
+            st.metric("总价值", f"¥{snapshot.total_value():.2f}")
         with col5:
-            low_stock = len([item for item in inventory if item['stock'] < 5])
-            st.metric("低库存商品", low_stock)
+            st.metric("低库存商品", snapshot.low_stock_count(5))
         
         # 商品筛选功能
         with st.expander("🔍 商品筛选", expanded=False):
@@ -921,9 +1098,7 @@ def inventory_management():
                 )
             with filter_col2:
                 st.write("💰 价格范围")
-                prices = [item['price'] for item in inventory]
-                min_price = min(prices) if prices else 0
-                max_price = max(prices) if prices else 1000
+                min_price, max_price = snapshot.price_range() if len(snapshot) else (0, 1000)
                 # 确保最大值大于最小值，避免slider错误
                 if max_price <= min_price:
                     max_price = min_price + 100
@@ -944,36 +1119,24 @@ def inventory_management():
                 )
                 barcode_filter = st.text_input(
                     "📊 搜索条码",
-                    placeholder="输入条码",
+                    placeholder="扫码或输入条码前几位",
                     key="admin_barcode_filter",
                     value=st.session_state.get('admin_barcode_filter', '')
                 )
 
-        # 应用筛选条件
-        filtered_inventory = inventory.copy()
-        if 'admin_name_filter' in st.session_state and st.session_state['admin_name_filter']:
-            filtered_inventory = [item for item in filtered_inventory if st.session_state['admin_name_filter'].lower() in item['name'].lower()]
-        if 'admin_barcode_filter' in st.session_state and st.session_state['admin_barcode_filter']:
-            filtered_inventory = [item for item in filtered_inventory if st.session_state['admin_barcode_filter'] in item.get('barcode', '')]
-        if 'admin_price_range' in st.session_state:
-            price_min, price_max = st.session_state['admin_price_range']
-            filtered_inventory = [item for item in filtered_inventory if price_min <= item['price'] <= price_max]
-        if 'admin_stock_filter' in st.session_state:
-            stock_filter = st.session_state['admin_stock_filter']
-            if stock_filter == "有库存":
-                filtered_inventory = [item for item in filtered_inventory if item['stock'] > 0]
-            elif stock_filter == "库存充足(>10)":
-                filtered_inventory = [item for item in filtered_inventory if item['stock'] > 10]
-            elif stock_filter == "库存紧张(1-10)":
-                filtered_inventory = [item for item in filtered_inventory if 1 <= item['stock'] <= 10]
-            elif stock_filter == "缺货":
-                filtered_inventory = [item for item in filtered_inventory if item['stock'] == 0]
-        if 'admin_limit_filter' in st.session_state:
-            limit_filter = st.session_state['admin_limit_filter']
-            if limit_filter == "限购商品":
-                filtered_inventory = [item for item in filtered_inventory if item.get('purchase_limit', 0) > 0]
-            elif limit_filter == "不限购商品":
-                filtered_inventory = [item for item in filtered_inventory if item.get('purchase_limit', 0) == 0]
+        # 应用筛选条件（与购买页共用筛选引擎）
+        admin_price_range = st.session_state.get('admin_price_range')
+        admin_filters = {
+            'name': st.session_state.get('admin_name_filter') or '',
+            'barcode': st.session_state.get('admin_barcode_filter') or '',
+            'price_min': admin_price_range[0] if admin_price_range else None,
+            'price_max': admin_price_range[1] if admin_price_range else None,
+            'stock': STOCK_FILTER_OPTIONS.get(st.session_state.get('admin_stock_filter', '全部')),
+            'limit': LIMIT_FILTER_OPTIONS.get(st.session_state.get('admin_limit_filter', '全部')),
+        }
+        matched_ids = snapshot.ids[compile_catalog_filters(admin_filters).indices(snapshot)]
+        inventory_by_id = {item['id']: item for item in inventory}
+        filtered_inventory = [inventory_by_id[product_id] for product_id in matched_ids if product_id in inventory_by_id]
 
         # 显示商品表格（如果筛选后有数据）
         if filtered_inventory:
@@ -1036,24 +1199,25 @@ def inventory_management():
                 key="inventory_editor"
             )
             
-            # 检查是否有修改并保存
-            changed = False
+            # 检查是否有修改，只收集变化的商品和字段
+            changes = {}
             for i, row in edited_df.iterrows():
-                if i < len(inventory):
-                    new_limit = int(row['限购数量']) if pd.notna(row['限购数量']) else 0
-                    new_price = float(row['价格']) if pd.notna(row['价格']) else 0
-                    new_stock = int(row['库存']) if pd.notna(row['库存']) else 0
-                    
-                    if (inventory[i]['purchase_limit'] != new_limit or
-                        inventory[i]['price'] != new_price or
-                        inventory[i]['stock'] != new_stock):
-                        inventory[i]['purchase_limit'] = new_limit
-                        inventory[i]['price'] = new_price
-                        inventory[i]['stock'] = new_stock
-                        changed = True
-                        
-            if changed:
-                save_inventory(inventory)
+                if i < len(filtered_inventory):
+                    product = filtered_inventory[i]
+                    new_values = {
+                        'purchase_limit': int(row['限购数量']) if pd.notna(row['限购数量']) else 0,
+                        'price': float(row['价格']) if pd.notna(row['价格']) else 0,
+                        'stock': int(row['库存']) if pd.notna(row['库存']) else 0
+                    }
+                    product_changes = {
+                        field: value for field, value in new_values.items()
+                        if product.get(field) != value
+                    }
+                    if product_changes:
+                        changes[product['id']] = product_changes
+
+            if changes:
+                apply_product_changes(changes)
                 st.success("✅ 商品信息已更新！")
                 st.rerun()
         else:
@@ -1124,95 +1288,34 @@ def inventory_management():
             st.rerun()
 
 # 订单管理 - 优化版本
+@st.fragment(key="order_management")  # 面板内的操作只重新运行本面板
 def order_management():
     """订单管理"""
     st.subheader("📋 订单管理")
     
-    # 使用缓存数据减少加载时间
-    orders = get_cached_orders()
+    # 统计数据由数据库汇总（按订单数据版本缓存），不逐条累加订单
+    order_stats = get_order_stats()
     
-    if orders:
-        # 计算统计数据 - 兼容新旧订单格式
-        total_cash = sum(order.get('cash_amount', 0) for order in orders)
-        total_voucher = sum(order.get('voucher_amount', 0) for order in orders)
-        total_original = sum(order.get('original_amount', order.get('total_amount', 0)) for order in orders)
-        total_final = sum(order.get('total_amount', 0) for order in orders)
-        total_savings = sum(order.get('discount_savings', 0) for order in orders)
-        
+    if order_stats['count']:
         # 订单统计
         col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
-            st.metric("总订单数", len(orders))
+            st.metric("总订单数", order_stats['count'])
         with col2:
-            st.metric("商品原价总额", f"¥{total_original:.2f}")
+            st.metric("商品原价总额", f"¥{order_stats['original_amount']:.2f}")
         with col3:
-            st.metric("折扣优惠总额", f"¥{total_savings:.2f}")
+            st.metric("折扣优惠总额", f"¥{order_stats['discount_savings']:.2f}")
         with col4:
-            st.metric("现金收款", f"¥{total_cash:.2f}")
+            st.metric("现金收款", f"¥{order_stats['cash_amount']:.2f}")
         with col5:
-            st.metric("内购券收款", f"¥{total_voucher:.2f}")
-        
-        # 处理订单数据，展开商品信息
-        order_details = []
-        inventory = load_data(INVENTORY_FILE)  # 加载商品数据来获取条码
+            st.metric("内购券收款", f"¥{order_stats['voucher_amount']:.2f}")
         
-        for order in orders:
-            items = order.get('items', [])
-            for item in items:
-                # 根据商品ID查找条码
-                product_id = item.get('product_id', 'N/A')
-                product_name = item.get('product_name', 'N/A')
-                
-                # 从商品库存中查找条码
-                barcode = 'N/A'
-                for product in inventory:
-                    if product.get('id') == product_id:
-                        barcode = product.get('barcode', product_id)
-                        break
-                
-                # 获取订单折扣信息（兼容新旧订单）
-                order_original = order.get('original_amount', order.get('total_amount', 0))
-                order_discount = order.get('discount_savings', 0)
-                order_discount_text = order.get('discount_text', '无折扣')
-                order_final = order.get('total_amount', 0)
-                order_cash = order.get('cash_amount', 0)
-                order_voucher = order.get('voucher_amount', 0)
-                
-                # 处理多付显示（无找零）
-                total_paid = order_cash + order_voucher
-                if total_paid > order_final:
-                    overpay = total_paid - order_final
-                    overpay_display = f"¥{overpay:.2f} (不设找零)"
-                else:
-                    overpay_display = "¥0.00"
-                
-                order_detail = {
-                    '订单ID': order.get('order_id', 'N/A'),
-                    '用户姓名': order.get('user_name', 'N/A'),
-                    '条码': barcode,
-                    '商品名称': product_name,
-                    '单价': f"¥{item.get('price', 0):.2f}",
-                    '数量': item.get('quantity', 0),
-                    '小计': f"¥{item.get('price', 0) * item.get('quantity', 0):.2f}",
-                    '折扣优惠': order_discount_text,
-                    '优惠金额': f"¥{order_discount:.2f}",
-                    '应付金额': f"¥{order_final:.2f}",
-                    '现金支付': f"¥{order_cash:.2f}",
-                    '内购券支付': f"¥{order_voucher:.2f}",
-                    '多付金额': overpay_display,
-                    '支付方式': order.get('payment_method', '现金支付'),
-                    '订单时间': order.get('order_time', 'N/A')
-                }
-                order_details.append(order_detail)
+        # 展开订单商品信息（按数据版本缓存）
+        df = load_order_details_version(get_data_version("orders"), get_data_version("products"))
         
         # 显示订单详情
-        if order_details:
+        if not df.empty:
             st.write("### 📊 订单详情")
-            df = pd.DataFrame(order_details)
-            
-            # 格式化时间显示
-            df['订单时间'] = pd.to_datetime(df['订单时间']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            
             st.dataframe(df, use_container_width=True)
             
             # 导出订单
@@ -1243,6 +1346,7 @@ def order_management():
         st.info("暂无订单数据")
 
 # 用户管理
+@st.fragment(key="user_management")  # 面板内的操作只重新运行本面板
 def user_management():
     """用户管理"""
     st.subheader("👥 用户管理")
@@ -1305,12 +1409,222 @@ def user_page():
     with tab3:
         user_order_history()
 
+def purchasable_quantity(product, purchase_map):
+    """当前用户本次最多可购买的数量（受库存和限购剩余数量限制）"""
+    max_qty = max(0, product['stock'])
+    purchase_limit = product.get('purchase_limit', 0)
+    if purchase_limit > 0:
+        remaining = max(0, purchase_limit - purchase_map.get(product['id'], 0))
+        max_qty = min(max_qty, remaining)
+    return max_qty
+
+def reset_cart_inputs():
+    """清掉购物车数量输入框的旧值，下次显示时取购物车中的数量"""
+    for key in [key for key in st.session_state if str(key).startswith('cart_qty_')]:
+        del st.session_state[key]
+
+def add_to_cart(product, quantity):
+    """把商品加入购物车，已在购物车中的商品累加数量"""
+    reset_cart_inputs()
+    for cart_item in st.session_state.cart:
+        if cart_item['product_id'] == product['id']:
+            cart_item['quantity'] += quantity
+            return
+    st.session_state.cart.append({
+        'product_id': product['id'],
+        'product_name': product['name'],
+        'price': product['price'],
+        'quantity': quantity
+    })
+
+# 购物车同时显示在商品列表和购物车两个片段中：购物车变化时在控件回调里只重新运行这两个片段，
+# 两处的件数保持一致，订单历史和其他区域不重新运行
+CART_FRAGMENTS = ["product_list", "cart_panel"]
+
+def add_to_cart_clicked(product, quantity_key):
+    """逐行模式“加入购物车”按钮回调"""
+    quantity = st.session_state.get(quantity_key, 1)
+    add_to_cart(product, quantity)
+    set_notice('product_list', 'success', f"✅ 已添加 {quantity} 件 {product['name']} 到购物车")
+    st.rerun(CART_FRAGMENTS)
+
+def add_selected_clicked(grid_key, rows):
+    """表格模式“加入选中商品”按钮回调，rows 为本页 [(商品, 可购数量)]"""
+    edited_rows = st.session_state.get(grid_key, {}).get('edited_rows', {})
+    added, rejected = [], []
+    for row, changes in sorted(edited_rows.items(), key=lambda change: int(change[0])):
+        quantity = int(changes.get('数量') or 0)
+        if quantity <= 0:
+            continue
+        product, available = rows[int(row)]
+        if quantity > available:
+            rejected.append(f"{product['name']}（最多可购{available}件）")
+            continue
+        add_to_cart(product, quantity)
+        added.append(f"{quantity} 件 {product['name']}")
+    if rejected:
+        set_notice('product_list', 'error', "❌ 超出可购数量，未加入：" + "、".join(rejected))
+    if added:
+        # 更换表格键清空已填写的数量
+        st.session_state['product_grid_nonce'] = st.session_state.get('product_grid_nonce', 0) + 1
+        set_notice('product_list', 'success', "✅ 已添加 " + "、".join(added) + " 到购物车")
+    st.rerun(CART_FRAGMENTS)
+
+def cart_quantity_changed(index, purchase_limit):
+    """购物车数量输入框回调"""
+    cart = st.session_state.cart
+    item = cart[index]
+    new_quantity = st.session_state[f"cart_qty_{index}"]
+    if purchase_limit > 0:
+        current_cart_quantity = sum(cart_item['quantity'] for j, cart_item in enumerate(cart)
+                                    if j != index and cart_item['product_id'] == item['product_id'])
+        can_purchase, error_msg = check_purchase_limit(
+            st.session_state.user['name'],
+            item['product_id'],
+            current_cart_quantity,
+            new_quantity,
+            purchase_limit
+        )
+        if not can_purchase:
+            set_notice('cart_panel', 'error', error_msg)
+            st.session_state[f"cart_qty_{index}"] = item['quantity']
+            st.rerun("cart_panel")
+    item['quantity'] = new_quantity
+    st.rerun(CART_FRAGMENTS)
+
+def remove_cart_item(index):
+    """购物车删除按钮回调"""
+    del st.session_state.cart[index]
+    # 数量输入框按位置命名，删除后清掉旧值，让后面的商品显示自己的数量
+    reset_cart_inputs()
+    st.rerun(CART_FRAGMENTS)
+
+def limit_text(product, purchase_map):
+    """限购状态的简短文字"""
+    purchase_limit = product.get('purchase_limit', 0)
+    if purchase_limit <= 0:
+        return "不限购"
+    historical_quantity = purchase_map.get(product['id'], 0)
+    if historical_quantity <= 0:
+        return f"限购{purchase_limit}件"
+    if historical_quantity >= purchase_limit:
+        return f"限购{purchase_limit}件 / 已达上限"
+    return f"限购{purchase_limit}件 / 已购{historical_quantity}件"
+
+def render_product_rows(current_page_items, purchase_map):
+    """逐行商品列表：每个商品一行控件（数量输入框+加入购物车按钮）"""
+    # 表格表头（带排序功能）
+    col1, col2, col3, col4, col5, col6, col7 = st.columns([1.5, 2.5, 1, 1, 1, 1, 1])
+    with col1:
+        st.write("**条码**")
+    with col2:
+        st.write("**产品名称**")
+    with col3:
+        st.write("**库存**")
+    with col4:
+        st.write("**价格**")
+    with col5:
+        st.write("**限购数量**")
+    with col6:
+        st.write("**数量**")
+    with col7:
+        st.write("**加入购物车**")
+    st.divider()
+
+    # 为每个商品添加数量选择和加入购物车按钮
+    for i, product in enumerate(current_page_items):
+        col1, col2, col3, col4, col5, col6, col7 = st.columns([1.5, 2.5, 1, 1, 1, 1, 1])
+        with col1:
+            st.write(product.get('barcode', 'N/A'))
+        with col2:
+            st.write(product['name'])
+        with col3:
+            stock_color = "red" if product['stock'] == 0 else "green" if product['stock'] > 10 else "orange"
+            st.write(f":{stock_color}[{product['stock']}]")
+        with col4:
+            st.write(f"¥{product['price']:.2f}")
+        with col5:
+            purchase_limit = product.get('purchase_limit', 0)
+            if purchase_limit > 0:
+                historical_quantity = purchase_map.get(product['id'], 0)
+                if historical_quantity > 0:
+                    remaining = max(0, purchase_limit - historical_quantity)
+                    if remaining > 0:
+                        st.write(f":orange[限购{purchase_limit}件]\n:blue[已购{historical_quantity}件]\n:green[可购{remaining}件]")
+                    else:
+                        st.write(f":orange[限购{purchase_limit}件]\n:red[已购{historical_quantity}件]\n:red[已达上限]")
+                else:
+                    st.write(f":orange[{purchase_limit}件]")
+            else:
+                st.write(":green[不限购]")
+        max_qty = purchasable_quantity(product, purchase_map)
+        with col6:
+            if product['stock'] > 0:
+                if max_qty > 0:
+                    st.number_input(
+                        "",
+                        min_value=1,
+                        max_value=max_qty,
+                        value=1,
+                        key=f"qty_{product['id']}",
+                        label_visibility="collapsed"
+                    )
+                else:
+                    st.write(":red[已达上限]")
+            else:
+                st.write(":red[缺货]")
+        with col7:
+            if product['stock'] > 0:
+                if max_qty > 0:
+                    st.button("🛒", key=f"add_to_cart_{product['id']}",
+                              on_click=add_to_cart_clicked, args=(product, f"qty_{product['id']}"))
+                else:
+                    st.button("🔒", key=f"limit_reached_{product['id']}", disabled=True)
+            else:
+                st.button("❌", key=f"out_of_stock_{product['id']}", disabled=True)
+
+def render_product_table(current_page_items, purchase_map):
+    """表格商品列表：整页商品放在一个可编辑表格中，填写数量后统一加入购物车"""
+    product_ids = [product['id'] for product in current_page_items]
+    available = [purchasable_quantity(product, purchase_map) for product in current_page_items]
+    table = pd.DataFrame({
+        '条码': [product.get('barcode') or 'N/A' for product in current_page_items],
+        '产品名称': [product['name'] for product in current_page_items],
+        '库存': [product['stock'] for product in current_page_items],
+        '价格': [product['price'] for product in current_page_items],
+        '限购': [limit_text(product, purchase_map) for product in current_page_items],
+        '可购': available,
+        '数量': 0,
+    }, index=product_ids)
+    
+    # 表格的编辑状态按行号保存，键随本页商品变化，翻页或筛选后不会把数量带到别的商品上；
+    # 加入购物车后更换键清空已填写的数量
+    grid_nonce = st.session_state.get('product_grid_nonce', 0)
+    grid_key = f"product_grid_{zlib.crc32(','.join(product_ids).encode())}_{grid_nonce}"
+    edited = st.data_editor(
+        table,
+        key=grid_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=['条码', '产品名称', '库存', '价格', '限购', '可购'],
+        column_config={
+            '价格': st.column_config.NumberColumn(format="¥%.2f"),
+            '数量': st.column_config.NumberColumn(min_value=0, step=1, help="填写购买数量，0表示不购买"),
+        },
+    )
+    
+    selected = edited[edited['数量'] > 0]
+    st.button(f"🛒 加入选中商品（{len(selected)} 种）", key="add_selected_to_cart",
+              disabled=selected.empty, type="primary",
+              on_click=add_selected_clicked, args=(grid_key, list(zip(current_page_items, available))))
+
+@st.fragment(key="product_list")  # 筛选、翻页、改数量只重新运行商品列表
 def shopping_page():
     """商品购买页面 - 优化版本"""
-    # 使用缓存数据
-    inventory = get_cached_inventory()
+    # 只读取商品总数和价格范围，商品行按筛选条件分页查询
+    product_stats = get_product_stats()
     
-    if not inventory:
+    if not product_stats['count']:
         st.info("暂无商品可购买")
         return
     
@@ -1318,14 +1632,17 @@ def shopping_page():
     if 'cart' not in st.session_state:
         st.session_state.cart = []
     
+    # 当前用户的历史购买数量，本次渲染中所有限购商品共用
+    purchase_map = get_user_purchase_map(st.session_state.user['name'])
+    
     # 商品筛选功能
     st.subheader("🛍️ 商品列表")
+    show_notices('product_list')
     
     # 筛选器
     with st.expander("🔍 商品筛选", expanded=False):
-        prices = [item['price'] for item in inventory]
-        min_price = min(prices) if prices else 0
-        max_price = max(prices) if prices else 1000
+        min_price = product_stats['min_price']
+        max_price = product_stats['max_price']
 
         # 初始化 session_state
         if 'name_filter' not in st.session_state:
@@ -1373,224 +1690,66 @@ def shopping_page():
             )
             st.text_input(
                 "📊 搜索条码",
-                placeholder="输入条码",
+                placeholder="扫码或输入条码前几位",
                 key="barcode_filter",
                 value=st.session_state['barcode_filter']
             )
         # 不再提供重置按钮，用户可手动清空筛选条件
     
-    # 应用筛选条件
-    filtered_inventory = inventory.copy()
-    # 名称筛选
-    name_filter = st.session_state.get('name_filter', '')
-    if name_filter:
-        filtered_inventory = [
-            item for item in filtered_inventory 
-            if name_filter.lower() in item['name'].lower()
-        ]
-    # 条码筛选
-    barcode_filter = st.session_state.get('barcode_filter', '')
-    if barcode_filter:
-        filtered_inventory = [
-            item for item in filtered_inventory 
-            if barcode_filter in item.get('barcode', '')
-        ]
-    # 价格范围筛选
+    # 汇总筛选条件
     price_range = st.session_state.get('price_range', (float(min_price), float(max_price)))
-    filtered_inventory = [
-        item for item in filtered_inventory 
-        if price_range[0] <= item['price'] <= price_range[1]
-    ]
-    # 库存状态筛选
-    stock_filter = st.session_state.get('stock_filter', '全部')
-    if stock_filter == "有库存":
-        filtered_inventory = [item for item in filtered_inventory if item['stock'] > 0]
-    elif stock_filter == "库存充足(>10)":
-        filtered_inventory = [item for item in filtered_inventory if item['stock'] > 10]
-    elif stock_filter == "库存紧张(1-10)":
-        filtered_inventory = [item for item in filtered_inventory if 1 <= item['stock'] <= 10]
-    elif stock_filter == "缺货":
-        filtered_inventory = [item for item in filtered_inventory if item['stock'] == 0]
-    # 限购状态筛选
-    limit_filter = st.session_state.get('limit_filter', '全部')
-    if limit_filter == "限购商品":
-        filtered_inventory = [
-            item for item in filtered_inventory 
-            if item.get('purchase_limit', 0) > 0
-        ]
-    elif limit_filter == "不限购商品":
-        filtered_inventory = [
-            item for item in filtered_inventory 
-            if item.get('purchase_limit', 0) == 0
-        ]
+    filters = {
+        'name': st.session_state.get('name_filter', ''),
+        'barcode': st.session_state.get('barcode_filter', ''),
+        'price_min': price_range[0],
+        'price_max': price_range[1],
+        'stock': STOCK_FILTER_OPTIONS.get(st.session_state.get('stock_filter', '全部')),
+        'limit': LIMIT_FILTER_OPTIONS.get(st.session_state.get('limit_filter', '全部')),
+    }
+    
+    # 分页参数
+    PAGE_SIZE = 100
+    if 'user_goods_page' not in st.session_state:
+        st.session_state['user_goods_page'] = 1
+    catalog_page = query_catalog(filters, st.session_state['user_goods_page'], PAGE_SIZE)
     
     # 显示筛选结果统计
-    total_count = len(inventory)
-    filtered_count = len(filtered_inventory)
+    total_count = product_stats['count']
+    total_items = catalog_page['total']
     
-    if filtered_count != total_count:
-        st.info(f"📊 筛选结果：显示 {filtered_count} 件商品（共 {total_count} 件）")
+    if total_items != total_count:
+        st.info(f"📊 筛选结果：显示 {total_items} 件商品（共 {total_count} 件）")
     
-    if not filtered_inventory:
+    if not total_items:
         st.warning("😔 没有找到符合筛选条件的商品，请调整筛选条件")
         return
     
-    # 分页参数
-    PAGE_SIZE = 100
-    total_items = len(filtered_inventory)
-    total_pages = (total_items + PAGE_SIZE - 1) // PAGE_SIZE
-    if 'user_goods_page' not in st.session_state:
-        st.session_state['user_goods_page'] = 1
-    page = st.session_state['user_goods_page']
-    if page < 1:
-        page = 1
-    if page > total_pages:
-        page = total_pages
+    # 页码超出范围时查询结果已回到最后一页
+    page = catalog_page['page']
+    total_pages = catalog_page['total_pages']
     st.session_state['user_goods_page'] = page
-    start_idx = (page - 1) * PAGE_SIZE
-    end_idx = start_idx + PAGE_SIZE
-    current_page_items = filtered_inventory[start_idx:end_idx]
+    current_page_items = catalog_page['items']
 
     st.write(f"### 🛍️ 商品列表  (第 {page} / {total_pages} 页，共 {total_items} 条)")
 
-    # 表格表头（带排序功能）
-    col1, col2, col3, col4, col5, col6, col7 = st.columns([1.5, 2.5, 1, 1, 1, 1, 1])
-    with col1:
-        st.write("**条码**")
-    with col2:
-        st.write("**产品名称**")
-    with col3:
-        st.write("**库存**")
-    with col4:
-        st.write("**价格**")
-    with col5:
-        st.write("**限购数量**")
-    with col6:
-        st.write("**数量**")
-    with col7:
-        st.write("**加入购物车**")
-    st.divider()
-
-    # 为每个商品添加数量选择和加入购物车按钮
-    for i, product in enumerate(current_page_items):
-        col1, col2, col3, col4, col5, col6, col7 = st.columns([1.5, 2.5, 1, 1, 1, 1, 1])
-        with col1:
-            st.write(product.get('barcode', 'N/A'))
-        with col2:
-            st.write(product['name'])
-        with col3:
-            stock_color = "red" if product['stock'] == 0 else "green" if product['stock'] > 10 else "orange"
-            st.write(f":{stock_color}[{product['stock']}]")
-        with col4:
-            st.write(f"¥{product['price']:.2f}")
-        with col5:
-            purchase_limit = product.get('purchase_limit', 0)
-            if purchase_limit > 0:
-                user_name = st.session_state.user['name']
-                historical_quantity = get_user_purchase_history(user_name, product['id'])
-                if historical_quantity > 0:
-                    remaining = max(0, purchase_limit - historical_quantity)
-                    if remaining > 0:
-                        st.write(f":orange[限购{purchase_limit}件]\n:blue[已购{historical_quantity}件]\n:green[可购{remaining}件]")
-                    else:
-                        st.write(f":orange[限购{purchase_limit}件]\n:red[已购{historical_quantity}件]\n:red[已达上限]")
-                else:
-                    st.write(f":orange[{purchase_limit}件]")
-            else:
-                st.write(":green[不限购]")
-        with col6:
-            if product['stock'] > 0:
-                max_qty = product['stock']
-                if purchase_limit > 0:
-                    user_name = st.session_state.user['name']
-                    historical_quantity = get_user_purchase_history(user_name, product['id'])
-                    remaining = max(0, purchase_limit - historical_quantity)
-                    max_qty = min(max_qty, remaining)
-                if max_qty > 0:
-                    quantity = st.number_input(
-                        "",
-                        min_value=1,
-                        max_value=max_qty,
-                        value=1,
-                        key=f"qty_{product['id']}",
-                        label_visibility="collapsed"
-                    )
-                else:
-                    st.write(":red[已达上限]")
-            else:
-                st.write(":red[缺货]")
-        with col7:
-            if product['stock'] > 0:
-                purchase_limit = product.get('purchase_limit', 0)
-                if purchase_limit > 0:
-                    user_name = st.session_state.user['name']
-                    historical_quantity = get_user_purchase_history(user_name, product['id'])
-                    remaining = max(0, purchase_limit - historical_quantity)
-                    if remaining > 0:
-                        if st.button("🛒", key=f"add_to_cart_{product['id']}"):
-                            quantity = st.session_state.get(f"qty_{product['id']}", 1)
-                            
-                            # 检查购物车中是否已有此商品
-                            found = False
-                            for cart_item in st.session_state.cart:
-                                if cart_item['product_id'] == product['id']:
-                                    cart_item['quantity'] += quantity
-                                    found = True
-                                    break
-                            
-                            if not found:
-                                st.session_state.cart.append({
-                                    'product_id': product['id'],
-                                    'product_name': product['name'],
-                                    'price': product['price'],
-                                    'quantity': quantity
-                                })
-                            
-                            st.success(f"✅ 已添加 {quantity} 件 {product['name']} 到购物车")
-                            # 使用DOM安全的重新加载
-                            dom_safe_rerun(0.3)
-                    else:
-                        st.button("🔒", key=f"limit_reached_{product['id']}", disabled=True)
-                else:
-                    if st.button("🛒", key=f"add_to_cart_{product['id']}"):
-                        quantity = st.session_state.get(f"qty_{product['id']}", 1)
-                        
-                        # 检查购物车中是否已有此商品
-                        found = False
-                        for cart_item in st.session_state.cart:
-                            if cart_item['product_id'] == product['id']:
-                                cart_item['quantity'] += quantity
-                                found = True
-                                break
-                        
-                        if not found:
-                            st.session_state.cart.append({
-                                'product_id': product['id'],
-                                'product_name': product['name'],
-                                'price': product['price'],
-                                'quantity': quantity
-                            })
-                        
-                        st.success(f"✅ 已添加 {quantity} 件 {product['name']} 到购物车")
-                        # 使用DOM安全的重新加载
-                        dom_safe_rerun(0.3)
-            else:
-                st.button("❌", key=f"out_of_stock_{product['id']}", disabled=True)
+    if PRODUCT_GRID_MODE == 'table':
+        render_product_table(current_page_items, purchase_map)
+    else:
+        render_product_rows(current_page_items, purchase_map)
 
     # 分页控制
     if total_pages > 1:
         st.divider()
         col1, col2, col3 = st.columns([1, 2, 1])
         with col1:
-            if st.button("⬅️ 上一页", key="prev_page") and page > 1:
-                st.session_state['user_goods_page'] = page - 1
-                st.rerun()
+            # 回调在片段重新运行前更新页码，翻页只重新运行商品列表
+            st.button("⬅️ 上一页", key="prev_page", on_click=st.session_state.__setitem__,
+                      args=('user_goods_page', max(1, page - 1)))
         with col2:
             st.write(f"第 {page} / {total_pages} 页")
         with col3:
-            if st.button("➡️ 下一页", key="next_page") and page < total_pages:
-                st.session_state['user_goods_page'] = page + 1
-                st.rerun()
+            st.button("➡️ 下一页", key="next_page", on_click=st.session_state.__setitem__,
+                      args=('user_goods_page', min(total_pages, page + 1)))
     
     # 购物车状态显示
     if st.session_state.cart:
@@ -1603,38 +1762,34 @@ def shopping_page():
             st.rerun()
 
 # 新增购物车页面 - 优化版本
+@st.fragment(key="cart_panel")  # 改数量、删除只重新运行购物车和商品列表
 @ultimate_error_handler
 def cart_page():
     """购物车页面"""
     with completely_silent():
         st.title("🛒 我的购物车")
-        # 使用缓存数据
-        inventory = get_cached_inventory()
+        # 使用缓存的商品索引
+        product_index = get_product_index()
         if 'cart' not in st.session_state:
             st.session_state.cart = []
         cart = st.session_state.cart
+    show_notices('cart_panel')
     if not cart:
         st.info("购物车为空，请先添加商品！")
         return
+    purchase_map = get_user_purchase_map(st.session_state.user['name'])
 
     total_amount = 0
-    quantity_changed = False
     for i, item in enumerate(cart):
         col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 1, 1])
-        barcode = 'N/A'
-        purchase_limit = 0
-        current_stock = 0
-        for product in inventory:
-            if product.get('id') == item['product_id']:
-                barcode = product.get('barcode', 'N/A')
-                purchase_limit = product.get('purchase_limit', 0)
-                current_stock = product.get('stock', 0)
-                break
+        product = product_index.get(item['product_id'], {})
+        barcode = product.get('barcode', 'N/A')
+        purchase_limit = product.get('purchase_limit', 0)
+        current_stock = product.get('stock', 0)
         with col1:
             product_display = f"{barcode} - {item['product_name']}"
             if purchase_limit > 0:
-                user_name = st.session_state.user['name']
-                historical_quantity = get_user_purchase_history(user_name, item['product_id'])
+                historical_quantity = purchase_map.get(item['product_id'], 0)
                 total_with_history = historical_quantity + item['quantity']
                 if total_with_history > purchase_limit:
                     product_display += f" ⚠️ (限购{purchase_limit}件，已购{historical_quantity}件，总计{total_with_history}件，超限)"
@@ -1648,8 +1803,7 @@ def cart_page():
         with col3:
             max_quantity = current_stock + item['quantity']
             if purchase_limit > 0:
-                user_name = st.session_state.user['name']
-                historical_quantity = get_user_purchase_history(user_name, item['product_id'])
+                historical_quantity = purchase_map.get(item['product_id'], 0)
                 other_cart_quantity = 0
                 for j, other_item in enumerate(cart):
                     if j != i and other_item['product_id'] == item['product_id']:
@@ -1657,35 +1811,17 @@ def cart_page():
                 remaining_limit = max(0, purchase_limit - historical_quantity - other_cart_quantity)
                 max_quantity = min(max_quantity, remaining_limit)
             if max_quantity > 0:
-                new_quantity = st.number_input(
+                st.number_input(
                     "数量",
                     min_value=1,
                     max_value=max_quantity,
                     value=item['quantity'],
                     key=f"cart_qty_{i}",
                     label_visibility="collapsed",
-                    help=f"最大可选: {max_quantity}"
+                    help=f"最大可选: {max_quantity}",
+                    on_change=cart_quantity_changed,
+                    args=(i, purchase_limit)
                 )
-                if new_quantity != item['quantity']:
-                    if purchase_limit > 0:
-                        user_name = st.session_state.user['name']
-                        current_cart_quantity = sum(cart_item['quantity'] for j, cart_item in enumerate(cart) if j != i and cart_item['product_id'] == item['product_id'])
-                        can_purchase, error_msg = check_purchase_limit(
-                            user_name,
-                            item['product_id'],
-                            current_cart_quantity,
-                            new_quantity,
-                            purchase_limit
-                        )
-                        if can_purchase:
-                            cart[i]['quantity'] = new_quantity
-                            quantity_changed = True
-                        else:
-                            st.error(error_msg)
-                            cart[i]['quantity'] = item['quantity']
-                    else:
-                        cart[i]['quantity'] = new_quantity
-                        quantity_changed = True
             else:
                 st.write("无库存")
                 cart[i]['_to_remove'] = True
@@ -1696,10 +1832,7 @@ def cart_page():
         with col5:
             # 使用完全静默的删除按钮
             try:
-                if st.button("删除", key=f"remove_cart_{i}"):
-                    # 安全的删除方式：标记删除而不立即移除DOM
-                    cart[i]['_marked_for_removal'] = True
-                    quantity_changed = True
+                st.button("删除", key=f"remove_cart_{i}", on_click=remove_cart_item, args=(i,))
             except Exception as e:
                 # 完全静默处理删除按钮的任何错误
                 error_msg = str(e).lower()
@@ -1713,10 +1846,10 @@ def cart_page():
     
     # 处理购物车变化 - 使用更安全的方法
     try:
-        st.session_state.cart = [item for item in cart if not item.get('_to_remove', False) and not item.get('_marked_for_removal', False)]
-        if quantity_changed:
-            # 使用DOM安全的重新加载
-            dom_safe_rerun(0.15)
+        st.session_state.cart = [item for item in cart if not item.get('_to_remove', False)]
+        if len(st.session_state.cart) != len(cart):
+            # 移除了无库存商品，商品列表的购物车件数也要更新
+            schedule_rerun()
     except Exception:
         # 如果处理失败，至少确保购物车状态不损坏
         pass
@@ -1792,7 +1925,6 @@ def cart_page():
     else:
         payment_method = "无支付"
     if st.button("提交订单", disabled=not payment_valid):
-        inventory = get_inventory()
         can_order = True
         user_name = st.session_state.user['name']
         # 只统计本次订单的商品和金额
@@ -1821,25 +1953,22 @@ def cart_page():
             order_discount_savings = order_original_amount * (1 - order_discount_rate)
             order_final_amount = order_original_amount - order_discount_savings
 
+        # 库存在下单事务中检查和扣减，这里只校验限购规则
         for cart_item in order_items:
-            for product in inventory:
-                if product['id'] == cart_item['product_id']:
-                    if product['stock'] < cart_item['quantity']:
-                        st.error(f"{product['name']} 库存不足！当前库存: {product['stock']}")
+            product = product_index.get(cart_item['product_id'])
+            if product:
+                purchase_limit = product.get('purchase_limit', 0)
+                if purchase_limit > 0:
+                    can_purchase, error_msg = check_purchase_limit(
+                        user_name,
+                        product['id'],
+                        0,
+                        cart_item['quantity'],
+                        purchase_limit
+                    )
+                    if not can_purchase:
+                        st.error(f"{product['name']} - {error_msg}")
                         can_order = False
-                    purchase_limit = product.get('purchase_limit', 0)
-                    if purchase_limit > 0:
-                        can_purchase, error_msg = check_purchase_limit(
-                            user_name,
-                            product['id'],
-                            0,
-                            cart_item['quantity'],
-                            purchase_limit
-                        )
-                        if not can_purchase:
-                            st.error(f"{product['name']} - {error_msg}")
-                            can_order = False
-                    break
         if can_order:
             order = {
                 'order_id': str(uuid.uuid4())[:8],
@@ -1856,31 +1985,23 @@ def cart_page():
                 'voucher_amount': voucher_amount,
                 'order_time': datetime.now().isoformat()
             }
-            orders = get_orders()
             
-            # 添加订单到数据库
+            # 一个事务内扣减库存并保存订单
             try:
-                add_order(order)
-                
-                # 更新库存
-                for cart_item in order_items:
-                    for product in inventory:
-                        if product['id'] == cart_item['product_id']:
-                            product['stock'] -= cart_item['quantity']
-                            if 'sold' not in product:
-                                product['sold'] = 0
-                            product['sold'] += cart_item['quantity']
-                            break
-                
-                save_inventory(inventory)
+                result = place_order(order, order_items)
                 
-                # 清空购物车
-                st.session_state.cart = []
-                
-                st.success("✅ 订单提交成功！")
-                st.balloons()
-                # 使用DOM安全的重新加载
-                dom_safe_rerun(0.5)
+                if result['success']:
+                    # 清空购物车
+                    st.session_state.cart = []
+                    
+                    set_notice('page', 'success', "✅ 订单提交成功！")
+                    set_notice('page', 'balloons')
+                    schedule_rerun()
+                else:
+                    for shortfall in result['shortfalls']:
+                        st.error(f"{shortfall['product_name'] or shortfall['product_id']} 库存不足！"
+                                 f"需要: {shortfall['requested']}，当前库存: {shortfall['available']}")
+                    st.error("❌ 订单提交失败，请调整购物车中的商品数量")
                 
             except Exception as e:
                 st.error(f"❌ 订单提交失败: {str(e)}")
@@ -1892,13 +2013,14 @@ def order_history_page():
     """订单历史页面"""
     user_order_history()
 
+@st.fragment(key="order_history")  # 展开和修改订单只重新运行订单历史
 def user_order_history():
     """用户订单历史页面"""
     st.subheader("📋 订单历史")
     
     # 加载订单和库存数据
-    orders = get_orders()
-    inventory = get_inventory()
+    orders = get_cached_orders()
+    product_index = get_product_index()
     
     # 筛选当前用户的订单
     user_orders = [order for order in orders if order['user_name'] == st.session_state.user['name']]
@@ -1948,23 +2070,17 @@ def user_order_history():
                     st.write(f"**多付:** ¥{overpay:.2f} (不设找零)")
             with col3:
                 # 修改订单按钮
-                if st.button("修改订单", key=f"modify_{order['order_id']}"):
-                    st.session_state.modifying_order = order['order_id']
-                    # 使用DOM安全的重新加载
-                    st.info("正在加载修改界面...")
-                    dom_safe_rerun(0.3)
+                # 回调中记录要修改的订单，点击后只重新运行订单历史
+                st.button("修改订单", key=f"modify_{order['order_id']}", on_click=st.session_state.__setitem__,
+                          args=('modifying_order', order['order_id']))
             
             # 商品详情
             st.write("**商品详情:**")
             for item in order['items']:
                 # 根据商品ID查找条码
-                barcode = 'N/A'
-                current_stock = 0
-                for product in inventory:
-                    if product.get('id') == item['product_id']:
-                        barcode = product.get('barcode', 'N/A')
-                        current_stock = product.get('stock', 0)
-                        break
+                product = product_index.get(item['product_id'], {})
+                barcode = product.get('barcode', 'N/A')
+                current_stock = product.get('stock', 0)
                 
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 with col1:
@@ -1981,17 +2097,25 @@ def user_order_history():
             if st.session_state.get('modifying_order') == order['order_id']:
                 st.write("---")
                 st.write("### 🛠️ 修改订单")
-                modify_order_interface(order, inventory)
+                modify_order_interface(order, product_index)
 
 def update_order(order, modified_items, new_cash, new_voucher, final_total, discount_rate, discount_text, discount_amount, inventory):
     """更新订单功能 - Render环境优化版本"""
+    # 订单来自共享的只读快照，在副本上修改
+    order = dict(order)
     try:
-        # 恢复旧库存
+        # 计算库存变化：恢复旧订单数量，扣除新订单数量
+        stock_changes = {}
         for item in order['items']:
-            for product in inventory:
-                if product['id'] == item['product_id']:
-                    product['stock'] += item['quantity']
-                    break
+            product_changes = stock_changes.setdefault(item['product_id'], {'stock_delta': 0})
+            product_changes['stock_delta'] += item['quantity']
+        for item in modified_items:
+            product_changes = stock_changes.setdefault(item['product_id'], {'stock_delta': 0})
+            product_changes['stock_delta'] -= item['quantity']
+        stock_changes = {
+            product_id: product_changes for product_id, product_changes in stock_changes.items()
+            if product_changes['stock_delta'] != 0
+        }
         
         # 重新计算修改后的商品原价总额
         new_original_amount = sum(item['price'] * item['quantity'] for item in modified_items)
@@ -2019,22 +2143,10 @@ def update_order(order, modified_items, new_cash, new_voucher, final_total, disc
         else:
             order['payment_method'] = "无支付"
         
-        # 扣除新库存
-        for item in modified_items:
-            for product in inventory:
-                if product['id'] == item['product_id']:
-                    product['stock'] -= item['quantity']
-                    break
-        
         # Render环境专用保存逻辑 - 多重保障
         success = False
         
-        # 策略1: 先清理缓存，确保数据一致性
-        try:
-            clear_memory_cache()
-            st.cache_data.clear()
-        except:
-            pass
+        # 策略1: 写入成功后数据版本号递增，缓存自动失效，无需手动清理
         
         # 策略2: 增强的数据库保存（最多重试5次）
         db = get_database_manager()
@@ -2044,10 +2156,7 @@ def update_order(order, modified_items, new_cash, new_voucher, final_total, disc
             try:
                 print(f"🔄 订单更新尝试 {attempt + 1}/{retry_count}: {order['order_id']}")
                 
-                # 重新获取数据库连接，避免连接过期
-                if attempt > 0:
-                    db = get_database_manager()
-                
+                # 连接池开启了pool_pre_ping，失效连接会在取用时自动替换
                 success = db.update_order(order['order_id'], order)
                 
                 if success:
@@ -2089,9 +2198,9 @@ def update_order(order, modified_items, new_cash, new_voucher, final_total, disc
             except Exception as file_error:
                 print(f"❌ 文件保存失败: {file_error}")
         
-        # 策略4: 强制保存库存数据
+        # 策略4: 保存库存变化
         try:
-            save_inventory(inventory)
+            apply_product_changes(stock_changes)
             print("✅ 库存数据保存成功")
         except Exception as inv_error:
             print(f"❌ 库存保存失败: {inv_error}")
@@ -2112,15 +2221,49 @@ def update_order(order, modified_items, new_cash, new_voucher, final_total, disc
         st.error(f"订单更新失败: {e}")
         return False
 
+def add_to_order_clicked(order, product, quantity_key):
+    """修改订单“添加到订单”按钮回调：点击只重新运行修改面板，提示留到面板重新运行时显示"""
+    items_key = f'modified_items_{order["order_id"]}'
+    if items_key not in st.session_state:
+        st.session_state[items_key] = [dict(item) for item in order['items']]
+    quantity = st.session_state.get(quantity_key, 1)
+    
+    existing_index = None
+    for i, item in enumerate(st.session_state[items_key]):
+        if item['product_id'] == product['id']:
+            existing_index = i
+            break
+    
+    if existing_index is not None:
+        existing_item = st.session_state[items_key][existing_index]
+        existing_item['quantity'] += quantity
+        # “修改商品数量”中的数量输入框按位置命名，同步它的值，否则重新运行时会被旧值覆盖
+        st.session_state[f"mod_qty_{order['order_id']}_{existing_index}"] = existing_item['quantity']
+        set_notice(f"modify_order_{order['order_id']}", 'success', f"已将 {quantity} 件 {product['name']} 添加到现有商品")
+    else:
+        st.session_state[items_key].append({
+            'product_id': product['id'],
+            'product_name': product['name'],
+            'price': product['price'],
+            'quantity': quantity
+        })
+        set_notice(f"modify_order_{order['order_id']}", 'success', f"已添加 {quantity} 件 {product['name']} 到订单")
+
 @st.fragment  # 优化性能，减少重新渲染
-def modify_order_interface(order, inventory):
+def modify_order_interface(order, product_index):
     """完整的订单修改界面 - 优化版本"""
     # 初始化修改状态
     if f'modified_items_{order["order_id"]}' not in st.session_state:
-        st.session_state[f'modified_items_{order["order_id"]}'] = order['items'].copy()
+        st.session_state[f'modified_items_{order["order_id"]}'] = [dict(item) for item in order['items']]
     
     modified_items = st.session_state[f'modified_items_{order["order_id"]}']
     
+    # 该用户在其他订单中的购买数量（用于限购计算）
+    other_purchases = db.get_user_purchase_quantities(order.get('user_name', ''), exclude_order_id=order['order_id'])
+    
+    # 添加商品的按钮回调只触发本面板重新运行，提示在这里显示
+    show_notices(f"modify_order_{order['order_id']}")
+    
     # 创建标签页
     tab1, tab2, tab3 = st.tabs(["📝 修改商品数量", "➕ 添加商品", "❌ 撤销整个订单"])
     
@@ -2150,11 +2293,7 @@ def modify_order_interface(order, inventory):
         # 显示每个商品的修改界面
         for i, item in enumerate(modified_items):
             # 获取商品信息
-            product_info = None
-            for product in inventory:
-                if product.get('id') == item['product_id']:
-                    product_info = product
-                    break
+            product_info = product_index.get(item['product_id'])
             
             if not product_info:
                 st.error(f"商品 {item.get('product_name', 'Unknown')} 未找到")
@@ -2166,13 +2305,7 @@ def modify_order_interface(order, inventory):
             
             # 计算历史购买数量和可选数量
             if purchase_limit > 0:
-                all_orders = get_orders()
-                historical_quantity = 0
-                for hist_order in all_orders:
-                    if hist_order['user_name'] == user_name and hist_order['order_id'] != order['order_id']:
-                        for hist_item in hist_order.get('items', []):
-                            if hist_item.get('product_id') == item['product_id']:
-                                historical_quantity += hist_item.get('quantity', 0)
+                historical_quantity = other_purchases.get(item['product_id'], 0)
                 
                 max_limit = max(0, purchase_limit - historical_quantity)
                 max_quantity = min(available_stock, max_limit)
@@ -2248,11 +2381,7 @@ def modify_order_interface(order, inventory):
             # 显示将要恢复的库存
             st.write("**将恢复的库存:**")
             for item in order['items']:
-                barcode = 'N/A'
-                for product in inventory:
-                    if product.get('id') == item['product_id']:
-                        barcode = product.get('barcode', 'N/A')
-                        break
+                barcode = product_index.barcode_of(item['product_id'])
                 st.write(f"- {barcode} - {item['product_name']}: +{item['quantity']}")
             
             # 空订单的支付设置（简化版）
@@ -2366,14 +2495,13 @@ def modify_order_interface(order, inventory):
             if st.button("保存修改", key=f"save_modify_{order['order_id']}", disabled=not payment_valid):
                 # 如果所有商品数量都为0，删除整个订单
                 if total_items == 0:
-                    if cancel_order(order, inventory):
-                        st.success("订单已删除（所有商品数量为0）！")
+                    if cancel_order(order, product_index):
+                        set_notice('page', 'success', "订单已删除（所有商品数量为0）！")
                         if f'modified_items_{order["order_id"]}' in st.session_state:
                             del st.session_state[f'modified_items_{order["order_id"]}']
                         if 'modifying_order' in st.session_state:
                             del st.session_state['modifying_order']
-                        # 使用DOM安全的页面刷新
-                        dom_safe_rerun(0.3)
+                        schedule_rerun()
                     else:
                         st.error("订单删除失败，请重试")
                 else:
@@ -2383,58 +2511,38 @@ def modify_order_interface(order, inventory):
                     # 限购校验（只检查数量大于0的商品）
                     limit_error = False
                     for item in filtered_items:
-                        for product in inventory:
-                            if product.get('id') == item['product_id']:
-                                purchase_limit = product.get('purchase_limit', 0)
-                                if purchase_limit > 0:
-                                    all_orders = get_orders()
-                                    historical_quantity = 0
-                                    for hist_order in all_orders:
-                                        if hist_order['user_name'] == user_name and hist_order['order_id'] != order['order_id']:
-                                            for hist_item in hist_order.get('items', []):
-                                                if hist_item.get('product_id') == item['product_id']:
-                                                    historical_quantity += hist_item.get('quantity', 0)
-                                    
-                                    if item['quantity'] + historical_quantity > purchase_limit:
-                                        st.error(f"商品【{item['product_name']}】限购{purchase_limit}件，您已购{historical_quantity}件，本次修改后共{item['quantity']+historical_quantity}件，超出限购！")
-                                        limit_error = True
-                                break
+                        product = product_index.get(item['product_id'])
+                        purchase_limit = product.get('purchase_limit', 0) if product else 0
+                        if purchase_limit > 0:
+                            historical_quantity = other_purchases.get(item['product_id'], 0)
+                            
+                            if item['quantity'] + historical_quantity > purchase_limit:
+                                st.error(f"商品【{item['product_name']}】限购{purchase_limit}件，您已购{historical_quantity}件，本次修改后共{item['quantity']+historical_quantity}件，超出限购！")
+                                limit_error = True
                     
                     if not limit_error:
                         # 使用过滤后的商品列表保存订单
-                        if update_order(order, filtered_items, new_cash, new_voucher, final_total, discount_rate, discount_text, discount_amount, inventory):
-                            # Render环境特殊处理：强制清理缓存确保数据一致性
-                            if is_render_environment():
-                                try:
-                                    clear_memory_cache()
-                                    st.cache_data.clear()
-                                    # 额外等待确保数据同步
-                                    time.sleep(0.1)
-                                except:
-                                    pass
-                            
+                        if update_order(order, filtered_items, new_cash, new_voucher, final_total, discount_rate, discount_text, discount_amount, product_index):
                             removed_items = [item for item in modified_items if item['quantity'] == 0]
                             if removed_items:
-                                st.success(f"订单修改成功！已删除 {len(removed_items)} 件数量为0的商品。")
+                                set_notice('page', 'success', f"订单修改成功！已删除 {len(removed_items)} 件数量为0的商品。")
                             else:
-                                st.success("订单修改成功！")
+                                set_notice('page', 'success', "订单修改成功！")
                             
                             if f'modified_items_{order["order_id"]}' in st.session_state:
                                 del st.session_state[f'modified_items_{order["order_id"]}']
                             if 'modifying_order' in st.session_state:
                                 del st.session_state['modifying_order']
-                            st.balloons()
+                            set_notice('page', 'balloons')
                             
-                            # Render环境使用更长的延迟确保数据保存完成
-                            delay = 0.5 if is_render_environment() else 0.2
-                            dom_safe_rerun(delay)
+                            # update_order 返回时数据已提交，无需等待
+                            schedule_rerun()
                         else:
                             # Render环境中即使显示错误，也要清理状态避免界面卡住
                             if is_render_environment():
                                 try:
                                     if f'modified_items_{order["order_id"]}' in st.session_state:
                                         del st.session_state[f'modified_items_{order["order_id"]}']
-                                    time.sleep(0.2)
                                 except:
                                     pass
                             st.error("订单修改失败，请重试")
@@ -2445,14 +2553,13 @@ def modify_order_interface(order, inventory):
                     del st.session_state[f'modified_items_{order["order_id"]}']
                 if 'modifying_order' in st.session_state:
                     del st.session_state['modifying_order']
-                st.info("已取消修改")
-                # 使用DOM安全的页面刷新
-                dom_safe_rerun(0.2)
+                set_notice('page', 'info', "已取消修改")
+                schedule_rerun()
     
     with tab2:
         st.write("**从商品库存中增加商品:**")
         
-        available_products = [p for p in inventory if p['stock'] > 0]
+        available_products = [p for p in product_index if p['stock'] > 0]
         
         if not available_products:
             st.info("暂无可添加的商品")
@@ -2465,13 +2572,7 @@ def modify_order_interface(order, inventory):
             user_name = order.get('user_name', '')
             
             if purchase_limit > 0:
-                all_orders = get_orders()
-                historical_quantity = 0
-                for hist_order in all_orders:
-                    if hist_order['user_name'] == user_name and hist_order['order_id'] != order['order_id']:
-                        for item in hist_order.get('items', []):
-                            if item.get('product_id') == selected_product['id']:
-                                historical_quantity += item.get('quantity', 0)
+                historical_quantity = other_purchases.get(selected_product['id'], 0)
                 
                 current_quantity_in_order = 0
                 if f'modified_items_{order["order_id"]}' in st.session_state:
@@ -2501,31 +2602,9 @@ def modify_order_interface(order, inventory):
                 st.success("该商品不限购")
                 add_quantity = st.number_input("数量", min_value=1, max_value=selected_product['stock'], value=1, key=f"add_qty_{order['order_id']}")
             
-            if add_quantity > 0 and st.button("添加到订单", key=f"add_to_order_{order['order_id']}"):
-                if f'modified_items_{order["order_id"]}' not in st.session_state:
-                    st.session_state[f'modified_items_{order["order_id"]}'] = order['items'].copy()
-                
-                existing_item = None
-                for item in st.session_state[f'modified_items_{order["order_id"]}']:
-                    if item['product_id'] == selected_product['id']:
-                        existing_item = item
-                        break
-                
-                if existing_item:
-                    existing_item['quantity'] += add_quantity
-                    st.success(f"已将 {add_quantity} 件 {selected_product['name']} 添加到现有商品")
-                else:
-                    new_item = {
-                        'product_id': selected_product['id'],
-                        'product_name': selected_product['name'],
-                        'price': selected_product['price'],
-                        'quantity': add_quantity
-                    }
-                    st.session_state[f'modified_items_{order["order_id"]}'].append(new_item)
-                    st.success(f"已添加 {add_quantity} 件 {selected_product['name']} 到订单")
-                
-                # 使用DOM安全的页面刷新
-                dom_safe_rerun(0.2)
+            if add_quantity > 0:
+                st.button("添加到订单", key=f"add_to_order_{order['order_id']}", on_click=add_to_order_clicked,
+                          args=(order, selected_product, f"add_qty_{order['order_id']}"))
     
     with tab3:
         st.write("**⚠️ 警告：撤销订单将恢复所有商品库存**")
@@ -2533,40 +2612,32 @@ def modify_order_interface(order, inventory):
         # 显示将要恢复的库存
         st.write("**将恢复的库存:**")
         for item in order['items']:
-            barcode = 'N/A'
-            for product in inventory:
-                if product.get('id') == item['product_id']:
-                    barcode = product.get('barcode', 'N/A')
-                    break
+            barcode = product_index.barcode_of(item['product_id'])
             st.write(f"- {barcode} - {item['product_name']}: +{item['quantity']}")
         
         # 双重确认
         if st.checkbox("我确认要撤销整个订单", key=f"confirm_cancel_{order['order_id']}"):
             if st.button("确认撤销订单", key=f"final_cancel_{order['order_id']}", type="primary"):
-                if cancel_order(order, inventory):
-                    st.success("订单已成功撤销！")
+                if cancel_order(order, product_index):
+                    set_notice('page', 'success', "订单已成功撤销！")
                     # 清理所有相关的session state
                     if 'modifying_order' in st.session_state:
                         del st.session_state['modifying_order']
                     # 清理修改状态
                     if f'modified_items_{order["order_id"]}' in st.session_state:
                         del st.session_state[f'modified_items_{order["order_id"]}']
-                    # 使用DOM安全的页面刷新
-                    dom_safe_rerun(0.3)
+                    schedule_rerun()
                 else:
                     st.error("订单撤销失败，请重试")
 
 def cancel_order(order, inventory):
     """撤销/删除订单功能"""
     try:
-        # 恢复库存
+        # 需要恢复的库存
+        stock_changes = {}
         for item in order['items']:
-            for product in inventory:
-                if product['id'] == item['product_id']:
-                    product['stock'] += item['quantity']
-                    if 'sold' in product:
-                        product['sold'] = max(0, product['sold'] - item['quantity'])
-                    break
+            product_changes = stock_changes.setdefault(item['product_id'], {'stock_delta': 0})
+            product_changes['stock_delta'] += item['quantity']
         
         # 删除订单
         try:
@@ -2594,8 +2665,8 @@ def cancel_order(order, inventory):
                     except:
                         pass
                         
-                # 强制更新库存
-                save_inventory(inventory)
+                # 恢复库存
+                apply_product_changes(stock_changes)
                 return True
             else:
                 print(f"订单删除失败: {order['order_id']} - 订单不存在")
@@ -2661,27 +2732,25 @@ def checkout_order(cart_items, total_amount):
             add_order(order_data)
             
             # 更新库存
-            inventory = get_inventory()
+            stock_changes = {}
             for cart_item in cart_items:
-                for product in inventory:
-                    if product['id'] == cart_item['product_id']:
-                        product['stock'] -= cart_item['quantity']
-                        break
+                product_changes = stock_changes.setdefault(cart_item['product_id'], {'stock_delta': 0})
+                product_changes['stock_delta'] -= cart_item['quantity']
             
-            save_inventory(inventory)
+            apply_product_changes(stock_changes)
             
             # 清空购物车
             st.session_state.cart = []
             
-            st.success(f"✅ 订单 {order_id} 创建成功！")
-            st.balloons()
-            # 使用DOM安全的重新加载
-            dom_safe_rerun(0.8)
+            set_notice('page', 'success', f"✅ 订单 {order_id} 创建成功！")
+            set_notice('page', 'balloons')
+            schedule_rerun()
             
     except Exception as e:
         st.error(f"结账失败: {str(e)}")
 
 # 数据库状态检查
+@st.fragment(key="database_status_check")  # 面板内的操作只重新运行本面板
 def database_status_check():
     """数据库状态检查页面"""
     st.subheader("🔍 数据库状态检查")
@@ -2691,22 +2760,20 @@ def database_status_check():
     with col1:
         st.write("### 📊 基础统计")
         try:
-            # 使用统一的数据库接口 - 优化版本
-            inventory = get_cached_inventory()
-            orders = get_cached_orders()  
-            users = get_cached_users()
+            # 使用按数据版本缓存的汇总，不加载订单和用户行
+            snapshot = get_inventory_snapshot()
             
             # 显示基本统计
-            st.metric("商品总数", len(inventory))
-            st.metric("订单总数", len(orders))
-            st.metric("用户总数", len(users))
+            st.metric("商品总数", len(snapshot))
+            st.metric("订单总数", get_order_stats()['count'])
+            st.metric("用户总数", get_user_count())
             
             # 显示有库存的商品数量
-            in_stock_count = len([item for item in inventory if item.get('stock', 0) > 0])
+            in_stock_count = snapshot.in_stock_count()
             st.metric("有库存商品", in_stock_count)
             
             # 显示限购商品数量
-            limited_count = len([item for item in inventory if item.get('purchase_limit', 0) > 0])
+            limited_count = snapshot.limited_count()
             st.metric("限购商品", limited_count)
             
         except Exception as e:
@@ -2796,9 +2863,9 @@ def database_status_check():
             db_manager = get_database_manager()
             st.write("**数据库管理器:** 已初始化")
             
-            # 尝试简单查询
-            users = db_manager.load_users()
-            st.write(f"**连接测试:** 成功读取 {len(users)} 个用户")
+            # 尝试简单查询（只统计数量，不加载用户行）
+            user_count = db_manager.count_users()
+            st.write(f"**连接测试:** 成功读取 {user_count} 个用户")
             
         except Exception as e:
             st.error(f"❌ 数据库连接异常: {str(e)}")
@@ -2829,8 +2896,7 @@ def database_status_check():
                 st.info(f"写入前商品数量: {before_count}")
                 
                 # 添加测试商品
-                new_inventory = before_inventory + [test_product]
-                db.save_inventory(new_inventory)
+                db.save_inventory([test_product])
                 
                 # 验证写入
                 time.sleep(0.5)
@@ -3008,6 +3074,9 @@ def main():
             st.session_state.app_initialized = True
             st.session_state.session_id = str(uuid.uuid4())[:8]
         
+        # 上一次交互登记的提示（登录、下单、修改订单等）
+        show_notices('page')
+        
         # 添加用户状态验证
         user_valid = (
             'user' in st.session_state and 
@@ -3033,9 +3102,8 @@ def main():
                     for key in keys_to_clear:
                         if key in st.session_state:
                             del st.session_state[key]
-                    st.success("✅ 已安全登出")
-                    # 使用DOM安全的重新加载
-                    dom_safe_rerun(0.3)
+                    set_notice('page', 'success', "✅ 已安全登出")
+                    schedule_rerun()
             
             # 根据用户角色显示不同页面
             try:
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+商品筛选性能对比：逐条件列表推导 vs 编译后的布尔掩码
+
+用法:
+    python benchmark_catalog_filter.py                 # 100k商品
+    python benchmark_catalog_filter.py --size 50000 --rounds 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from catalog_filter import compile_filters
+from inventory_snapshot import InventorySnapshot
+from search_index import BarcodeIndex, NGramIndex
+
+STOCK_RULES = {
+    "in_stock": lambda s: s > 0,
+    "plenty": lambda s: s > 10,
+    "low": lambda s: 1 <= s <= 10,
+    "out": lambda s: s == 0,
+}
+
+# (说明, 筛选条件)
+CASES = [
+    ("只有价格范围", {"price_min": 5, "price_max": 80}),
+    ("价格+库存+限购", {"price_min": 5, "price_max": 80, "stock": "low", "limit": "limited"}),
+    ("名称+库存", {"name": "牛奶", "stock": "in_stock"}),
+    ("条码前缀+价格", {"barcode": "6912", "price_min": 0, "price_max": 50}),
+]
+
+
+def make_products(count):
+    """生成测试商品"""
+    rng = random.Random(42)
+    words = ["牛奶", "酸奶", "面包", "饼干", "苹果", "橙汁", "矿泉水", "巧克力", "薯片", "咖啡"]
+    return [
+        {
+            "id": f"p{i}",
+            "name": f"{rng.choice(words)}{rng.choice(words)}{i}",
+            "price": round(rng.uniform(1, 100), 2),
+            "stock": rng.randint(0, 30),
+            "barcode": f"69{rng.randint(0, 99):02d}{i:09d}",
+            "purchase_limit": rng.choice([0, 0, 0, 2, 5]),
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_filter(inventory, filters):
+    """旧方式：每个条件生成一次新列表"""
+    result = inventory.copy()
+    if filters.get("name"):
+        result = [p for p in result if filters["name"].lower() in p["name"].lower()]
+    if filters.get("barcode"):
+        result = [p for p in result if filters["barcode"] in p.get("barcode", "")]
+    if "price_min" in filters:
+        result = [p for p in result if filters["price_min"] <= p["price"] <= filters["price_max"]]
+    if filters.get("stock"):
+        rule = STOCK_RULES[filters["stock"]]
+        result = [p for p in result if rule(p["stock"])]
+    if filters.get("limit") == "limited":
+        result = [p for p in result if p.get("purchase_limit", 0) > 0]
+    elif filters.get("limit") == "unlimited":
+        result = [p for p in result if p.get("purchase_limit", 0) == 0]
+    return result
+
+
+def median_ms(func, rounds):
+    """多次执行取耗时中位数（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品筛选性能对比")
+    parser.add_argument("--size", type=int, default=100000, help="商品数量")
+    parser.add_argument("--rounds", type=int, default=10, help="每种方式的执行次数")
+    args = parser.parse_args()
+
+    products = make_products(args.size)
+    start = time.perf_counter()
+    table = InventorySnapshot(products)
+    names = NGramIndex()
+    names.sync(products)
+    cold_names = NGramIndex(cache_size=0)  # 不缓存查询结果，模拟每个数据版本的首次查询
+    cold_names.sync(products)
+    barcodes = BarcodeIndex()
+    barcodes.sync(products)
+    print(f"商品数: {args.size}，构建列式表和索引耗时 {time.perf_counter() - start:.2f}s（每个数据版本一次）")
+
+    print("=" * 86)
+    print(f"{'条件':<14} | {'命中':>7} | {'列表推导(ms)':>12} | {'掩码首次(ms)':>12} | {'掩码(ms)':>10} | {'加速':>6}")
+    print("-" * 86)
+    for label, filters in CASES:
+        def compiled_filter(search=names.search):
+            compiled = compile_filters(filters, name_search=search, barcode_lookup=barcodes.lookup)
+            return compiled.indices(table)
+        hits = len(compiled_filter())
+        legacy_ms = median_ms(lambda: legacy_filter(products, filters), args.rounds)
+        cold_ms = median_ms(lambda: compiled_filter(cold_names.search), args.rounds)
+        mask_ms = median_ms(compiled_filter, args.rounds)
+        print(f"{label:<14} | {hits:>7} | {legacy_ms:>12.2f} | {cold_ms:>12.2f} | {mask_ms:>10.2f} | {legacy_ms / mask_ms:>5.1f}x")
+    print("=" * 86)
+    print("掩码首次：名称查询结果未缓存；掩码：同一数据版本内重复查询（页面重跑、翻页、其他会话）")
+
+
+if __name__ == "__main__":
+    main()
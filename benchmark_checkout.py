@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+结账写入延迟对比：整表重读+等待验证 vs 按写入行数验证
+
+用法:
+    python benchmark_checkout.py                        # 本地SQLite，已有2000个订单
+    python benchmark_checkout.py --existing 20000       # 指定已有订单数量
+    python benchmark_checkout.py --url postgresql://... # 指定数据库
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from database import DatabaseManager
+
+
+def make_order(user_name="基准用户"):
+    """生成三件商品的订单"""
+    items = [
+        {"product_id": f"p{i}", "product_name": f"商品{i}", "price": 2.0, "quantity": 1}
+        for i in range(3)
+    ]
+    return {
+        "order_id": str(uuid.uuid4())[:8],
+        "user_name": user_name,
+        "items": items,
+        "original_amount": 6.0,
+        "total_items": 3,
+        "discount_rate": 1.0,
+        "discount_text": "无折扣",
+        "discount_savings": 0,
+        "total_amount": 6.0,
+        "payment_method": "现金支付",
+        "cash_amount": 6.0,
+        "voucher_amount": 0,
+        "order_time": datetime.now().isoformat(),
+    }
+
+
+def legacy_add_order(db, order, sleep):
+    """旧方式：保存前后各读取整张订单表，中间等待固定时间"""
+    before_count = len(db.load_orders())
+    db.add_order(order)
+    time.sleep(sleep)
+    return len(db.load_orders()) == before_count + 1
+
+
+def verified_add_order(db, order, sleep):
+    """新方式：按写入的明细行数验证"""
+    return db.add_order(order) == len(order["items"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结账写入延迟对比")
+    parser.add_argument("--url", help="数据库URL，默认使用临时SQLite文件")
+    parser.add_argument("--existing", type=int, default=2000, help="预先写入的订单数量")
+    parser.add_argument("--rounds", type=int, default=20, help="每种方式的结账次数")
+    parser.add_argument("--sleep", type=float, default=0.5, help="旧方式验证前的等待秒数")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        db = DatabaseManager(url)
+        for _ in range(args.existing):
+            db.add_order(make_order())
+
+    print(f"已有订单: {args.existing}")
+    print("=" * 64)
+    print(f"{'方式':<16} | {'p50(ms)':>10} | {'p95(ms)':>10} | {'平均(ms)':>10}")
+    print("-" * 64)
+    for label, func in (("整表重读验证", legacy_add_order), ("行数验证", verified_add_order)):
+        timings = []
+        for _ in range(args.rounds):
+            order = make_order()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert func(db, order, args.sleep)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<16} | {statistics.median(timings):>10.2f} | {p95:>10.2f} | {statistics.mean(timings):>10.2f}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+数据库管理器获取开销对比：每次新建引擎 vs 进程内共享引擎
+
+用法:
+    python benchmark_db_manager.py                       # 本地临时SQLite
+    python benchmark_db_manager.py --url postgresql://...  # 指定数据库（远程数据库差距更明显）
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import database
+from database import DatabaseManager
+
+
+def measure(func, rounds):
+    """多次执行并返回每次耗时（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def fresh_manager(url):
+    """旧方式：每次调用都新建引擎、测试连接、建表并初始化管理员"""
+    shared = database._engines.pop(url, None)
+    if shared:
+        shared[0].dispose()
+    manager = DatabaseManager(url)
+    manager.load_users()
+
+
+def shared_manager(url):
+    """新方式：复用进程内的引擎和连接池"""
+    manager = DatabaseManager(url)
+    manager.load_users()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库管理器获取开销对比")
+    parser.add_argument("--url", help="数据库URL，默认使用临时SQLite文件")
+    parser.add_argument("--rounds", type=int, default=50, help="每种方式的调用次数")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatabaseManager(url)  # 预先建表，避免首轮建表计入结果
+
+    print("=" * 64)
+    print(f"{'方式':<16} | {'p50(ms)':>10} | {'p95(ms)':>10} | {'平均(ms)':>10}")
+    print("-" * 64)
+    for label, func in (("每次新建引擎", fresh_manager), ("共享引擎", shared_manager)):
+        timings = sorted(measure(lambda: func(url), args.rounds))
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<16} | {statistics.median(timings):>10.2f} | {p95:>10.2f} | {statistics.mean(timings):>10.2f}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
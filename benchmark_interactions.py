@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+用户交互延迟：用 Streamlit AppTest 模拟登录、加购、改数量、下单、修改订单、登出，
+统计每种交互从点击到页面重新运行完成的耗时（p50/p95）。
+
+用法:
+    python benchmark_interactions.py                      # 每种交互10轮
+    python benchmark_interactions.py --rounds 30
+    python benchmark_interactions.py --app other_app.py   # 对比其他版本的 app.py（需放在项目目录内）
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+
+def find(elements, **attrs):
+    """按属性查找第一个元素"""
+    for element in elements:
+        if all(getattr(element, name, None) == value for name, value in attrs.items()):
+            return element
+    raise LookupError(attrs)
+
+
+def timed_run(app, timings, name):
+    """执行一次交互后的运行并记录耗时（毫秒）"""
+    start = time.perf_counter()
+    app.run()
+    timings[name].append((time.perf_counter() - start) * 1000)
+    assert not app.exception, (name, app.exception)
+
+
+def session_round(app_path, user_name, timings):
+    """一个用户会话完成一轮全部交互"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(app_path, default_timeout=120)
+    app.run()
+
+    find(app.text_input, label="姓名").input(user_name)
+    find(app.button, label="登录").click()
+    timed_run(app, timings, "登录")
+
+    find(app.button, key="add_to_cart_p00001").click()
+    timed_run(app, timings, "加入购物车")
+
+    find(app.number_input, key="cart_qty_0").set_value(2)
+    timed_run(app, timings, "修改购物车数量")
+
+    find(app.number_input, label="现金支付金额").set_value(100.0)
+    app.run()
+    find(app.button, label="提交订单").click()
+    timed_run(app, timings, "提交订单")
+
+    order_button = next(button for button in app.button if button.key and button.key.startswith("modify_"))
+    order_button.click()
+    app.run()
+    find(app.button, label="取消修改").click()
+    timed_run(app, timings, "取消修改订单")
+
+    find(app.button, label="🚪 登出").click()
+    timed_run(app, timings, "登出")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户交互延迟")
+    parser.add_argument("--rounds", type=int, default=10, help="会话轮数（每轮使用新用户）")
+    parser.add_argument("--products", type=int, default=100, help="商品数量")
+    parser.add_argument("--app", default="app.py", help="要测试的应用脚本")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    from database import DatabaseManager
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatabaseManager(os.environ["DATABASE_URL"]).save_inventory([
+            {"id": f"p{i:05d}", "name": f"基准商品{i}", "price": 1.0 + i % 50, "stock": 10000,
+             "barcode": f"69{i:011d}", "purchase_limit": 0}
+            for i in range(args.products)
+        ])
+
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.app)
+    timings = defaultdict(list)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for round_index in range(args.rounds):
+            session_round(app_path, f"基准用户{round_index}", timings)
+
+    print(f"应用: {args.app}, 商品数: {args.products}, 轮数: {args.rounds}")
+    print("=" * 56)
+    print(f"{'交互':<12} | {'p50(ms)':>10} | {'p95(ms)':>10} | {'次数':>6}")
+    print("-" * 56)
+    for name, values in timings.items():
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{name:<12} | {statistics.median(values):>10.1f} | {p95:>10.1f} | {len(values):>6}")
+    print("=" * 56)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+列式商品快照对比：商品字典列表 vs InventorySnapshot 的内存占用和汇总速度
+
+用法:
+    python benchmark_inventory_snapshot.py                # 10k/100k商品
+    python benchmark_inventory_snapshot.py --sizes 50000
+"""
+
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+
+from inventory_snapshot import InventorySnapshot
+
+
+def make_products(count):
+    """生成与 load_inventory 结构相同的商品字典"""
+    return [
+        {
+            "id": f"p{i:07d}",
+            "name": f"基准商品{i}",
+            "price": round(1 + (i % 500) * 0.37, 2),
+            "stock": i % 40,
+            "description": "",
+            "barcode": f"69{i:011d}",
+            "purchase_limit": i % 3,
+            "created_at": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def retained_bytes(build):
+    """构建对象后仍被占用的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def median_ms(func, rounds=20):
+    """多次执行取耗时中位数（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def dict_aggregates(inventory):
+    """页面原来的逐条汇总"""
+    prices = [item['price'] for item in inventory]
+    return (
+        sum(item['stock'] for item in inventory),
+        sum(item['price'] * item['stock'] for item in inventory),
+        len([item for item in inventory if item['stock'] < 5]),
+        len([item for item in inventory if item.get('stock', 0) > 0]),
+        len([item for item in inventory if item.get('purchase_limit', 0) > 0]),
+        min(prices), max(prices),
+    )
+
+
+def snapshot_aggregates(snapshot):
+    """快照上的数组汇总"""
+    return (
+        snapshot.total_stock(),
+        snapshot.total_value(),
+        snapshot.low_stock_count(5),
+        snapshot.in_stock_count(),
+        snapshot.limited_count(),
+        *snapshot.price_range(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列式商品快照对比")
+    parser.add_argument("--sizes", default="10000,100000", help="商品数量列表")
+    args = parser.parse_args()
+
+    print("=" * 88)
+    print(f"{'商品数':>8} | {'字典列表(MB)':>12} | {'快照(MB)':>10} | {'快照+字符串(MB)':>15} | {'汇总-字典(ms)':>13} | {'汇总-快照(ms)':>13}")
+    print("-" * 88)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        # 快照单独持有全部数据（构建用的字典列表已释放）时的内存，先测以免复用已intern的字符串
+        standalone, standalone_bytes = retained_bytes(lambda: InventorySnapshot(make_products(size)))
+        expected = snapshot_aggregates(standalone)
+        del standalone
+        inventory, dict_bytes = retained_bytes(lambda: make_products(size))
+        # 与字典列表共用字符串时快照自身的额外内存
+        snapshot, shared_bytes = retained_bytes(lambda: InventorySnapshot(inventory))
+        assert snapshot_aggregates(snapshot) == expected
+
+        dict_ms = median_ms(lambda: dict_aggregates(inventory))
+        snapshot_ms = median_ms(lambda: snapshot_aggregates(snapshot))
+        print(f"{size:>8} | {dict_bytes / 1e6:>12.1f} | {shared_bytes / 1e6:>10.1f} | {standalone_bytes / 1e6:>15.1f} | "
+              f"{dict_ms:>13.2f} | {snapshot_ms:>13.3f}")
+        del inventory, snapshot
+    print("=" * 88)
+    print("快照(MB)：与字典列表共用字符串时的额外占用；快照+字符串(MB)：快照单独持有全部数据")
+
+
+if __name__ == "__main__":
+    main()
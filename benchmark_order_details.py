@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+订单明细展开性能对比：逐行拼字典 vs 列式处理
+
+用法:
+    python benchmark_order_details.py                  # 10k/100k订单，每单3件商品
+    python benchmark_order_details.py --sizes 1000,10000 --products 5000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from order_report import build_order_details
+
+
+def make_data(order_count, product_count, items_per_order):
+    """生成测试订单和商品"""
+    products = [{"id": f"p{i}", "barcode": f"69{i:011d}"} for i in range(product_count)]
+    start = datetime(2025, 1, 1)
+    orders = []
+    for i in range(order_count):
+        items = [
+            {
+                "product_id": f"p{(i * items_per_order + j) % (product_count + 10)}",
+                "product_name": f"商品{j}",
+                "price": 1.5 + j,
+                "quantity": 1 + j % 3,
+            }
+            for j in range(items_per_order)
+        ]
+        orders.append({
+            "order_id": f"o{i}",
+            "user_name": f"用户{i % 500}",
+            "items": items,
+            "total_amount": 9.0,
+            "cash_amount": 10.0 if i % 4 == 0 else 9.0,
+            "voucher_amount": 0,
+            "discount_savings": 0.5,
+            "discount_text": "9折",
+            "payment_method": "现金支付",
+            "order_time": (start + timedelta(seconds=i)).isoformat(),
+        })
+    return orders, products
+
+
+def legacy_order_details(orders, products):
+    """旧方式：逐个订单、逐个商品拼字典（已使用商品ID字典查找条码）"""
+    by_id = {product["id"]: product for product in products}
+    order_details = []
+    for order in orders:
+        for item in order.get("items", []):
+            product_id = item.get("product_id", "N/A")
+            product = by_id.get(product_id)
+            barcode = product.get("barcode", product_id) if product else "N/A"
+            order_final = order.get("total_amount", 0)
+            order_cash = order.get("cash_amount", 0)
+            order_voucher = order.get("voucher_amount", 0)
+            total_paid = order_cash + order_voucher
+            if total_paid > order_final:
+                overpay_display = f"¥{total_paid - order_final:.2f} (不设找零)"
+            else:
+                overpay_display = "¥0.00"
+            order_details.append({
+                "订单ID": order.get("order_id", "N/A"),
+                "用户姓名": order.get("user_name", "N/A"),
+                "条码": barcode,
+                "商品名称": item.get("product_name", "N/A"),
+                "单价": f"¥{item.get('price', 0):.2f}",
+                "数量": item.get("quantity", 0),
+                "小计": f"¥{item.get('price', 0) * item.get('quantity', 0):.2f}",
+                "折扣优惠": order.get("discount_text", "无折扣"),
+                "优惠金额": f"¥{order.get('discount_savings', 0):.2f}",
+                "应付金额": f"¥{order_final:.2f}",
+                "现金支付": f"¥{order_cash:.2f}",
+                "内购券支付": f"¥{order_voucher:.2f}",
+                "多付金额": overpay_display,
+                "支付方式": order.get("payment_method", "现金支付"),
+                "订单时间": order.get("order_time", "N/A"),
+            })
+    df = pd.DataFrame(order_details)
+    df["订单时间"] = pd.to_datetime(df["订单时间"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def timed(func, *args):
+    """执行并返回 (结果, 耗时秒)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单明细展开性能对比")
+    parser.add_argument("--sizes", default="10000,100000", help="订单数量列表")
+    parser.add_argument("--products", type=int, default=2000, help="商品数量")
+    parser.add_argument("--items", type=int, default=3, help="每单商品数")
+    args = parser.parse_args()
+
+    print("=" * 64)
+    print(f"{'订单数':>10} | {'明细行数':>10} | {'逐行(s)':>10} | {'列式(s)':>10} | {'加速':>6}")
+    print("-" * 64)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        orders, products = make_data(size, args.products, args.items)
+        legacy_df, legacy_time = timed(legacy_order_details, orders, products)
+        df, columnar_time = timed(build_order_details, orders, products)
+        assert legacy_df.equals(df), "两种方式结果不一致"
+        print(f"{size:>10} | {len(df):>10} | {legacy_time:>10.2f} | {columnar_time:>10.2f} | {legacy_time / columnar_time:>5.1f}x")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+商品列表两种展示方式对比：逐行控件（rows） vs 可编辑表格（table）
+
+用 Streamlit AppTest 以普通用户身份运行 app.py，统计商品页的元素/控件数量和一次重新运行的耗时。
+每次点击（加入购物车、改数量）都会触发一次完整的重新运行，所以重新运行耗时就是交互延迟。
+
+用法:
+    python benchmark_product_grid.py                 # 100个商品（一整页）
+    python benchmark_product_grid.py --products 500 --rounds 20
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+
+def walk(node):
+    """遍历元素树的所有节点"""
+    yield node
+    children = getattr(node, "children", None)
+    if isinstance(children, dict):
+        for child in children.values():
+            yield from walk(child)
+
+
+def run_mode(mode, rounds):
+    """以指定展示方式运行商品页，返回(元素数, 控件数, 每次重新运行耗时列表)"""
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.element_tree import Widget
+
+    os.environ["PRODUCT_GRID_MODE"] = mode
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"),
+                            default_timeout=120)
+    app.session_state["user"] = {"name": "基准用户", "role": "user", "username": "bench", "password": ""}
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.run()  # 首次运行包含建立连接和填充缓存，不计入结果
+        assert not app.exception, app.exception
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            app.run()
+            timings.append((time.perf_counter() - start) * 1000)
+    nodes = list(walk(app._tree))
+    return len(nodes), sum(isinstance(node, Widget) for node in nodes), sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品列表展示方式对比")
+    parser.add_argument("--products", type=int, default=100, help="商品数量（每页最多显示100个）")
+    parser.add_argument("--rounds", type=int, default=10, help="每种方式的重新运行次数")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    from database import DatabaseManager
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatabaseManager(os.environ["DATABASE_URL"]).save_inventory([
+            {"id": f"p{i:05d}", "name": f"基准商品{i}", "price": 1.0 + i % 50, "stock": i % 30,
+             "barcode": f"69{i:011d}", "purchase_limit": i % 3}
+            for i in range(args.products)
+        ])
+
+    print(f"商品数: {args.products}")
+    print("=" * 72)
+    print(f"{'方式':<10} | {'元素数':>8} | {'控件数':>8} | {'p50(ms)':>10} | {'p95(ms)':>10}")
+    print("-" * 72)
+    for mode in ("rows", "table"):
+        nodes, widgets, timings = run_mode(mode, args.rounds)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{mode:<10} | {nodes:>8} | {widgets:>8} | {statistics.median(timings):>10.1f} | {p95:>10.1f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+商品批量导入转换对比：iterrows 逐行处理 vs 整列转换；整体读取 vs 分块读取的峰值内存
+
+用法:
+    python benchmark_product_import.py                  # 1千/1万/10万行
+    python benchmark_product_import.py --rows 200000
+    python benchmark_product_import.py --stream 1000000 # 对比整体读取和分块读取的峰值内存
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from product_import import prepare_products, stream_products
+
+
+def make_csv(rows):
+    """生成导入用的CSV内容，约5%的行缺少条码"""
+    frame = pd.DataFrame({
+        "商品名称": [f"基准商品{i}" for i in range(rows)],
+        "价格": [round(1 + (i % 500) * 0.37, 2) for i in range(rows)],
+        "库存": [i % 40 for i in range(rows)],
+        "描述": [f"商品描述{i % 97}" for i in range(rows)],
+        "条码": [None if i % 20 == 0 else f"69{i:011d}" for i in range(rows)],
+        "限购数量": [i % 3 for i in range(rows)],
+    })
+    return frame.to_csv(index=False).encode("utf-8")
+
+
+def process_single_row(row):
+    """旧方式：逐行 row.get 取值并转换（原 app.process_single_row）"""
+    name = str(row.get("商品名称", row.get("name", ""))).strip()
+    if not name or name == 'nan':
+        return None
+    price = row.get("价格", row.get("price", 0))
+    stock = row.get("库存", row.get("stock", 0))
+    description = str(row.get("描述", row.get("description", ""))).strip()
+    barcode = str(row.get("条码", row.get("code", row.get("barcode", "")))).strip()
+    purchase_limit = row.get("限购数量", row.get("limit", row.get("purchase_limit", 0)))
+    price = float(price) if pd.notna(price) and price != "" else 0.0
+    stock = int(stock) if pd.notna(stock) and stock != "" else 0
+    purchase_limit = int(purchase_limit) if pd.notna(purchase_limit) and purchase_limit != "" else 0
+    if not barcode or barcode == 'nan':
+        barcode = f"{name[:3]}{str(uuid.uuid4())[:6]}"
+    return {
+        "id": str(uuid.uuid4())[:8],
+        "name": name,
+        "price": price,
+        "stock": stock,
+        "description": description,
+        "barcode": barcode,
+        "purchase_limit": purchase_limit,
+        "created_at": datetime.now().isoformat()
+    }
+
+
+def legacy_import(frame):
+    """旧方式：iterrows 逐行处理"""
+    return [product for _, row in frame.iterrows() if (product := process_single_row(row))]
+
+
+def vectorized_import(frame):
+    """新方式：整列转换"""
+    products, _ = prepare_products(frame)
+    return products
+
+
+def whole_file_import(path):
+    """整体读取：一次读入整个文件并转换（分块导入之前的方式）"""
+    frame = pd.read_csv(path, encoding="utf-8")
+    products, _ = prepare_products(frame)
+    return len(products)
+
+
+def chunked_import(path):
+    """分块读取：每块转换后即丢弃（实际导入时写入数据库）"""
+    with open(path, "rb") as source:
+        return sum(len(products) for products, _, _, _ in stream_products(source, path))
+
+
+def measure_peak(func, path, queue):
+    """在子进程中运行，返回 (耗时, 峰值内存增量MB, 商品数)"""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak - baseline) / 1024, count))
+
+
+def compare_streaming(rows):
+    """对比整体读取和分块读取的耗时与峰值内存（各在独立子进程中运行）"""
+    path = os.path.join(tempfile.mkdtemp(), "catalog.csv")
+    with open(path, "wb") as output:
+        output.write(make_csv(rows))
+    print(f"文件: {rows} 行, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+    print("=" * 56)
+    print(f"{'方式':<10} | {'耗时(s)':>10} | {'峰值内存增量(MB)':>16} | {'商品数':>8}")
+    print("-" * 56)
+    context = multiprocessing.get_context("fork")
+    for label, func in (("整体读取", whole_file_import), ("分块读取", chunked_import)):
+        queue = context.Queue()
+        process = context.Process(target=measure_peak, args=(func, path, queue))
+        process.start()
+        elapsed, peak, count = queue.get()
+        process.join()
+        print(f"{label:<10} | {elapsed:>10.2f} | {peak:>16.1f} | {count:>8}")
+    print("=" * 56)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品批量导入转换对比")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="导入行数")
+    parser.add_argument("--stream", type=int, help="对比整体读取和分块读取的峰值内存时使用的行数")
+    args = parser.parse_args()
+
+    if args.stream:
+        compare_streaming(args.stream)
+        return
+
+    print("=" * 64)
+    print(f"{'行数':>8} | {'读取CSV(s)':>10} | {'逐行处理(s)':>12} | {'整列转换(s)':>12} | {'倍数':>6}")
+    print("-" * 64)
+    for rows in args.rows:
+        content = make_csv(rows)
+        start = time.perf_counter()
+        frame = pd.read_csv(io.BytesIO(content), encoding="utf-8")
+        read_time = time.perf_counter() - start
+
+        timings = []
+        for func in (legacy_import, vectorized_import):
+            start = time.perf_counter()
+            products = func(frame)
+            timings.append(time.perf_counter() - start)
+            assert len(products) == rows
+        print(f"{rows:>8} | {read_time:>10.3f} | {timings[0]:>12.3f} | {timings[1]:>12.3f} | {timings[0] / timings[1]:>6.1f}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
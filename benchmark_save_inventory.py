@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+商品保存性能对比：逐条查询写入 vs 批量upsert
+
+用法:
+    python benchmark_save_inventory.py                 # 本地SQLite，1k/10k/100k
+    python benchmark_save_inventory.py --url postgresql://...   # 指定数据库
+    python benchmark_save_inventory.py --legacy-max 100000      # 逐条方式也跑100k（很慢）
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from database import DatabaseManager, Product
+
+
+def make_products(count):
+    """生成测试商品"""
+    return [
+        {
+            "id": f"b{i:07d}",
+            "name": f"基准商品{i}",
+            "price": round(1 + (i % 500) * 0.37, 2),
+            "stock": i % 100,
+            "description": "",
+            "barcode": f"69{i:011d}",
+            "purchase_limit": i % 3,
+            "created_at": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def clear_products(db):
+    """清空商品表，保证每轮起点一致"""
+    session = db.get_session()
+    try:
+        session.query(Product).delete()
+        session.commit()
+    finally:
+        session.close()
+
+
+def timed(func):
+    """执行并返回耗时（秒）"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品保存性能对比")
+    parser.add_argument("--url", help="数据库URL，默认使用临时SQLite文件")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="商品数量列表")
+    parser.add_argument("--legacy-max", type=int, default=10000, help="逐条方式的最大测试规模")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    db = DatabaseManager(url)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    print("=" * 72)
+    print(f"{'商品数':>8} | {'方式':<10} | {'首次写入(s)':>12} | {'全量更新(s)':>12} | {'批次数':>6}")
+    print("-" * 72)
+    for size in sizes:
+        products = make_products(size)
+
+        if size <= args.legacy_max:
+            # 旧方式：每个商品一次 SELECT，再 UPDATE/INSERT
+            clear_products(db)
+            insert_time = timed(lambda: db._merge_products_orm([db._product_row(p) for p in products]))
+            update_time = timed(lambda: db._merge_products_orm([db._product_row(p) for p in products]))
+            print(f"{size:>8} | {'逐条查询':<10} | {insert_time:>12.3f} | {update_time:>12.3f} | {size:>6}")
+        else:
+            print(f"{size:>8} | {'逐条查询':<10} | {'跳过':>12} | {'跳过':>12} | {'-':>6}")
+
+        clear_products(db)
+        chunk_counts = []
+        insert_time = timed(lambda: chunk_counts.extend(db.bulk_upsert_products(products)))
+        update_time = timed(lambda: db.bulk_upsert_products(products))
+        print(f"{size:>8} | {'批量upsert':<10} | {insert_time:>12.3f} | {update_time:>12.3f} | {len(chunk_counts):>6}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
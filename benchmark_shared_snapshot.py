@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+多会话数据读取对比：逐会话反序列化副本（st.cache_data 的方式） vs 进程内共享只读快照
+
+模拟 N 个会话同时持有一次读取的结果，统计内存占用和每次读取耗时。
+
+用法:
+    python benchmark_shared_snapshot.py                      # 10/50/200个会话
+    python benchmark_shared_snapshot.py --sessions 500 --products 20000
+"""
+
+import argparse
+import gc
+import pickle
+import statistics
+import time
+import tracemalloc
+
+from shared_snapshot import SharedSnapshot
+
+
+def make_products(count):
+    """生成与 load_inventory 结构相同的商品字典"""
+    return [
+        {
+            "id": f"p{i:07d}",
+            "name": f"基准商品{i}",
+            "price": round(1 + (i % 500) * 0.37, 2),
+            "stock": i % 40,
+            "description": f"商品描述{i % 97}",
+            "barcode": f"69{i:011d}",
+            "purchase_limit": i % 3,
+            "created_at": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def make_orders(count, product_count):
+    """生成与 load_orders 结构相同的订单字典"""
+    return [
+        {
+            "order_id": f"o{i:07d}",
+            "user_name": f"用户{i % 300}",
+            "items": [
+                {"product_id": f"p{(i * 7 + k) % product_count:07d}", "product_name": f"基准商品{k}",
+                 "price": 2.5, "quantity": 1 + k}
+                for k in range(3)
+            ],
+            "total_amount": 12.5,
+            "payment_method": "现金支付",
+            "order_time": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def held_bytes(read, sessions):
+    """N个会话各读取一次并同时持有结果时占用的内存（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    held = [read() for _ in range(sessions)]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current
+
+
+def median_ms(func, rounds=20):
+    """多次执行取耗时中位数（毫秒）"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话数据读取对比")
+    parser.add_argument("--sessions", default="10,50,200", help="并发会话数列表")
+    parser.add_argument("--products", type=int, default=5000, help="商品数量")
+    parser.add_argument("--orders", type=int, default=5000, help="订单数量")
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    orders = make_orders(args.orders, args.products)
+    # st.cache_data 缓存的是pickle字节，每次命中都反序列化出一份新副本
+    pickled = pickle.dumps((products, orders))
+    shared_products = SharedSnapshot(lambda: products, key="id")
+    shared_orders = SharedSnapshot(lambda: orders, key="order_id")
+    gc.collect()
+    tracemalloc.start()
+    shared_products.get(1)
+    shared_orders.get(1)
+    gc.collect()
+    snapshot_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def copy_read():
+        return pickle.loads(pickled)
+
+    def shared_read():
+        return shared_products.get(1), shared_orders.get(1)
+
+    copy_ms = median_ms(copy_read)
+    shared_ms = median_ms(shared_read, rounds=1000)
+    print(f"数据量: {args.products} 个商品, {args.orders} 个订单")
+    print(f"单次读取: 反序列化副本 {copy_ms:.2f} ms, 共享快照 {shared_ms * 1000:.2f} µs")
+    print("=" * 64)
+    print(f"{'会话数':>8} | {'副本(MB)':>12} | {'共享快照(MB)':>14} | {'节省':>8}")
+    print("-" * 64)
+    for sessions in [int(s) for s in args.sessions.split(",")]:
+        copy_bytes = held_bytes(copy_read, sessions)
+        shared_bytes = held_bytes(shared_read, sessions)
+        print(f"{sessions:>8} | {copy_bytes / 1e6:>12.1f} | {shared_bytes / 1e6:>14.3f} | "
+              f"{1 - shared_bytes / copy_bytes:>7.1%}")
+    print("=" * 64)
+    print(f"共享快照本身在进程内只有一份（{snapshot_bytes / 1e6:.1f} MB），与会话数无关")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+商品筛选引擎：把筛选条件编译为对列式商品快照（InventorySnapshot）的一次布尔掩码计算
+
+管理员库存页和用户购买页共用同一套筛选规则，库存状态定义与数据库查询
+（DatabaseManager.query_products）共用 catalog_rules 中的同一份。
+"""
+
+import numpy as np
+
+from catalog_rules import LIMIT_STATES, STOCK_RANGES
+
+
+class CompiledFilter:
+    """编译后的筛选条件"""
+    
+    def __init__(self, predicates, ranked=None):
+        self.predicates = predicates
+        self.ranked = ranked  # 名称筛选条件，结果按其匹配质量排序
+    
+    def mask(self, table):
+        """所有条件合并后的布尔掩码"""
+        mask = np.ones(len(table), dtype=bool)
+        for predicate in self.predicates:
+            mask &= predicate(table)
+        return mask
+    
+    def indices(self, table):
+        """符合条件的行号；有关键词时按匹配质量排序，否则保持表中顺序"""
+        mask = self.mask(table)
+        if self.ranked is None:
+            return np.flatnonzero(mask)
+        positions = self.ranked.positions(table)
+        return positions[mask[positions]]
+
+
+class _IdPredicate:
+    """商品ID列表 -> 按行号置位的掩码（行号对同一张表只计算一次）"""
+    
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        self._table = None
+        self._positions = None
+    
+    def positions(self, table):
+        if self._table is not table:
+            self._table = table
+            self._positions = table.positions_of(self.product_ids)
+        return self._positions
+    
+    def __call__(self, table):
+        mask = np.zeros(len(table), dtype=bool)
+        mask[self.positions(table)] = True
+        return mask
+
+
+def compile_filters(filters, name_search=None, barcode_lookup=None):
+    """把筛选条件编译为CompiledFilter
+    
+    filters: {"name", "barcode", "price_min", "price_max", "stock", "limit"}，取值含义与
+    DatabaseManager.query_products 相同；name_search(关键词) 返回按匹配质量排序的商品ID，
+    barcode_lookup(条码) 返回商品ID，分别用于名称和条码筛选。
+    """
+    predicates = []
+    ranked = None
+    for key, value in (filters or {}).items():
+        if value is None or value == "":
+            continue
+        if key == "name":
+            if name_search is None:
+                raise ValueError("名称筛选需要提供name_search")
+            ranked = _IdPredicate(name_search(value))
+            predicates.append(ranked)
+        elif key == "barcode":
+            if barcode_lookup is None:
+                raise ValueError("条码筛选需要提供barcode_lookup")
+            predicates.append(_IdPredicate(barcode_lookup(value)))
+        elif key == "price_min":
+            predicates.append(lambda table, low=value: table.prices >= low)
+        elif key == "price_max":
+            predicates.append(lambda table, high=value: table.prices <= high)
+        elif key == "stock":
+            if value not in STOCK_RANGES:
+                raise ValueError(f"不支持的库存筛选: {value}")
+            low, high = STOCK_RANGES[value]
+            predicates.append(lambda table, low=low: table.stocks >= low)
+            if high is not None:
+                predicates.append(lambda table, high=high: table.stocks <= high)
+        elif key == "limit":
+            if value not in LIMIT_STATES:
+                raise ValueError(f"不支持的限购筛选: {value}")
+            if value == "limited":
+                predicates.append(lambda table: table.purchase_limits > 0)
+            else:
+                predicates.append(lambda table: table.purchase_limits == 0)
+        else:
+            raise ValueError(f"不支持的筛选条件: {key}")
+    return CompiledFilter(predicates, ranked)
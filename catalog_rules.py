@@ -0,0 +1,11 @@
+"""
+商品筛选规则：库存状态和限购状态的取值定义
+
+数据库查询（DatabaseManager.query_products）和进程内筛选引擎（catalog_filter）共用，
+本模块不依赖数据库和NumPy，两边都可以直接导入。
+"""
+
+# 库存筛选：取值 -> (最小库存, 最大库存)，None表示不限
+STOCK_RANGES = {"in_stock": (1, None), "plenty": (11, None), "low": (1, 10), "out": (0, 0)}
+# 限购筛选取值
+LIMIT_STATES = ("limited", "unlimited")
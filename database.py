@@ -1,16 +1,66 @@
 import os
 import json
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, Index, text, insert, update, func, inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import streamlit as st
 import uuid
 import time
+import threading
+import select
+from catalog_rules import STOCK_RANGES
 
 # 数据库配置
 Base = declarative_base()
 
+# 数据库结构版本：新增表、字段或数据迁移时递增，启动时版本落后才执行建表和迁移
+SCHEMA_VERSION = 2
+
+# 数据版本号：每次写入后递增，缓存按版本号判断是否需要重新加载
+_data_versions = {"products": 0, "orders": 0, "users": 0}
+_data_versions_lock = threading.Lock()
+
+def get_data_version(name):
+    """获取数据版本号"""
+    return _data_versions.get(name, 0)
+
+def bump_data_version(name):
+    """数据写入后递增版本号"""
+    with _data_versions_lock:
+        _data_versions[name] = _data_versions.get(name, 0) + 1
+        return _data_versions[name]
+
+# 多副本部署时的缓存失效通知：PostgreSQL使用LISTEN/NOTIFY，其他数据库轮询data_versions表
+INVALIDATION_CHANNEL = "shop_data_changed"
+# 本进程标识，用于忽略自己发出的通知
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+# 本进程提交过的data_versions版本号（(数据库URL, 数据名称) -> 版本号集合），轮询时忽略自己的写入
+_own_versions = {}
+_own_versions_lock = threading.Lock()
+
+def _record_own_versions(engine, versions):
+    """记录本进程已提交的共享版本号"""
+    with _own_versions_lock:
+        for name, version in versions.items():
+            _own_versions.setdefault((str(engine.url), name), set()).add(version)
+
+def _only_own_versions(engine, name, old_version, new_version):
+    """(old_version, new_version] 之间的版本是否全部由本进程提交；同时清理已轮询过的记录"""
+    with _own_versions_lock:
+        own = _own_versions.get((str(engine.url), name), set())
+        only_own = old_version is not None and all(
+            version in own for version in range(old_version + 1, new_version + 1))
+        own.difference_update([version for version in own if version <= new_version])
+        return only_own
+
+# 进程内共享的数据库引擎和会话工厂（按数据库URL），所有Streamlit会话复用同一个连接池
+_engines = {}
+_engines_lock = threading.Lock()
+
 # 检测Render环境
 def is_render_environment():
     """检测是否在Render环境中运行"""
@@ -58,18 +108,69 @@ class Order(Base):
     voucher_amount = Column(Float, nullable=False)
     order_time = Column(String(50), nullable=False)  # 存储ISO格式时间字符串
 
+# 订单明细模型（与orders.items_json同步，用于按用户/商品统计购买数量）
+class OrderItem(Base):
+    __tablename__ = 'order_items'
+    __table_args__ = (
+        Index('ix_order_items_user_product', 'user_name', 'product_id'),
+        Index('ix_order_items_product', 'product_id'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String(50), nullable=False, index=True)
+    user_name = Column(String(100), nullable=False)
+    product_id = Column(String(50), nullable=False)
+    product_name = Column(String(200))
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=False)
+
+# 数据库结构版本记录
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(String(50))
+
+# 数据版本计数（跨进程共享，无NOTIFY的数据库靠轮询它发现其他副本的写入）
+class DataVersion(Base):
+    __tablename__ = 'data_versions'
+    
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 # 数据库连接和操作类
 class DatabaseManager:
-    def __init__(self):
+    # 批量写入商品时每批的行数
+    UPSERT_CHUNK_SIZE = 1000
+    # 允许通过变更集修改的商品字段
+    PRODUCT_CHANGE_FIELDS = ("name", "price", "stock", "description", "barcode", "purchase_limit")
+    # 商品查询允许的排序字段
+    PRODUCT_SORT_FIELDS = ("id", "name", "price", "stock", "barcode", "purchase_limit", "created_at")
+    # 库存筛选：名称 -> (最小库存, 最大库存)，与进程内筛选引擎共用
+    STOCK_FILTERS = STOCK_RANGES
+    
+    def __init__(self, database_url=None):
         self.engine = None
         self.Session = None
+        self.database_url = database_url
         self.connect()
     
     def connect(self):
-        """连接数据库"""
+        """连接数据库：同一进程内每个数据库只初始化一次，之后复用引擎和连接池"""
+        engine_key = self.database_url or os.getenv('DATABASE_URL') or ''
+        with _engines_lock:
+            shared = _engines.get(engine_key)
+            if shared is None:
+                self._connect_new()
+                shared = _engines[engine_key] = (self.engine, self.Session)
+        self.engine, self.Session = shared
+    
+    def _connect_new(self):
+        """创建数据库引擎并初始化表结构"""
         try:
-            # 从环境变量获取数据库URL
-            database_url = os.getenv('DATABASE_URL')
+            # 优先使用显式传入的URL，否则从环境变量获取数据库URL
+            database_url = self.database_url or os.getenv('DATABASE_URL')
             print(f"🔍 环境变量检查:")
             print(f"   DATABASE_URL存在: {'是' if database_url else '否'}")
             
@@ -115,21 +216,14 @@ class DatabaseManager:
             
             self.Session = sessionmaker(bind=self.engine)
             
-            # 测试数据库连接
-            print("🔍 测试数据库连接...")
-            with self.engine.connect() as connection:
-                result = connection.execute(text("SELECT 1"))
-                print("✅ 数据库连接测试成功")
-            
-            # 创建表
-            print("🔍 创建/验证数据库表...")
-            Base.metadata.create_all(self.engine)
-            print("✅ 数据库表创建/验证完成")
-            
-            # 初始化管理员用户
-            print("🔍 初始化管理员用户...")
-            self.init_admin_user()
-            print("✅ 管理员用户初始化完成")
+            # 检查数据库结构版本（同时作为连接测试），只有版本缺失或落后时才建表和迁移
+            print("🔍 检查数据库结构版本...")
+            current_version = self.get_schema_version()
+            if current_version is not None and current_version >= SCHEMA_VERSION:
+                print(f"✅ 数据库结构版本 {current_version} 已是最新")
+            else:
+                print(f"🔧 数据库结构版本 {current_version} -> {SCHEMA_VERSION}，开始初始化...")
+                self.bootstrap_schema()
             
             # 显示连接成功信息
             db_type = "SQLite" if database_url.startswith('sqlite://') else "PostgreSQL"
@@ -163,6 +257,83 @@ class DatabaseManager:
         """获取数据库会话"""
         return self.Session()
     
+    def _publish_data_changes(self, executor, *names):
+        """在写事务内发布数据变更，随事务提交一起生效，其他副本据此失效缓存
+        
+        非PostgreSQL数据库返回本事务写入的共享版本号，调用方在提交后用 _record_own_versions 记录，
+        轮询时据此忽略本进程自己的写入。
+        """
+        if not names:
+            return {}
+        if self.engine.dialect.name == "postgresql":
+            for name in names:
+                executor.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {"channel": INVALIDATION_CHANNEL, "payload": f"{_PROCESS_TOKEN}:{name}"})
+            return {}
+        executor.execute(update(DataVersion).where(DataVersion.name.in_(names))
+                         .values(version=DataVersion.version + 1))
+        # 本事务已锁定这些行，读到的就是本次写入的版本号
+        rows = executor.execute(DataVersion.__table__.select().where(DataVersion.name.in_(names)))
+        return {row.name: row.version for row in rows}
+    
+    def _commit_data_changes(self, session, *names):
+        """发布数据变更并提交事务，然后递增本进程的数据版本号"""
+        versions = self._publish_data_changes(session, *names)
+        session.commit()
+        _record_own_versions(self.engine, versions)
+        for name in names:
+            bump_data_version(name)
+    
+    def get_schema_version(self):
+        """读取数据库结构版本，尚未初始化时返回None"""
+        try:
+            with self.engine.connect() as connection:
+                return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+        except (OperationalError, ProgrammingError):
+            # 只有版本表不存在才视为未初始化，其他错误（如连接失败）继续抛出
+            if inspect(self.engine).has_table(SchemaVersion.__tablename__):
+                raise
+            return None
+    
+    def bootstrap_schema(self):
+        """一次性初始化：建表、执行数据迁移、初始化管理员，最后记录结构版本"""
+        print("🔍 创建/验证数据库表...")
+        Base.metadata.create_all(self.engine)
+        print("✅ 数据库表创建/验证完成")
+        
+        # 初始化跨副本共享的数据版本计数
+        session = self.get_session()
+        try:
+            existing = {row.name for row in session.query(DataVersion).all()}
+            session.add_all(DataVersion(name=name, version=0) for name in _data_versions if name not in existing)
+            session.commit()
+        finally:
+            session.close()
+        
+        # 迁移：从items_json回填订单明细表
+        self.backfill_order_items()
+        
+        # 初始化管理员用户
+        print("🔍 初始化管理员用户...")
+        self.init_admin_user()
+        print("✅ 管理员用户初始化完成")
+        
+        session = self.get_session()
+        try:
+            record = session.query(SchemaVersion).first()
+            if record:
+                record.version = SCHEMA_VERSION
+                record.updated_at = datetime.now().isoformat()
+            else:
+                session.add(SchemaVersion(version=SCHEMA_VERSION, updated_at=datetime.now().isoformat()))
+            session.commit()
+            print(f"✅ 数据库结构版本已更新为 {SCHEMA_VERSION}")
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
     def init_admin_user(self):
         """初始化管理员用户"""
         session = self.get_session()
@@ -176,7 +347,7 @@ class DatabaseManager:
                     role="admin"
                 )
                 session.add(admin_user)
-                session.commit()
+                self._commit_data_changes(session, "users")
         except Exception as e:
             session.rollback()
         finally:
@@ -188,53 +359,243 @@ class DatabaseManager:
         session = self.get_session()
         try:
             products = session.query(Product).all()
-            return [
-                {
-                    "id": p.id,
-                    "name": p.name,
-                    "price": p.price,
-                    "stock": p.stock,
-                    "description": p.description or "",
-                    "barcode": p.barcode or "",
-                    "purchase_limit": p.purchase_limit or 0,
-                    "created_at": p.created_at or datetime.now().isoformat()
-                }
-                for p in products
-            ]
+            return [self._product_dict(p) for p in products]
+        finally:
+            session.close()
+    
+    def _product_dict(self, p):
+        """把Product对象转换为商品字典"""
+        return {
+            "id": p.id,
+            "name": p.name,
+            "price": p.price,
+            "stock": p.stock,
+            "description": p.description or "",
+            "barcode": p.barcode or "",
+            "purchase_limit": p.purchase_limit or 0,
+            "created_at": p.created_at or datetime.now().isoformat()
+        }
+    
+    def _product_filter_conditions(self, filters):
+        """把商品筛选条件转换为SQL条件列表"""
+        conditions = []
+        for key, value in (filters or {}).items():
+            if value is None or value == "":
+                continue
+            if key == "name":
+                conditions.append(func.lower(Product.name).contains(str(value).lower(), autoescape=True))
+            elif key == "barcode":
+                # 条码按前缀匹配（完整条码即自身前缀），与扫码和输入前几位的用法一致
+                conditions.append(Product.barcode.startswith(str(value).strip(), autoescape=True))
+            elif key == "price_min":
+                conditions.append(Product.price >= value)
+            elif key == "price_max":
+                conditions.append(Product.price <= value)
+            elif key == "stock":
+                if value not in self.STOCK_FILTERS:
+                    raise ValueError(f"不支持的库存筛选: {value}")
+                low, high = self.STOCK_FILTERS[value]
+                conditions.append(Product.stock >= low)
+                if high is not None:
+                    conditions.append(Product.stock <= high)
+            elif key == "limit":
+                if value == "limited":
+                    conditions.append(func.coalesce(Product.purchase_limit, 0) > 0)
+                elif value == "unlimited":
+                    conditions.append(func.coalesce(Product.purchase_limit, 0) == 0)
+                else:
+                    raise ValueError(f"不支持的限购筛选: {value}")
+            else:
+                raise ValueError(f"不支持的筛选条件: {key}")
+        return conditions
+    
+    def query_products(self, filters=None, sort=None, page=1, page_size=100):
+        """按条件在数据库中筛选、排序并分页查询商品
+        
+        filters: {"name", "barcode", "price_min", "price_max", "stock", "limit"}，barcode按前缀匹配，
+        stock取值见STOCK_FILTERS，limit取值为"limited"/"unlimited"；
+        sort: 字段名列表，前缀"-"表示倒序，默认按创建时间。
+        页码超出范围时返回最后一页，返回 {"items", "total", "page", "total_pages"}。
+        """
+        order_by = []
+        for field in sort or ["created_at"]:
+            name = field.lstrip("-")
+            if name not in self.PRODUCT_SORT_FIELDS:
+                raise ValueError(f"不支持的排序字段: {field}")
+            column = getattr(Product, name)
+            descending = field.startswith("-")
+            order_by.append(column.desc() if descending else column.asc())
+        order_by.append(Product.id.asc())  # 保证分页顺序稳定
+        
+        session = self.get_session()
+        try:
+            query = session.query(Product).filter(*self._product_filter_conditions(filters))
+            total = query.count()
+            total_pages = max(1, (total + page_size - 1) // page_size)
+            page = min(max(1, page), total_pages)
+            products = query.order_by(*order_by).offset((page - 1) * page_size).limit(page_size).all()
+            return {
+                "items": [self._product_dict(p) for p in products],
+                "total": total,
+                "page": page,
+                "total_pages": total_pages
+            }
+        finally:
+            session.close()
+    
+    def get_product_stats(self):
+        """商品总数和价格范围（用于筛选控件，不加载商品行）"""
+        session = self.get_session()
+        try:
+            count, min_price, max_price = session.query(
+                func.count(Product.id), func.min(Product.price), func.max(Product.price)
+            ).one()
+            return {"count": count, "min_price": min_price or 0, "max_price": max_price or 0}
+        finally:
+            session.close()
+    
+    def get_order_stats(self):
+        """订单数量和金额汇总（用于统计卡片，不加载订单行）"""
+        session = self.get_session()
+        try:
+            count, original, savings, total, cash, voucher = session.query(
+                func.count(Order.id),
+                func.sum(Order.original_amount),
+                func.sum(Order.discount_savings),
+                func.sum(Order.total_amount),
+                func.sum(Order.cash_amount),
+                func.sum(Order.voucher_amount),
+            ).one()
+            return {
+                "count": count,
+                "original_amount": original or 0,
+                "discount_savings": savings or 0,
+                "total_amount": total or 0,
+                "cash_amount": cash or 0,
+                "voucher_amount": voucher or 0,
+            }
+        finally:
+            session.close()
+    
+    def count_users(self):
+        """用户总数（不加载用户行）"""
+        session = self.get_session()
+        try:
+            return session.query(func.count(User.id)).scalar()
         finally:
             session.close()
     
     def save_inventory(self, inventory_data):
-        """保存商品数据"""
+        """保存商品数据（按批次批量upsert），返回写入的总行数"""
+        return sum(self.bulk_upsert_products(inventory_data))
+    
+    def _product_row(self, item):
+        """把商品字典转换为products表的一行"""
+        return {
+            "id": item.get("id") or str(uuid.uuid4())[:8],
+            "name": item["name"],
+            "price": item["price"],
+            "stock": item["stock"],
+            "description": item.get("description", ""),
+            "barcode": item.get("barcode", ""),
+            "purchase_limit": item.get("purchase_limit", 0),
+            "created_at": item.get("created_at", datetime.now().isoformat())
+        }
+    
+    def bulk_upsert_products(self, inventory_data, chunk_size=None):
+        """批量插入或更新商品，返回每批写入的行数列表
+        
+        PostgreSQL和SQLite使用 INSERT ... ON CONFLICT (id) DO UPDATE，
+        每批以executemany方式一次发送；其他数据库退回逐条查询的ORM方式。
+        """
+        # 同一ID出现多次时以最后一条为准（与逐条更新的结果一致），
+        # 同时避免同一批次内ON CONFLICT重复命中同一行
+        rows = {}
+        for item in inventory_data:
+            row = self._product_row(item)
+            rows[row["id"]] = row
+        rows = list(rows.values())
+        if not rows:
+            return []
+        
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            insert_factory = pg_insert
+        elif dialect == 'sqlite':
+            insert_factory = sqlite_insert
+        else:
+            return [self._merge_products_orm(rows)]
+        
+        columns = list(rows[0].keys())
+        chunk_size = chunk_size or self.UPSERT_CHUNK_SIZE
+        stmt = insert_factory(Product)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_={column: stmt.excluded[column] for column in columns if column != "id"}
+        )
+        chunk_counts = []
+        # 所有批次在同一事务中提交，任何一批失败都整体回滚
+        with self.engine.begin() as connection:
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                result = connection.execute(stmt, chunk)
+                chunk_counts.append(result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(chunk))
+            versions = self._publish_data_changes(connection, "products")
+        _record_own_versions(self.engine, versions)
+        bump_data_version("products")
+        return chunk_counts
+    
+    def apply_product_changes(self, changes):
+        """按变更集更新商品，返回实际更新的商品数
+
+        changes格式: {商品ID: {字段: 新值}}，只写入出现的商品和字段；
+        字段 stock_delta 表示在数据库当前库存上增减，而不是覆盖库存。
+        所有变更在同一事务中提交。
+        """
+        if not changes:
+            return 0
+
         session = self.get_session()
         try:
-            # 更新现有商品或添加新商品
-            for item in inventory_data:
-                product = session.query(Product).filter_by(id=item["id"]).first()
+            updated_count = 0
+            for product_id, fields in changes.items():
+                unknown_fields = set(fields) - set(self.PRODUCT_CHANGE_FIELDS) - {"stock_delta"}
+                if unknown_fields:
+                    raise ValueError(f"不支持修改的商品字段: {', '.join(sorted(unknown_fields))}")
+
+                values = {field: value for field, value in fields.items() if field != "stock_delta"}
+                if fields.get("stock_delta"):
+                    values["stock"] = Product.stock + fields["stock_delta"]
+                if not values:
+                    continue
+
+                updated_count += session.query(Product).filter(Product.id == product_id).update(
+                    values, synchronize_session=False
+                )
+            if updated_count:
+                self._commit_data_changes(session, "products")
+            else:
+                session.commit()
+            return updated_count
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def _merge_products_orm(self, rows):
+        """逐条查询后更新或插入商品（通用兼容方式），返回写入行数"""
+        session = self.get_session()
+        try:
+            for row in rows:
+                product = session.query(Product).filter_by(id=row["id"]).first()
                 if product:
-                    # 更新现有商品
-                    product.name = item["name"]
-                    product.price = item["price"]
-                    product.stock = item["stock"]
-                    product.description = item.get("description", "")
-                    product.barcode = item.get("barcode", "")
-                    product.purchase_limit = item.get("purchase_limit", 0)
-                    product.created_at = item.get("created_at", datetime.now().isoformat())
+                    for column, value in row.items():
+                        setattr(product, column, value)
                 else:
-                    # 添加新商品
-                    product = Product(
-                        id=item.get("id", str(uuid.uuid4())[:8]),
-                        name=item["name"],
-                        price=item["price"],
-                        stock=item["stock"],
-                        description=item.get("description", ""),
-                        barcode=item.get("barcode", ""),
-                        purchase_limit=item.get("purchase_limit", 0),
-                        created_at=item.get("created_at", datetime.now().isoformat())
-                    )
-                    session.add(product)
-            
-            session.commit()
+                    session.add(Product(**row))
+            self._commit_data_changes(session, "products")
+            return len(rows)
         except Exception as e:
             session.rollback()
             raise e
@@ -267,37 +628,99 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def _build_order(self, order_data, items):
+        """根据订单字典创建Order对象"""
+        return Order(
+            order_id=order_data["order_id"],
+            user_name=order_data["user_name"],
+            items_json=json.dumps(items),
+            original_amount=order_data["original_amount"],
+            total_items=order_data["total_items"],
+            discount_rate=order_data["discount_rate"],
+            discount_text=order_data["discount_text"],
+            discount_savings=order_data["discount_savings"],
+            total_amount=order_data["total_amount"],
+            payment_method=order_data["payment_method"],
+            cash_amount=order_data["cash_amount"],
+            voucher_amount=order_data["voucher_amount"],
+            order_time=order_data["order_time"]
+        )
+    
+    def _order_item_rows(self, order_id, user_name, items):
+        """根据订单商品列表生成order_items的行数据"""
+        return [
+            {
+                "order_id": order_id,
+                "user_name": user_name,
+                "product_id": item.get("product_id", ""),
+                "product_name": item.get("product_name", ""),
+                "quantity": item.get("quantity", 0),
+                "unit_price": item.get("price", item.get("unit_price", 0)),
+            }
+            for item in items
+        ]
+    
+    def _build_order_items(self, order_id, user_name, items):
+        """根据订单商品列表创建OrderItem对象"""
+        return [OrderItem(**row) for row in self._order_item_rows(order_id, user_name, items)]
+    
+    def backfill_order_items(self):
+        """迁移：为还没有明细行的订单从items_json生成order_items，返回回填的订单数"""
+        session = self.get_session()
+        try:
+            synced_order_ids = session.query(OrderItem.order_id).distinct()
+            orders = session.query(Order).filter(~Order.order_id.in_(synced_order_ids)).all()
+            for order in orders:
+                items = json.loads(order.items_json) if order.items_json else []
+                session.add_all(self._build_order_items(order.order_id, order.user_name, items))
+            if orders:
+                self._commit_data_changes(session, "orders")
+                print(f"✅ 订单明细回填完成: {len(orders)} 个订单")
+            return len(orders)
+        except Exception as e:
+            session.rollback()
+            print(f"❌ 订单明细回填失败: {e}")
+            raise e
+        finally:
+            session.close()
+    
+    def get_user_purchase_quantities(self, user_name, exclude_order_id=None):
+        """获取用户各商品的历史购买数量 {商品ID: 数量}"""
+        session = self.get_session()
+        try:
+            query = session.query(OrderItem.product_id, func.sum(OrderItem.quantity)).filter(
+                OrderItem.user_name == user_name
+            )
+            if exclude_order_id:
+                query = query.filter(OrderItem.order_id != exclude_order_id)
+            return {product_id: int(quantity or 0) for product_id, quantity in query.group_by(OrderItem.product_id)}
+        finally:
+            session.close()
+    
+    def get_product_sales(self):
+        """获取各商品的累计销售数量 {商品ID: 数量}"""
+        session = self.get_session()
+        try:
+            query = session.query(OrderItem.product_id, func.sum(OrderItem.quantity)).group_by(OrderItem.product_id)
+            return {product_id: int(quantity or 0) for product_id, quantity in query}
+        finally:
+            session.close()
+    
     def add_order(self, order_data):
-        """添加订单"""
+        """添加订单，返回写入的订单明细行数（提交失败时抛出异常）"""
         session = self.get_session()
         try:
             print(f"🔄 开始保存订单: {order_data['order_id']}")
-            order = Order(
-                order_id=order_data["order_id"],
-                user_name=order_data["user_name"],
-                items_json=json.dumps(order_data["items"]),
-                original_amount=order_data["original_amount"],
-                total_items=order_data["total_items"],
-                discount_rate=order_data["discount_rate"],
-                discount_text=order_data["discount_text"],
-                discount_savings=order_data["discount_savings"],
-                total_amount=order_data["total_amount"],
-                payment_method=order_data["payment_method"],
-                cash_amount=order_data["cash_amount"],
-                voucher_amount=order_data["voucher_amount"],
-                order_time=order_data["order_time"]
-            )
+            order = self._build_order(order_data, order_data["items"])
             session.add(order)
-            session.commit()
+            rows = self._order_item_rows(order.order_id, order.user_name, order_data["items"])
+            written_items = 0
+            if rows:
+                # 按INSERT ... RETURNING实际返回的主键计数，不再回查刚写入的明细
+                written_items = len(session.execute(insert(OrderItem).returning(OrderItem.id), rows).all())
+            self._commit_data_changes(session, "orders")
             print(f"✅ 订单保存成功: {order_data['order_id']}")
-            
-            # 验证保存
-            saved_order = session.query(Order).filter_by(order_id=order_data['order_id']).first()
-            if saved_order:
-                print(f"✅ 验证成功: 订单 {order_data['order_id']} 已存在于数据库")
-            else:
-                print(f"❌ 验证失败: 订单 {order_data['order_id']} 未找到")
-                
+            return written_items
         except Exception as e:
             session.rollback()
             print(f"❌ 订单保存失败: {e}")
@@ -305,6 +728,66 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def place_order(self, order_data, items):
+        """原子下单：在同一事务中按条件扣减库存并保存订单
+        
+        商品行按ID顺序加锁和扣减，避免并发结账互相死锁；库存通过
+        UPDATE ... WHERE stock >= 数量 扣减，不会超卖。任一商品库存不足时
+        整体回滚，返回 {"success": False, "shortfalls": [...]}，
+        每项包含 product_id、product_name、requested、available。
+        """
+        # 同一商品可能在购物车中出现多次，合并后再扣减
+        requested = {}
+        for item in items:
+            requested[item["product_id"]] = requested.get(item["product_id"], 0) + item["quantity"]
+        product_ids = sorted(requested)
+        
+        session = self.get_session()
+        try:
+            # 按商品ID顺序锁定相关商品行（SQLite忽略FOR UPDATE，写事务本身串行）
+            locked_products = {
+                p.id: p for p in session.query(Product.id, Product.name, Product.stock)
+                .filter(Product.id.in_(product_ids))
+                .order_by(Product.id)
+                .with_for_update()
+                .all()
+            }
+            
+            shortfalls = []
+            for product_id in product_ids:
+                quantity = requested[product_id]
+                result = session.execute(
+                    update(Product)
+                    .where(Product.id == product_id, Product.stock >= quantity)
+                    .values(stock=Product.stock - quantity)
+                )
+                if result.rowcount == 0:
+                    product = locked_products.get(product_id)
+                    shortfalls.append({
+                        "product_id": product_id,
+                        "product_name": product.name if product else "",
+                        "requested": quantity,
+                        "available": product.stock if product else 0
+                    })
+            
+            if shortfalls:
+                session.rollback()
+                print(f"⚠️ 订单 {order_data['order_id']} 库存不足，已回滚: {len(shortfalls)} 件商品")
+                return {"success": False, "order_id": order_data["order_id"], "shortfalls": shortfalls}
+            
+            order = self._build_order(order_data, items)
+            session.add(order)
+            session.add_all(self._build_order_items(order.order_id, order.user_name, items))
+            self._commit_data_changes(session, "products", "orders")
+            print(f"✅ 订单保存成功: {order_data['order_id']}")
+            return {"success": True, "order_id": order_data["order_id"], "shortfalls": []}
+        except Exception as e:
+            session.rollback()
+            print(f"❌ 下单失败: {e}")
+            raise e
+        finally:
+            session.close()
+    
     def update_order(self, order_id, order_data):
         """更新订单 - Render环境优化版本"""
         session = None
@@ -341,9 +824,13 @@ class DatabaseManager:
             existing_order.voucher_amount = order_data.get("voucher_amount", existing_order.voucher_amount)
             # order_time 保持原值
             
+            # 同步订单明细
+            session.query(OrderItem).filter(OrderItem.order_id == order_id).delete(synchronize_session=False)
+            session.add_all(self._build_order_items(order_id, existing_order.user_name, order_data.get("items", [])))
+            
             # 使用显式的flush和commit，增强事务控制
             session.flush()  # 先flush确保数据写入缓冲区
-            session.commit()  # 然后提交事务
+            self._commit_data_changes(session, "orders")  # 然后提交事务
             
             print(f"✅ 订单更新成功: {order_id}")
             return True
@@ -392,7 +879,7 @@ class DatabaseManager:
                 role=user_data["role"]
             )
             session.add(user)
-            session.commit()
+            self._commit_data_changes(session, "users")
         except Exception as e:
             session.rollback()
             raise e
@@ -404,8 +891,9 @@ class DatabaseManager:
         session = self.get_session()
         try:
             # 使用TRUNCATE来重置自增ID（如果需要）
+            session.execute(text("DELETE FROM order_items"))
             session.execute(text("DELETE FROM orders"))
-            session.commit()
+            self._commit_data_changes(session, "orders")
             print("✅ 订单数据清空成功")
         except Exception as e:
             session.rollback()
@@ -418,8 +906,9 @@ class DatabaseManager:
         """删除指定订单"""
         session = self.get_session()
         try:
+            session.query(OrderItem).filter(OrderItem.order_id == order_id).delete(synchronize_session=False)
             deleted_count = session.query(Order).filter(Order.order_id == order_id).delete()
-            session.commit()
+            self._commit_data_changes(session, "orders")
             if deleted_count > 0:
                 print(f"✅ 订单 {order_id} 删除成功")
                 return True
@@ -438,7 +927,7 @@ class DatabaseManager:
         session = self.get_session()
         try:
             session.execute(text("DELETE FROM products"))
-            session.commit()
+            self._commit_data_changes(session, "products")
             print("✅ 商品数据清空成功")
         except Exception as e:
             session.rollback()
@@ -453,7 +942,7 @@ class DatabaseManager:
         try:
             # 只删除非管理员用户，保留管理员666
             session.execute(text("DELETE FROM users WHERE name != '管理员666'"))
-            session.commit()
+            self._commit_data_changes(session, "users")
             print("✅ 用户数据清空成功（保留管理员）")
         except Exception as e:
             session.rollback()
@@ -469,7 +958,8 @@ class DatabaseManager:
             # 按顺序清空表（避免外键约束问题）
             print("🔄 开始强制清空所有数据...")
             
-            # 1. 清空订单
+            # 1. 清空订单及订单明细
+            session.execute(text("DELETE FROM order_items"))
             session.execute(text("DELETE FROM orders"))
             print("  ✅ 订单表已清空")
             
@@ -482,7 +972,7 @@ class DatabaseManager:
             print("  ✅ 用户表已清空（保留管理员）")
             
             # 提交所有更改
-            session.commit()
+            self._commit_data_changes(session, "products", "orders", "users")
             print("🎉 所有数据清空成功！")
             
         except Exception as e:
@@ -492,6 +982,102 @@ class DatabaseManager:
         finally:
             session.close()
 
-# 全局数据库管理器（移除缓存，确保连接正常）
+# 缓存失效监听线程
+class InvalidationListener(threading.Thread):
+    """监听其他副本的数据写入并递增本进程的数据版本号，使缓存失效"""
+    
+    def __init__(self, db_manager, poll_interval=2.0):
+        super().__init__(name="invalidation-listener", daemon=True)
+        self.db_manager = db_manager
+        self.poll_interval = poll_interval
+        self.callbacks = []
+        self._stop_event = threading.Event()
+        self._known_versions = None
+    
+    def stop(self):
+        """停止监听"""
+        self._stop_event.set()
+    
+    def _invalidate(self, names):
+        """递增本地数据版本号并通知回调"""
+        for name in names:
+            bump_data_version(name)
+        for callback in self.callbacks:
+            try:
+                callback(names)
+            except Exception as e:
+                print(f"⚠️ 缓存失效回调出错: {str(e)}")
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.db_manager.engine.dialect.name == "postgresql":
+                    self._listen_postgres()
+                else:
+                    self.poll_once()
+                    self._stop_event.wait(self.poll_interval)
+            except Exception as e:
+                print(f"⚠️ 缓存失效监听出错，稍后重试: {str(e)}")
+                self._stop_event.wait(self.poll_interval)
+    
+    def poll_once(self):
+        """轮询data_versions表，返回自上次轮询以来被其他写入修改过的数据名称
+        
+        只由本进程提交的版本变化不再失效（写入时已递增本地版本号），避免写入后重复加载一次。
+        """
+        session = self.db_manager.get_session()
+        try:
+            versions = {row.name: row.version for row in session.query(DataVersion).all()}
+        finally:
+            session.close()
+        if self._known_versions is None:
+            # 首次轮询只记录基线
+            self._known_versions = versions
+            return []
+        changed = [
+            name for name, version in versions.items()
+            if self._known_versions.get(name) != version
+            and not _only_own_versions(self.db_manager.engine, name, self._known_versions.get(name), version)
+        ]
+        self._known_versions = versions
+        if changed:
+            self._invalidate(changed)
+        return changed
+    
+    def _listen_postgres(self):
+        """使用独立连接LISTEN通知，断线重连期间可能错过通知，因此连接后先整体失效一次"""
+        raw_connection = self.db_manager.engine.raw_connection()
+        raw_connection.detach()  # 长期占用的连接不归还连接池
+        dbapi_connection = raw_connection.dbapi_connection
+        try:
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+            self._invalidate(list(_data_versions))
+            while not self._stop_event.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                names = set()
+                while dbapi_connection.notifies:
+                    token, _, name = dbapi_connection.notifies.pop(0).payload.partition(":")
+                    if token != _PROCESS_TOKEN and name:
+                        names.add(name)
+                if names:
+                    self._invalidate(sorted(names))
+        finally:
+            raw_connection.close()
+
+# 全局数据库管理器（进程内单例，首次调用时连接数据库）
+_database_manager = None
+_database_manager_lock = threading.Lock()
+
 def get_database_manager():
-    return DatabaseManager()
+    """获取进程内共享的数据库管理器"""
+    global _database_manager
+    if _database_manager is None:
+        with _database_manager_lock:
+            if _database_manager is None:
+                _database_manager = DatabaseManager()
+                InvalidationListener(_database_manager).start()
+    return _database_manager
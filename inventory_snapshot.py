@@ -0,0 +1,128 @@
+"""
+列式商品快照：某个商品数据版本的只读列式存储
+
+数值字段（价格、库存、限购）存为NumPy数组，汇总和筛选直接在数组上计算；
+字符串字段（ID、名称、条码等）经sys.intern后存入对象数组，与原商品字典
+共用同一份字符串。按行访问返回只读的类字典对象，兼容 item['price'] 写法。
+"""
+
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class ProductRow(Mapping):
+    """快照中一行商品的只读字典视图"""
+    
+    __slots__ = ('_snapshot', '_position')
+    
+    def __init__(self, snapshot, position):
+        self._snapshot = snapshot
+        self._position = position
+    
+    def __getitem__(self, key):
+        column = self._snapshot.COLUMNS.get(key)
+        if column is None:
+            raise KeyError(key)
+        value = getattr(self._snapshot, column)[self._position]
+        # 转换为Python数值，避免调用方拿到NumPy标量
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def __iter__(self):
+        return iter(self._snapshot.COLUMNS)
+    
+    def __len__(self):
+        return len(self._snapshot.COLUMNS)
+    
+    def __repr__(self):
+        return f"ProductRow({dict(self)!r})"
+
+
+class InventorySnapshot:
+    """只读商品快照"""
+    
+    # 商品字段 -> 列数组属性名
+    COLUMNS = {
+        'id': 'ids',
+        'name': 'names',
+        'price': 'prices',
+        'stock': 'stocks',
+        'description': 'descriptions',
+        'barcode': 'barcodes',
+        'purchase_limit': 'purchase_limits',
+        'created_at': 'created_ats',
+    }
+    
+    def __init__(self, products, version=None):
+        products = list(products)
+        self.version = version
+        self.ids = self._strings(p['id'] for p in products)
+        self.names = self._strings(p.get('name') for p in products)
+        self.descriptions = self._strings(p.get('description') for p in products)
+        self.barcodes = self._strings(p.get('barcode') for p in products)
+        self.created_ats = self._strings(p.get('created_at') for p in products)
+        self.prices = np.fromiter((p.get('price') or 0 for p in products), dtype=np.float64, count=len(products))
+        self.stocks = np.fromiter((p.get('stock') or 0 for p in products), dtype=np.int64, count=len(products))
+        self.purchase_limits = np.fromiter((p.get('purchase_limit') or 0 for p in products), dtype=np.int64, count=len(products))
+        self.positions = {product_id: i for i, product_id in enumerate(self.ids)}
+        for column in self.COLUMNS.values():
+            getattr(self, column).flags.writeable = False
+    
+    @staticmethod
+    def _strings(values):
+        """字符串列：intern后存入对象数组，缺失值存为空字符串"""
+        return np.array([sys.intern(str(value)) if value else '' for value in values], dtype=object)
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def __iter__(self):
+        return (ProductRow(self, i) for i in range(len(self.ids)))
+    
+    def __getitem__(self, position):
+        if not -len(self.ids) <= position < len(self.ids):
+            raise IndexError(position)
+        return ProductRow(self, position % len(self.ids))
+    
+    def __contains__(self, product_id):
+        return product_id in self.positions
+    
+    def get(self, product_id, default=None):
+        """按商品ID获取一行"""
+        position = self.positions.get(product_id)
+        return default if position is None else ProductRow(self, position)
+    
+    def positions_of(self, product_ids):
+        """商品ID对应的行号数组（忽略不在快照中的ID），保持传入顺序"""
+        positions = self.positions
+        return np.fromiter((positions[pid] for pid in product_ids if pid in positions), dtype=np.int64)
+    
+    def rows(self, positions):
+        """按行号取出多行"""
+        return [ProductRow(self, int(i)) for i in positions]
+    
+    # 汇总
+    def total_stock(self):
+        return int(self.stocks.sum())
+    
+    def total_value(self):
+        """库存总价值（价格 × 库存）"""
+        return float(np.dot(self.prices, self.stocks))
+    
+    def price_range(self):
+        """(最低价, 最高价)，没有商品时为 (0, 0)"""
+        if not len(self.prices):
+            return 0.0, 0.0
+        return float(self.prices.min()), float(self.prices.max())
+    
+    def low_stock_count(self, threshold=5):
+        """库存低于阈值的商品数"""
+        return int(np.count_nonzero(self.stocks < threshold))
+    
+    def in_stock_count(self):
+        return int(np.count_nonzero(self.stocks > 0))
+    
+    def limited_count(self):
+        """限购商品数"""
+        return int(np.count_nonzero(self.purchase_limits > 0))
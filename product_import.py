@@ -0,0 +1,295 @@
+"""
+商品批量导入：把上传表格整列转换为商品记录
+
+列别名只解析一次，价格、库存、限购整列转换类型，缺失的条码和ID批量生成，
+逐行的校验错误收集成报告，替代 iterrows + 逐行 row.get 的写法。
+大文件按块读取（CSV 用 chunksize，xlsx 用 openpyxl 只读模式），每块转换后即可写入，内存占用与文件大小无关。
+BarcodeMerger 按条码把导入的商品合并到现有商品，重复导入同一份供应商表格只更新不新增。
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 商品字段 -> 表格中可用的列名（按优先级，取第一个存在的列）
+COLUMN_ALIASES = {
+    "name": ["商品名称", "name"],
+    "price": ["价格", "price"],
+    "stock": ["库存", "stock"],
+    "description": ["描述", "description"],
+    "barcode": ["条码", "code", "barcode"],
+    "purchase_limit": ["限购数量", "limit", "purchase_limit"],
+}
+# 数值字段 -> (报告中显示的名称, 是否取整)
+NUMBER_FIELDS = {"price": ("价格", False), "stock": ("库存", True), "purchase_limit": ("限购数量", True)}
+# 错误报告的列
+ERROR_COLUMNS = ["行号", "字段", "值", "原因"]
+# 分块导入每块的行数
+IMPORT_CHUNK_SIZE = 5000
+# 错误报告最多保留的条数（超出部分只计数）
+MAX_REPORTED_ERRORS = 1000
+# 按条码合并时更新的字段（名称、描述等保持原样）
+MERGE_FIELDS = ("price", "stock", "purchase_limit")
+# 合并差异报告的列
+DIFF_COLUMNS = ["条码", "商品名称", "字段", "原值", "新值"]
+
+
+def resolve_columns(columns):
+    """每个字段对应表格中的列名，没有对应列时为None"""
+    present = set(columns)
+    return {
+        field: next((alias for alias in aliases if alias in present), None)
+        for field, aliases in COLUMN_ALIASES.items()
+    }
+
+
+def unique_ids(count, length=8, taken=()):
+    """批量生成不重复的随机十六进制串（与 str(uuid4())[:8] 格式相同），避开 taken 中已有的值"""
+    if not isinstance(taken, (set, frozenset)):
+        taken = set(taken)
+    seen = set()
+    ids = []
+    while len(ids) < count:
+        raw = os.urandom((count - len(ids)) * length).hex()
+        for start in range(0, len(raw), length):
+            candidate = raw[start:start + length]
+            if candidate not in taken and candidate not in seen:
+                seen.add(candidate)
+                ids.append(candidate)
+                if len(ids) == count:
+                    break
+    return ids
+
+
+def _text(values):
+    """文本列：缺失值为空字符串，去掉首尾空白；整数值的数字列（如Excel中的条码）不带小数点"""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers = values.astype(float)
+        text = values.astype(str)
+        integral = numbers.notna() & np.isfinite(numbers) & (numbers == np.floor(numbers))
+        text[integral] = numbers[integral].astype("int64").astype(str)
+        return text.where(numbers.notna(), "")
+    return values.where(values.notna(), "").astype(str).str.strip()
+
+
+def _number(values, integer):
+    """数值列：空值按0处理，返回 (数值列, 无法转换的行的掩码)"""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers = values.astype(float)
+        invalid = pd.Series(False, index=values.index)
+    else:
+        text = values.where(values.notna(), "").astype(str).str.strip()
+        numbers = pd.to_numeric(text.where(text != ""), errors="coerce")
+        invalid = numbers.isna() & (text != "")
+    numbers = numbers.fillna(0)
+    if integer:
+        numbers = np.trunc(numbers)
+    return numbers, invalid
+
+
+def prepare_products(frame, start_row=1, existing_ids=(), created_at=None, row_numbers=None):
+    """把上传的表格转换为商品记录，返回 (商品字典列表, 错误报告列表)
+
+    start_row 为第一行数据的行号，row_numbers 给出时按它逐行标注行号（分块导入时为各行在文件中的行号），
+    existing_ids 为已占用的商品ID。
+    商品名称为空或数值无法转换的行不导入，记入错误报告。
+    """
+    columns = resolve_columns(frame.columns)
+    frame = frame.reset_index(drop=True)
+    if row_numbers is None:
+        row_numbers = np.arange(start_row, start_row + len(frame))
+    rows = pd.Series(np.asarray(row_numbers), index=frame.index)
+    empty = pd.Series("", index=frame.index, dtype=object)
+    errors = []
+
+    names = _text(frame[columns["name"]]) if columns["name"] else empty
+    missing_name = names == ""
+    for row in rows[missing_name]:
+        errors.append({"行号": int(row), "字段": "商品名称", "值": "", "原因": "商品名称为空"})
+    valid = ~missing_name
+
+    numbers = {}
+    for field, (label, integer) in NUMBER_FIELDS.items():
+        if columns[field] is None:
+            numbers[field] = pd.Series(0.0, index=frame.index)
+            continue
+        raw = frame[columns[field]]
+        numbers[field], invalid = _number(raw, integer)
+        for row, value in zip(rows[invalid & valid], raw[invalid & valid]):
+            errors.append({"行号": int(row), "字段": label, "值": str(value), "原因": "不是有效数字"})
+        valid &= ~invalid
+    errors.sort(key=lambda error: error["行号"])
+
+    names = names[valid]
+    count = len(names)
+    barcodes = _text(frame.loc[valid, columns["barcode"]]) if columns["barcode"] else empty[valid]
+    # 缺失的条码：商品名称前3个字 + 6位随机串
+    missing_barcode = barcodes == ""
+    if missing_barcode.any():
+        suffixes = unique_ids(int(missing_barcode.sum()), length=6)
+        barcodes[missing_barcode] = names[missing_barcode].str[:3] + pd.Series(suffixes, index=names.index[missing_barcode])
+
+    descriptions = _text(frame.loc[valid, columns["description"]]) if columns["description"] else empty[valid]
+    # 各列先转成Python列表再按行组装，比 DataFrame.to_dict("records") 逐个装箱快得多
+    fields = {
+        "id": unique_ids(count, taken=existing_ids),
+        "name": names.to_numpy(dtype=object).tolist(),
+        "price": numbers["price"][valid].to_numpy(dtype=float).tolist(),
+        "stock": numbers["stock"][valid].to_numpy(dtype="int64").tolist(),
+        "description": descriptions.to_numpy(dtype=object).tolist(),
+        "barcode": barcodes.to_numpy(dtype=object).tolist(),
+        "purchase_limit": numbers["purchase_limit"][valid].to_numpy(dtype="int64").tolist(),
+        "created_at": [created_at or datetime.now().isoformat()] * count,
+    }
+    keys = list(fields)
+    products = [dict(zip(keys, values)) for values in zip(*fields.values())]
+    return products, errors
+
+
+def _file_size(source):
+    """文件对象的总字节数"""
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+
+def _read_csv_chunks(source, chunk_size):
+    """按块读取CSV，进度按已读取的字节数估算；条码列按文本读取，保留开头的0（按条码合并时才能匹配）"""
+    size = _file_size(source) or 1
+    dtype = {column: str for column in COLUMN_ALIASES["barcode"]}
+    for frame in pd.read_csv(source, encoding="utf-8", dtype=dtype, chunksize=chunk_size):
+        yield frame, min(source.tell() / size, 1.0)
+
+
+def _read_xlsx_chunks(source, chunk_size):
+    """以openpyxl只读模式逐行读取第一个工作表，攒够一块再转换为DataFrame；跳过整行为空的行"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(value).strip() if value is not None else f"列{index + 1}" for index, value in enumerate(header)]
+        # 工作表记录的数据行数（文件未记录时无法估算进度）
+        total = sheet.max_row - 1 if sheet.max_row else None
+        buffer, positions = [], []
+        read = 0
+        for values in rows:
+            read += 1
+            if all(value is None for value in values):
+                continue
+            buffer.append(values[:len(header)])
+            # 索引记录数据行在工作表中的位置，跳过的空行仍占行号
+            positions.append(read - 1)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header, index=positions), min(read / total, 1.0) if total else None
+                buffer, positions = [], []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header, index=positions), 1.0
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """按块读取上传的CSV或xlsx文件，逐块产出 (DataFrame, 进度0~1或None)
+
+    DataFrame 的索引为各行在文件数据行中的位置（从0开始，跨块连续）。
+    """
+    if filename.lower().endswith(".xlsx"):
+        return _read_xlsx_chunks(source, chunk_size)
+    return _read_csv_chunks(source, chunk_size)
+
+
+def stream_products(source, filename, existing_ids=(), chunk_size=IMPORT_CHUNK_SIZE):
+    """分块读取并转换上传文件，逐块产出 (商品字典列表, 错误列表, 本块行数, 进度)
+
+    已生成的ID会加入占用集合，后续块不会重复；调用方每收到一块就写入数据库，无需持有整个文件。
+    """
+    taken = set(existing_ids)
+    created_at = datetime.now().isoformat()
+    for frame, progress in read_chunks(source, filename, chunk_size):
+        # 行号取自块的索引（文件中的位置），xlsx跳过的空行不会让后面的行号错位
+        products, errors = prepare_products(frame, existing_ids=taken, created_at=created_at, row_numbers=frame.index + 1)
+        taken.update(product["id"] for product in products)
+        yield products, errors, len(frame), progress
+
+
+class BarcodeMerger:
+    """按条码把导入的商品合并到现有商品：条码已存在的更新价格、库存和限购，其余作为新商品插入
+
+    现有商品的条码哈希表在创建时建立一次；本次导入写入过的条码只记录
+    (商品ID, 价格, 库存, 限购)，不保留整行商品，内存占用不随文件行数成倍增长。
+    同一文件中重复出现的条码以最后一行为准，统计按条码计数（同一商品只计一次）。
+    """
+
+    def __init__(self, existing_products, max_changes=MAX_REPORTED_ERRORS):
+        self.max_changes = max_changes
+        self._existing = {}  # 条码 -> 现有商品
+        for product in existing_products:
+            barcode = product.get("barcode")
+            if barcode:
+                # 现有商品条码重复时合并到第一个
+                self._existing.setdefault(barcode, product)
+        self._written = {}  # 本次导入写入过的条码 -> (商品ID, 价格, 库存, 限购)
+        self._unchanged = set()  # 本次导入中出现过且无变化的现有商品条码
+        self.summary = {"inserted": 0, "updated": 0, "unchanged": 0}
+        self.changes = []  # 差异报告（最多 max_changes 条）
+
+    def merge(self, products):
+        """合并一批导入的商品，返回需要写入数据库的商品列表（更新的商品沿用原ID和其他字段）"""
+        rows = []
+        batch = {}  # 本批中已生成的写入行，条码再次出现时原地更新
+        for product in products:
+            barcode = product["barcode"]
+            values = tuple(product[field] for field in MERGE_FIELDS)
+            current = self._existing.get(barcode)
+            written = self._written.get(barcode)
+            if written is not None:
+                # 本次导入已写入过：以最后一行为准，不重复计数
+                if written[1:] == values:
+                    continue
+                product_id = written[0]
+            elif current is None:
+                product_id = product["id"]
+                self.summary["inserted"] += 1
+            else:
+                if all(current.get(field) == value for field, value in zip(MERGE_FIELDS, values)):
+                    if barcode not in self._unchanged:
+                        self._unchanged.add(barcode)
+                        self.summary["unchanged"] += 1
+                    continue
+                if barcode in self._unchanged:
+                    self._unchanged.discard(barcode)
+                    self.summary["unchanged"] -= 1
+                product_id = current["id"]
+                self.summary["updated"] += 1
+            if current is not None:
+                self._record_changes(barcode, current, written, values)
+            self._written[barcode] = (product_id,) + values
+
+            if current is not None:
+                fields = dict(zip(MERGE_FIELDS, values))
+            else:
+                fields = dict(product, id=product_id)
+            if barcode in batch:
+                batch[barcode].update(fields)
+            else:
+                batch[barcode] = dict(current, **fields) if current is not None else fields
+                rows.append(batch[barcode])
+        return rows
+
+    def _record_changes(self, barcode, current, written, values):
+        """记录现有商品的字段变化（相对上一次写入的值，首次写入时相对现有商品）"""
+        previous = written[1:] if written is not None else tuple(current.get(field) for field in MERGE_FIELDS)
+        for field, old, new in zip(MERGE_FIELDS, previous, values):
+            if old != new and len(self.changes) < self.max_changes:
+                self.changes.append({
+                    "条码": barcode, "商品名称": current.get("name", ""),
+                    "字段": NUMBER_FIELDS[field][0], "原值": old, "新值": new,
+                })
@@ -0,0 +1,43 @@
+"""
+商品索引：按商品ID和条码建立字典，替代页面中逐个遍历库存列表的查找
+"""
+
+
+class ProductIndex:
+    """某个商品数据版本的只读索引"""
+    
+    def __init__(self, products, version=None):
+        self.version = version
+        self.products = list(products)
+        self.by_id = {}
+        self.by_barcode = {}
+        for product in self.products:
+            self.by_id[product.get('id')] = product
+            barcode = product.get('barcode')
+            if barcode:
+                # 条码重复时保留第一个商品，与原先遍历查找的结果一致
+                self.by_barcode.setdefault(barcode, product)
+    
+    def __len__(self):
+        return len(self.products)
+    
+    def __iter__(self):
+        return iter(self.products)
+    
+    def __contains__(self, product_id):
+        return product_id in self.by_id
+    
+    def get(self, product_id, default=None):
+        """按商品ID查找商品"""
+        return self.by_id.get(product_id, default)
+    
+    def get_by_barcode(self, barcode, default=None):
+        """按条码查找商品"""
+        return self.by_barcode.get(barcode, default)
+    
+    def barcode_of(self, product_id, default='N/A'):
+        """获取商品条码，商品不存在时返回默认值"""
+        product = self.by_id.get(product_id)
+        if product is None:
+            return default
+        return product.get('barcode', default)
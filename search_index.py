@@ -0,0 +1,238 @@
+"""
+商品搜索索引
+
+- NGramIndex：商品名称和描述的字符n-gram倒排索引。中文名称没有词边界，
+  按单字和相邻两字（bigram）建立倒排表，查询时取各n-gram倒排表的交集
+  得到候选商品，再确认包含关键词。
+- BarcodeIndex：有序条码数组（二分查找前缀）加条码哈希表（扫码精确匹配排在最前）。
+"""
+
+import bisect
+import threading
+
+
+def _grams(text):
+    """文本的单字和相邻两字集合"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _term_grams(term):
+    """查询关键词用于取候选的n-gram（两字以上只用bigram，候选更少）"""
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+class NGramIndex:
+    """商品名称和描述的n-gram倒排索引，可随商品变化增量更新"""
+    
+    def __init__(self, cache_size=256):
+        self.version = None
+        self.cache_size = cache_size
+        self._texts = {}  # 商品ID -> (小写名称, 小写描述)
+        self._postings = {}  # n-gram -> 商品ID集合
+        self._results = {}  # 查询结果缓存，索引变化时清空
+        self._lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self._texts)
+    
+    def add(self, product_id, name, description=''):
+        """添加或更新一个商品"""
+        with self._lock:
+            if product_id in self._texts:
+                self.remove(product_id)
+            self._results.clear()
+            name = (name or '').lower()
+            description = (description or '').lower()
+            self._texts[product_id] = (name, description)
+            for gram in _grams(name) | _grams(description):
+                self._postings.setdefault(gram, set()).add(product_id)
+    
+    def remove(self, product_id):
+        """移除一个商品"""
+        with self._lock:
+            texts = self._texts.pop(product_id, None)
+            if texts is None:
+                return
+            self._results.clear()
+            for gram in _grams(texts[0]) | _grams(texts[1]):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(product_id)
+                    if not posting:
+                        del self._postings[gram]
+    
+    def sync(self, products, version=None):
+        """与商品列表同步，只重建名称或描述变化的商品；同一数据版本只同步一次
+        
+        返回本次新增、修改和删除的商品数量。
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            current = {}
+            for product in products:
+                current[product['id']] = (product.get('name') or '', product.get('description') or '')
+            changed = 0
+            for product_id in [pid for pid in self._texts if pid not in current]:
+                self.remove(product_id)
+                changed += 1
+            for product_id, (name, description) in current.items():
+                if self._texts.get(product_id) != (name.lower(), description.lower()):
+                    self.add(product_id, name, description)
+                    changed += 1
+            self.version = version
+            return changed
+    
+    def _term_matches(self, term):
+        """包含某个关键词的商品ID集合"""
+        postings = []
+        for gram in _term_grams(term):
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        if len(term) <= 2:
+            return candidates
+        # bigram全部命中不代表连续出现，需确认子串
+        return {pid for pid in candidates if term in self._texts[pid][0] or term in self._texts[pid][1]}
+    
+    def _score(self, product_id, terms):
+        """匹配质量：名称完全相同 > 名称开头 > 名称包含 > 仅描述包含"""
+        name, description = self._texts[product_id]
+        score = 0
+        for term in terms:
+            if name == term:
+                score += 4
+            elif name.startswith(term):
+                score += 3
+            elif term in name:
+                score += 2
+            elif term in description:
+                score += 1
+        return score
+    
+    def search(self, query):
+        """按空格分隔的多个关键词查询（同时包含全部关键词），按匹配质量排序返回商品ID列表
+        
+        同一索引状态下相同查询的结果会被缓存（调用方不应修改返回的列表）。
+        """
+        terms = tuple(dict.fromkeys(query.lower().split()))
+        if not terms:
+            return []
+        with self._lock:
+            cached = self._results.get(terms)
+            if cached is None:
+                cached = self._search(terms)
+                if self.cache_size:
+                    if len(self._results) >= self.cache_size:
+                        self._results.clear()
+                    self._results[terms] = cached
+            return cached
+    
+    def _search(self, terms):
+        """执行查询并排序"""
+        matches = None
+        for term in sorted(terms, key=len, reverse=True):
+            term_matches = self._term_matches(term)
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return []
+        return sorted(
+            matches,
+            key=lambda pid: (-self._score(pid, terms), len(self._texts[pid][0]), pid)
+        )
+
+
+class BarcodeIndex:
+    """条码索引：扫码的完整条码走哈希精确匹配，输入的前几位走有序数组二分查找"""
+    
+    # 一次同步中变化的商品超过总数的这个比例时整体重建有序数组
+    REBUILD_RATIO = 0.125
+    
+    def __init__(self):
+        self.version = None
+        self._sorted = []  # 按条码排序的 (条码, 商品ID)
+        self._exact = {}  # 条码 -> 商品ID列表
+        self._barcodes = {}  # 商品ID -> 条码
+        self._lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self._barcodes)
+    
+    def add(self, product_id, barcode):
+        """添加或更新一个商品的条码（空条码不建索引）"""
+        with self._lock:
+            if product_id in self._barcodes:
+                self.remove(product_id)
+            if not barcode:
+                return
+            self._barcodes[product_id] = barcode
+            self._exact.setdefault(barcode, []).append(product_id)
+            bisect.insort(self._sorted, (barcode, product_id))
+    
+    def remove(self, product_id):
+        """移除一个商品"""
+        with self._lock:
+            barcode = self._barcodes.pop(product_id, None)
+            if barcode is None:
+                return
+            product_ids = self._exact[barcode]
+            product_ids.remove(product_id)
+            if not product_ids:
+                del self._exact[barcode]
+            position = bisect.bisect_left(self._sorted, (barcode, product_id))
+            del self._sorted[position]
+    
+    def sync(self, products, version=None):
+        """与商品列表同步，只更新条码变化的商品；同一数据版本只同步一次
+        
+        返回本次新增、修改和删除的商品数量。
+        """
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            current = {product['id']: (product.get('barcode') or '') for product in products}
+            removed = [pid for pid in self._barcodes if pid not in current]
+            changed = [pid for pid, barcode in current.items() if self._barcodes.get(pid, '') != barcode]
+            if len(removed) + len(changed) > len(current) * self.REBUILD_RATIO:
+                # 变化较多时整体排序比逐个插入更快
+                self._barcodes = {pid: barcode for pid, barcode in current.items() if barcode}
+                self._exact = {}
+                for pid, barcode in self._barcodes.items():
+                    self._exact.setdefault(barcode, []).append(pid)
+                self._sorted = sorted((barcode, pid) for pid, barcode in self._barcodes.items())
+            else:
+                for pid in removed:
+                    self.remove(pid)
+                for pid in changed:
+                    self.add(pid, current[pid])
+            self.version = version
+            return len(removed) + len(changed)
+    
+    def exact(self, barcode):
+        """完整条码精确匹配，返回商品ID列表"""
+        return list(self._exact.get(barcode, ()))
+    
+    def prefix(self, prefix):
+        """条码前缀匹配（二分查找），按条码顺序返回商品ID列表"""
+        with self._lock:
+            start = bisect.bisect_left(self._sorted, (prefix,))
+            end = bisect.bisect_left(self._sorted, (prefix + '\U0010ffff',))
+            return [pid for _, pid in self._sorted[start:end]]
+    
+    def lookup(self, query):
+        """条码筛选：返回条码以query开头的全部商品（与SQL的前缀匹配一致），完全相同的条码（扫码）排在最前"""
+        query = (query or '').strip()
+        if not query:
+            return []
+        exact = self.exact(query)
+        if not exact:
+            return self.prefix(query)
+        exact_ids = set(exact)
+        return exact + [pid for pid in self.prefix(query) if pid not in exact_ids]
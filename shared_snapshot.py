@@ -0,0 +1,64 @@
+"""
+进程内共享的只读数据快照
+
+st.cache_data 每次调用都要反序列化出一份完整副本，会话越多内存和CPU开销越大。
+这里每类数据在进程内只保留一份冻结（不可修改）的快照，所有会话直接引用；
+数据版本变化时构建新快照整体替换引用（写时复制），内容未变的行沿用上一版本的对象。
+需要修改数据的调用方应先复制（如 dict(row)）。
+"""
+
+import threading
+from types import MappingProxyType
+
+
+def freeze(value):
+    """递归冻结：字典转为只读映射，列表转为元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class SharedSnapshot:
+    """按数据版本缓存的共享只读快照"""
+    
+    def __init__(self, loader, key=None):
+        self.loader = loader  # 加载全部记录（字典列表）的函数
+        self.key = key  # 记录的唯一键，用于在版本间复用未变化的行
+        self._current = (None, ())  # (数据版本, 冻结的记录元组)，整体替换保证读取一致
+        self._lock = threading.Lock()
+    
+    @property
+    def version(self):
+        return self._current[0]
+    
+    def _is_current(self, current_version, version):
+        """已缓存的快照是否可以满足该版本：数据版本只增不减，
+        持有旧版本号的会话（在其他会话写入前取得版本号）直接使用更新的快照，
+        不重新加载，也不会把新数据记为旧版本号"""
+        return current_version is not None and version <= current_version
+    
+    def get(self, version):
+        """获取指定数据版本（或更新）的快照，只有版本比缓存更新时才重新加载（同一时刻只有一个会话加载）"""
+        current_version, rows = self._current
+        if self._is_current(current_version, version):
+            return rows
+        with self._lock:
+            current_version, rows = self._current
+            if not self._is_current(current_version, version):
+                rows = self._build(self.loader(), rows)
+                self._current = (version, rows)
+            return rows
+    
+    def _build(self, records, previous):
+        """冻结新记录，内容与上一版本相同的行复用原对象"""
+        previous_rows = {}
+        if self.key is not None:
+            previous_rows = {row.get(self.key): row for row in previous}
+        rows = []
+        for record in records:
+            row = freeze(record)
+            old = previous_rows.get(row.get(self.key)) if self.key is not None else None
+            rows.append(old if old is not None and old == row else row)
+        return tuple(rows)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+商品批量upsert测试脚本
+"""
+
+import os
+import tempfile
+
+from database import DatabaseManager
+
+
+def make_products(count, stock=10):
+    """生成测试商品"""
+    return [
+        {
+            "id": f"p{i:06d}",
+            "name": f"测试商品{i}",
+            "price": 1.0 + i,
+            "stock": stock,
+            "barcode": f"690{i:010d}",
+            "purchase_limit": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def make_db():
+    """创建临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "bulk_upsert.db")
+    return DatabaseManager(f"sqlite:///{db_file}")
+
+
+def test_bulk_upsert_chunks():
+    """测试按批次写入并返回每批行数"""
+    db = make_db()
+    counts = db.bulk_upsert_products(make_products(250), chunk_size=100)
+    print(f"每批写入行数: {counts}")
+    assert counts == [100, 100, 50]
+    assert len(db.load_inventory()) == 250
+
+
+def test_bulk_upsert_updates_existing():
+    """测试已存在的商品被更新而不是重复插入"""
+    db = make_db()
+    db.save_inventory(make_products(20))
+    changed = make_products(5, stock=3)
+    changed[0]["name"] = "改名商品"
+    db.save_inventory(changed)
+
+    inventory = {p["id"]: p for p in db.load_inventory()}
+    assert len(inventory) == 20
+    assert inventory["p000000"]["name"] == "改名商品"
+    assert all(inventory[f"p{i:06d}"]["stock"] == 3 for i in range(5))
+    assert inventory["p000010"]["stock"] == 10
+    print("✅ 已存在商品更新正确")
+
+
+def test_bulk_upsert_duplicate_ids():
+    """测试同一批次中重复ID以最后一条为准"""
+    db = make_db()
+    products = make_products(3)
+    duplicate = dict(products[1], stock=42)
+    written = db.save_inventory(products + [duplicate])
+
+    assert written == 3
+
+    inventory = {p["id"]: p for p in db.load_inventory()}
+    assert len(inventory) == 3
+    assert inventory["p000001"]["stock"] == 42
+
+
+if __name__ == "__main__":
+    test_bulk_upsert_chunks()
+    test_bulk_upsert_updates_existing()
+    test_bulk_upsert_duplicate_ids()
+    print("🎉 批量upsert测试通过")
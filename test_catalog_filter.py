@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+商品筛选引擎测试脚本
+"""
+
+import os
+import random
+import tempfile
+
+from catalog_filter import compile_filters
+from inventory_snapshot import InventorySnapshot
+from database import DatabaseManager
+from search_index import BarcodeIndex, NGramIndex
+
+
+def make_products(count=500):
+    rng = random.Random(7)
+    return [
+        {
+            "id": f"p{i}",
+            "name": rng.choice(["牛奶", "酸奶", "面包", "苹果汁"]) + str(i),
+            "price": round(rng.uniform(0, 50), 2),
+            "stock": rng.randint(0, 20),
+            "barcode": f"69{rng.randint(0, 99):02d}{i:06d}",
+            "purchase_limit": rng.choice([0, 0, 1, 3]),
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_filter(products, name, barcode, price_min, price_max, stock, limit):
+    """原来的逐条件列表筛选（名称子串、条码前缀）"""
+    result = [p for p in products if name.lower() in p["name"].lower()]
+    result = [p for p in result if p["barcode"].startswith(barcode)]
+    result = [p for p in result if price_min <= p["price"] <= price_max]
+    if stock == "in_stock":
+        result = [p for p in result if p["stock"] > 0]
+    elif stock == "plenty":
+        result = [p for p in result if p["stock"] > 10]
+    elif stock == "low":
+        result = [p for p in result if 1 <= p["stock"] <= 10]
+    elif stock == "out":
+        result = [p for p in result if p["stock"] == 0]
+    if limit == "limited":
+        result = [p for p in result if p["purchase_limit"] > 0]
+    elif limit == "unlimited":
+        result = [p for p in result if p["purchase_limit"] == 0]
+    return [p["id"] for p in result]
+
+
+def test_mask_matches_legacy_filters():
+    """测试编译后的掩码与原来的筛选结果一致"""
+    products = make_products()
+    table = InventorySnapshot(products)
+    names = NGramIndex()
+    names.sync(products)
+    barcodes = BarcodeIndex()
+    barcodes.sync(products)
+
+    cases = [
+        ("", "", 0, 50, None, None),
+        ("奶", "", 10, 30, "in_stock", None),
+        ("牛奶", "69", 0, 50, "low", "limited"),
+        ("", "6942", 5, 45, "out", "unlimited"),
+        ("面包", "", 0, 50, "plenty", None),
+    ]
+    for name, barcode, price_min, price_max, stock, limit in cases:
+        compiled = compile_filters(
+            {"name": name, "barcode": barcode, "price_min": price_min, "price_max": price_max,
+             "stock": stock, "limit": limit},
+            name_search=names.search, barcode_lookup=barcodes.lookup,
+        )
+        expected = legacy_filter(products, name, barcode, price_min, price_max, stock, limit)
+        assert sorted(table.ids[compiled.indices(table)]) == sorted(expected)
+        assert compiled.mask(table).sum() == len(expected)
+    print("✅ 掩码筛选与列表筛选结果一致")
+
+
+def test_name_filter_keeps_rank_order():
+    """测试有关键词时按匹配质量排序"""
+    products = [
+        {"id": "a", "name": "有机牛奶", "price": 1, "stock": 1},
+        {"id": "b", "name": "牛奶", "price": 2, "stock": 1},
+        {"id": "c", "name": "牛奶片", "price": 3, "stock": 0},
+    ]
+    names = NGramIndex()
+    names.sync(products)
+    table = InventorySnapshot(products)
+    compiled = compile_filters({"name": "牛奶", "stock": "in_stock"}, name_search=names.search)
+    assert list(table.ids[compiled.indices(table)]) == ["b", "a"]
+
+
+def test_ids_missing_from_table_are_skipped():
+    """测试索引返回的ID不在当前快照中（数据版本不同步）时忽略这些ID，不会出错"""
+    table = InventorySnapshot([{"id": "a", "name": "牛奶", "price": 1, "stock": 1}])
+    compiled = compile_filters({"name": "牛奶"}, name_search=lambda query: ["gone", "a"])
+    assert list(table.ids[compiled.indices(table)]) == ["a"]
+
+
+def test_barcode_filter_matches_sql():
+    """测试条码筛选在内存模式和SQL模式下结果相同（条码本身也是其他条码的前缀时同样返回全部前缀匹配）"""
+    products = [
+        {"id": "a", "name": "甲", "price": 1.0, "stock": 1, "barcode": "6901234567892"},
+        {"id": "b", "name": "乙", "price": 1.0, "stock": 1, "barcode": "6901234567885"},
+        {"id": "c", "name": "丙", "price": 1.0, "stock": 1, "barcode": "6921234567890"},
+        {"id": "d", "name": "丁", "price": 1.0, "stock": 1, "barcode": "690123"},
+    ]
+    db = DatabaseManager(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'barcode.db')}")
+    db.save_inventory(products)
+    barcodes = BarcodeIndex()
+    barcodes.sync(products)
+    table = InventorySnapshot(products)
+    for query in ("690123", "6901234567892", "69", "7"):
+        in_memory = set(table.ids[compile_filters({"barcode": query}, barcode_lookup=barcodes.lookup).indices(table)])
+        in_sql = {p["id"] for p in db.query_products({"barcode": query}, page_size=100)["items"]}
+        assert in_memory == in_sql, query
+    print("✅ 条码筛选两种模式结果一致")
+
+
+def test_rejects_unknown_values():
+    """测试不支持的筛选条件"""
+    for filters in ({"stock": "many"}, {"limit": "all"}, {"color": "red"}, {"name": "奶"}):
+        try:
+            compile_filters(filters)
+            assert False, f"应当拒绝: {filters}"
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_mask_matches_legacy_filters()
+    test_name_filter_keeps_rank_order()
+    test_ids_missing_from_table_are_skipped()
+    test_barcode_filter_matches_sql()
+    test_rejects_unknown_values()
+    print("🎉 筛选引擎测试通过")
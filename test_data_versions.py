@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+数据版本号测试脚本（缓存按版本号失效）
+"""
+
+import os
+import tempfile
+
+from database import DatabaseManager, get_data_version
+
+
+def make_db():
+    """创建临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "data_versions.db")
+    return DatabaseManager(f"sqlite:///{db_file}")
+
+
+def test_product_writes_bump_products_version():
+    """测试商品写入只递增商品版本号"""
+    db = make_db()
+    products_version = get_data_version("products")
+    users_version = get_data_version("users")
+
+    db.save_inventory([{"id": "v1", "name": "版本商品", "price": 1.0, "stock": 1}])
+    assert get_data_version("products") == products_version + 1
+
+    db.apply_product_changes({"v1": {"stock": 2}})
+    assert get_data_version("products") == products_version + 2
+
+    # 没有商品被更新时不递增
+    db.apply_product_changes({"missing": {"stock": 2}})
+    assert get_data_version("products") == products_version + 2
+    assert get_data_version("users") == users_version
+    print("✅ 商品写入递增商品版本号")
+
+
+def test_user_writes_bump_users_version():
+    """测试用户写入递增用户版本号"""
+    db = make_db()
+    users_version = get_data_version("users")
+    user_count = db.count_users()
+    db.add_user({"username": "ver_user", "password": "x", "name": "版本用户", "role": "user"})
+    assert get_data_version("users") == users_version + 1
+    assert db.count_users() == user_count + 1
+
+    db.clear_users()
+    assert get_data_version("users") == users_version + 2
+
+
+if __name__ == "__main__":
+    test_product_writes_bump_products_version()
+    test_user_writes_bump_users_version()
+    print("🎉 数据版本号测试通过")
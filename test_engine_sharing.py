@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+数据库引擎共享测试脚本
+"""
+
+import os
+import tempfile
+
+import pytest
+
+import database
+from database import DatabaseManager, get_database_manager
+
+
+def test_managers_share_engine():
+    """测试同一数据库的多个管理器复用同一个引擎和连接池"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'shared.db')}"
+    first = DatabaseManager(url)
+    second = DatabaseManager(url)
+    assert first.engine is second.engine
+    assert first.Session is second.Session
+
+    other = DatabaseManager(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'other.db')}")
+    assert other.engine is not first.engine
+    print("✅ 同一数据库复用引擎")
+
+
+def test_get_database_manager_is_singleton(monkeypatch):
+    """测试全局数据库管理器只创建一次（使用临时SQLite，不启动失效监听线程）"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'singleton.db')}")
+    monkeypatch.setattr(database, "_database_manager", None)
+    started = []
+    monkeypatch.setattr(database.InvalidationListener, "start", lambda self: started.append(self))
+    assert get_database_manager() is get_database_manager()
+    assert len(started) == 1
+
+
+if __name__ == "__main__":
+    test_managers_share_engine()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_get_database_manager_is_singleton(monkeypatch)
+    print("🎉 引擎共享测试通过")
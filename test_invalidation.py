@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+跨副本缓存失效测试脚本
+"""
+
+import os
+import sqlite3
+import tempfile
+
+from database import DatabaseManager, InvalidationListener, get_data_version
+
+
+def make_db():
+    """创建临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "invalidation.db")
+    return db_file, DatabaseManager(f"sqlite:///{db_file}")
+
+
+def test_poll_detects_other_replica_writes():
+    """测试轮询发现其他进程的写入并递增本地版本号"""
+    db_file, db = make_db()
+    listener = InvalidationListener(db)
+    assert listener.poll_once() == []
+
+    # 模拟另一个副本写入商品
+    connection = sqlite3.connect(db_file)
+    connection.execute("UPDATE data_versions SET version = version + 1 WHERE name = 'products'")
+    connection.commit()
+    connection.close()
+
+    version = get_data_version("products")
+    notified = []
+    listener.callbacks.append(notified.append)
+    assert listener.poll_once() == ["products"]
+    assert get_data_version("products") == version + 1
+    assert notified == [["products"]]
+    assert listener.poll_once() == []
+    print("✅ 轮询发现其他副本的写入")
+
+
+def test_writes_publish_shared_version():
+    """测试写入时同步递增共享的版本计数"""
+    db_file, db = make_db()
+    db.save_inventory([{"id": "a1", "name": "苹果", "price": 5.0, "stock": 3}])
+    db.apply_product_changes({"a1": {"stock_delta": 1}})
+
+    connection = sqlite3.connect(db_file)
+    versions = dict(connection.execute("SELECT name, version FROM data_versions").fetchall())
+    connection.close()
+    assert versions == {"products": 2, "orders": 0, "users": 1}
+
+
+def test_poll_ignores_own_writes():
+    """测试轮询忽略本进程自己的写入，只对其他副本的写入失效"""
+    db_file, db = make_db()
+    listener = InvalidationListener(db)
+    listener.poll_once()
+
+    version = get_data_version("products")
+    db.save_inventory([{"id": "a1", "name": "苹果", "price": 5.0, "stock": 3}])
+    db.apply_product_changes({"a1": {"stock_delta": 1}})
+    assert get_data_version("products") == version + 2
+    assert listener.poll_once() == []
+    assert get_data_version("products") == version + 2
+
+    # 本进程写入之后又有其他副本写入，仍然需要失效
+    db.apply_product_changes({"a1": {"stock_delta": 1}})
+    connection = sqlite3.connect(db_file)
+    connection.execute("UPDATE data_versions SET version = version + 1 WHERE name = 'products'")
+    connection.commit()
+    connection.close()
+    assert listener.poll_once() == ["products"]
+    print("✅ 轮询忽略本进程的写入")
+
+
+if __name__ == "__main__":
+    test_poll_detects_other_replica_writes()
+    test_writes_publish_shared_version()
+    test_poll_ignores_own_writes()
+    print("🎉 缓存失效测试通过")
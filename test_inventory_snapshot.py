@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+列式商品快照测试脚本
+"""
+
+from inventory_snapshot import InventorySnapshot
+
+
+def make_products():
+    return [
+        {"id": "a1", "name": "苹果", "price": 5.5, "stock": 10, "barcode": "6901",
+         "description": "", "purchase_limit": 0, "created_at": "2025-01-01T00:00:00"},
+        {"id": "b2", "name": "香蕉", "price": 3.0, "stock": 0, "barcode": "6902",
+         "description": "进口", "purchase_limit": 2, "created_at": "2025-01-02T00:00:00"},
+        {"id": "c3", "name": "橙子", "price": 8.25, "stock": 4, "barcode": ""},
+    ]
+
+
+def test_rows_behave_like_dicts():
+    """测试按行访问与原商品字典一致"""
+    products = make_products()
+    snapshot = InventorySnapshot(products, version=3)
+
+    assert len(snapshot) == 3
+    assert snapshot.version == 3
+    row = snapshot.get("b2")
+    assert row["price"] == 3.0 and isinstance(row["stock"], int)
+    assert row.get("barcode", "N/A") == "6902"
+    assert dict(snapshot[0]) == products[0]
+    assert snapshot[-1]["purchase_limit"] == 0
+    assert snapshot.get("zz") is None
+    assert "c3" in snapshot
+    assert [r["id"] for r in snapshot] == ["a1", "b2", "c3"]
+    try:
+        snapshot[0]["price"] = 1
+        assert False, "快照应当只读"
+    except TypeError:
+        pass
+    print("✅ 按行访问与商品字典一致")
+
+
+def test_aggregates():
+    """测试汇总结果与逐条计算一致"""
+    products = make_products()
+    snapshot = InventorySnapshot(products)
+
+    assert snapshot.total_stock() == sum(p["stock"] for p in products)
+    assert abs(snapshot.total_value() - sum(p["price"] * p["stock"] for p in products)) < 1e-9
+    assert snapshot.price_range() == (3.0, 8.25)
+    assert snapshot.low_stock_count(5) == 2
+    assert snapshot.in_stock_count() == 2
+    assert snapshot.limited_count() == 1
+    assert InventorySnapshot([]).price_range() == (0.0, 0.0)
+
+
+def test_strings_are_shared():
+    """测试字符串列与原字典共用同一个字符串对象"""
+    products = [{"id": "x" + str(i), "name": "商品" + str(i), "price": 1, "stock": 1} for i in range(3)]
+    snapshot = InventorySnapshot(products)
+    assert snapshot.names[1] is products[1]["name"]
+
+
+if __name__ == "__main__":
+    test_rows_behave_like_dicts()
+    test_aggregates()
+    test_strings_are_shared()
+    print("🎉 列式商品快照测试通过")
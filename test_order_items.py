@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+订单明细表同步与回填测试脚本
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import event
+
+from database import DatabaseManager, Order, OrderItem, get_data_version
+
+
+def make_db():
+    """创建临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "order_items.db")
+    return DatabaseManager(f"sqlite:///{db_file}")
+
+
+def make_order(order_id, user_name, items):
+    """生成订单数据"""
+    return {
+        "order_id": order_id,
+        "user_name": user_name,
+        "items": items,
+        "original_amount": 10.0,
+        "total_items": sum(item["quantity"] for item in items),
+        "discount_rate": 1.0,
+        "discount_text": "测试",
+        "discount_savings": 0,
+        "total_amount": 10.0,
+        "payment_method": "现金支付",
+        "cash_amount": 10.0,
+        "voucher_amount": 0,
+        "order_time": datetime.now().isoformat(),
+    }
+
+
+def item(product_id, quantity):
+    return {"product_id": product_id, "product_name": product_id, "price": 2.0, "quantity": quantity}
+
+
+def order_item_count(db, order_id):
+    session = db.get_session()
+    try:
+        return session.query(OrderItem).filter_by(order_id=order_id).count()
+    finally:
+        session.close()
+
+
+def test_order_items_follow_order_writes():
+    """测试新增、修改、删除订单时明细表同步"""
+    db = make_db()
+    assert db.add_order(make_order("o1", "张三", [item("a", 2), item("b", 1)])) == 2
+    db.add_order(make_order("o2", "张三", [item("a", 3)]))
+    db.add_order(make_order("o3", "李四", [item("a", 5)]))
+
+    assert db.get_user_purchase_quantities("张三") == {"a": 5, "b": 1}
+    assert db.get_user_purchase_quantities("张三", exclude_order_id="o2") == {"a": 2, "b": 1}
+    assert db.get_product_sales() == {"a": 10, "b": 1}
+
+    db.update_order("o1", make_order("o1", "张三", [item("b", 4)]))
+    assert db.get_user_purchase_quantities("张三") == {"a": 3, "b": 4}
+    assert order_item_count(db, "o1") == 1
+
+    db.delete_order("o2")
+    assert db.get_user_purchase_quantities("张三") == {"b": 4}
+    assert order_item_count(db, "o2") == 0
+    print("✅ 订单明细同步正确")
+
+
+def test_backfill_from_items_json():
+    """测试从旧订单的items_json回填明细"""
+    db = make_db()
+    session = db.get_session()
+    try:
+        legacy = make_order("old1", "王五", [item("c", 2), item("d", 1)])
+        legacy["items_json"] = json.dumps(legacy.pop("items"))
+        session.add(Order(**legacy))
+        session.commit()
+    finally:
+        session.close()
+
+    assert db.get_user_purchase_quantities("王五") == {}
+    assert db.backfill_order_items() == 1
+    assert db.get_user_purchase_quantities("王五") == {"c": 2, "d": 1}
+    # 再次回填不会重复生成明细
+    assert db.backfill_order_items() == 0
+    assert order_item_count(db, "old1") == 2
+
+
+def test_order_writes_bump_data_version():
+    """测试订单写入后数据版本号递增（限购数量缓存依赖它失效）"""
+    db = make_db()
+    version = get_data_version("orders")
+    db.add_order(make_order("v1", "赵六", [item("a", 1)]))
+    assert get_data_version("orders") > version
+
+    version = get_data_version("orders")
+    db.delete_order("v1")
+    assert get_data_version("orders") > version
+
+
+def test_add_order_reports_rows_returned_by_insert():
+    """测试add_order按INSERT返回的行数计数，且不再回查order_items"""
+    db = make_db()
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert db.add_order(make_order("w1", "张三", [item("a", 1), item("b", 2), item("c", 3)])) == 3
+        assert db.add_order(make_order("w2", "张三", [])) == 0
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert any("INSERT INTO order_items" in statement and "RETURNING" in statement for statement in statements)
+    assert not any(statement.startswith("SELECT") and "order_items" in statement for statement in statements)
+    assert order_item_count(db, "w1") == 3
+
+
+def test_order_stats_match_orders():
+    """测试订单汇总与逐条累加结果一致"""
+    db = make_db()
+    assert db.get_order_stats()["count"] == 0
+    assert db.get_order_stats()["total_amount"] == 0
+
+    first = make_order("s1", "张三", [item("a", 1)])
+    second = dict(make_order("s2", "李四", [item("b", 2)]), total_amount=7.5, cash_amount=0, voucher_amount=7.5)
+    db.add_order(first)
+    db.add_order(second)
+
+    stats = db.get_order_stats()
+    assert stats["count"] == 2
+    for field in ("original_amount", "discount_savings", "total_amount", "cash_amount", "voucher_amount"):
+        assert stats[field] == first[field] + second[field], field
+    print(f"✅ 订单汇总正确: {stats}")
+
+
+if __name__ == "__main__":
+    test_order_items_follow_order_writes()
+    test_backfill_from_items_json()
+    test_order_writes_bump_data_version()
+    test_add_order_reports_rows_returned_by_insert()
+    test_order_stats_match_orders()
+    print("🎉 订单明细测试通过")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+订单明细报表测试脚本
+"""
+
+from order_report import ORDER_DETAIL_COLUMNS, build_order_details
+
+
+def make_orders():
+    return [
+        {
+            "order_id": "o1", "user_name": "张三",
+            "items": [
+                {"product_id": "a", "product_name": "苹果", "price": 2.5, "quantity": 2},
+                {"product_id": "zz", "product_name": "已下架", "price": 1.0, "quantity": 1},
+            ],
+            "total_amount": 5.0, "cash_amount": 10.0, "voucher_amount": 0,
+            "discount_savings": 0.5, "discount_text": "9折", "payment_method": "现金支付",
+            "order_time": "2025-01-02T03:04:05.123456",
+        },
+        {"order_id": "o2", "user_name": "李四", "items": [], "total_amount": 0},
+        {
+            "order_id": "o3", "user_name": "王五",
+            "items": [{"product_id": "b", "product_name": "香蕉", "price": 1.0, "quantity": 3}],
+            "total_amount": 3.0, "cash_amount": 1.0, "voucher_amount": 2.0,
+        },
+    ]
+
+
+def test_flatten_orders():
+    """测试每个商品展开为一行并关联条码"""
+    products = [{"id": "a", "barcode": "6901"}, {"id": "b"}]
+    df = build_order_details(make_orders(), products)
+
+    assert list(df.columns) == ORDER_DETAIL_COLUMNS
+    assert list(df["订单ID"]) == ["o1", "o1", "o3"]
+    # 商品无条码时显示商品ID，商品不存在时显示N/A
+    assert list(df["条码"]) == ["6901", "N/A", "b"]
+    assert list(df["小计"]) == ["¥5.00", "¥1.00", "¥3.00"]
+    assert list(df["数量"]) == [2, 1, 3]
+    assert df["多付金额"][0] == "¥5.00 (不设找零)"
+    assert df["多付金额"][2] == "¥0.00"
+    assert df["订单时间"][0] == "2025-01-02 03:04:05"
+    assert df["折扣优惠"][2] == "无折扣"
+    print("✅ 订单明细展开正确")
+
+
+def test_empty_orders():
+    """测试没有订单或订单没有商品时返回空表"""
+    assert build_order_details([], []).empty
+    assert build_order_details([{"order_id": "o2", "items": []}], []).empty
+
+
+if __name__ == "__main__":
+    test_flatten_orders()
+    test_empty_orders()
+    print("🎉 订单明细报表测试通过")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+原子下单测试脚本
+"""
+
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+from database import DatabaseManager
+
+
+def make_db(stock=5):
+    """创建带测试商品的临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "place_order.db")
+    db = DatabaseManager(f"sqlite:///{db_file}")
+    db.save_inventory([
+        {"id": "a1", "name": "苹果", "price": 5.0, "stock": stock},
+        {"id": "b2", "name": "香蕉", "price": 3.0, "stock": stock},
+    ])
+    return db
+
+
+def make_order(items, user_name="测试用户"):
+    """生成订单数据"""
+    total = sum(item["price"] * item["quantity"] for item in items)
+    return {
+        "order_id": str(uuid.uuid4())[:8],
+        "user_name": user_name,
+        "items": items,
+        "original_amount": total,
+        "total_items": sum(item["quantity"] for item in items),
+        "discount_rate": 1.0,
+        "discount_text": "测试",
+        "discount_savings": 0,
+        "total_amount": total,
+        "payment_method": "现金支付",
+        "cash_amount": total,
+        "voucher_amount": 0,
+        "order_time": datetime.now().isoformat(),
+    }
+
+
+def cart_item(product_id, quantity, price=1.0):
+    """生成购物车商品"""
+    return {"product_id": product_id, "product_name": product_id, "price": price, "quantity": quantity}
+
+
+def stocks(db):
+    return {p["id"]: p["stock"] for p in db.load_inventory()}
+
+
+def test_place_order_success():
+    """测试下单成功时扣减库存并保存订单"""
+    db = make_db()
+    items = [cart_item("a1", 2), cart_item("b2", 1), cart_item("a1", 1)]
+    result = db.place_order(make_order(items), items)
+
+    assert result["success"]
+    assert stocks(db) == {"a1": 2, "b2": 4}
+    assert len(db.load_orders()) == 1
+    print("✅ 下单成功并扣减库存")
+
+
+def test_place_order_shortfall_rolls_back():
+    """测试库存不足时整体回滚并返回不足明细"""
+    db = make_db()
+    items = [cart_item("a1", 1), cart_item("b2", 9), cart_item("zz", 1)]
+    result = db.place_order(make_order(items), items)
+
+    assert not result["success"]
+    shortfalls = {s["product_id"]: s for s in result["shortfalls"]}
+    assert set(shortfalls) == {"b2", "zz"}
+    assert shortfalls["b2"]["requested"] == 9
+    assert shortfalls["b2"]["available"] == 5
+    assert stocks(db) == {"a1": 5, "b2": 5}
+    assert db.load_orders() == []
+    print(f"✅ 库存不足已回滚: {result['shortfalls']}")
+
+
+def test_concurrent_checkouts_do_not_oversell():
+    """测试并发结账不会超卖"""
+    db = make_db(stock=5)
+    results = []
+
+    def checkout():
+        items = [cart_item("b2", 1), cart_item("a1", 1)]
+        results.append(db.place_order(make_order(items), items)["success"])
+
+    threads = [threading.Thread(target=checkout) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert stocks(db) == {"a1": 0, "b2": 0}
+    assert len(db.load_orders()) == 5
+
+
+if __name__ == "__main__":
+    test_place_order_success()
+    test_place_order_shortfall_rolls_back()
+    test_concurrent_checkouts_do_not_oversell()
+    print("🎉 原子下单测试通过")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+商品变更集保存测试脚本
+"""
+
+import os
+import tempfile
+
+from database import DatabaseManager
+
+
+def make_db():
+    """创建带测试商品的临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "product_changes.db")
+    db = DatabaseManager(f"sqlite:///{db_file}")
+    db.save_inventory([
+        {"id": "a1", "name": "苹果", "price": 5.0, "stock": 10, "purchase_limit": 0},
+        {"id": "b2", "name": "香蕉", "price": 3.0, "stock": 20, "purchase_limit": 2},
+    ])
+    return db
+
+
+def test_apply_changes_only_touches_given_fields():
+    """测试只更新变更集中的商品和字段"""
+    db = make_db()
+    updated = db.apply_product_changes({"a1": {"price": 6.5}})
+    inventory = {p["id"]: p for p in db.load_inventory()}
+
+    assert updated == 1
+    assert inventory["a1"]["price"] == 6.5
+    assert inventory["a1"]["stock"] == 10
+    assert inventory["b2"]["price"] == 3.0
+    print("✅ 变更集只更新指定字段")
+
+
+def test_apply_stock_delta():
+    """测试库存增减基于数据库当前值"""
+    db = make_db()
+    db.apply_product_changes({"a1": {"stock_delta": -3}, "b2": {"stock_delta": 5}})
+    inventory = {p["id"]: p for p in db.load_inventory()}
+
+    assert inventory["a1"]["stock"] == 7
+    assert inventory["b2"]["stock"] == 25
+
+
+def test_apply_changes_rejects_unknown_field():
+    """测试不支持的字段会整体回滚"""
+    db = make_db()
+    try:
+        db.apply_product_changes({"a1": {"stock": 1}, "b2": {"sold": 9}})
+        assert False, "应当拒绝未知字段"
+    except ValueError as e:
+        print(f"✅ 已拒绝未知字段: {e}")
+
+    inventory = {p["id"]: p for p in db.load_inventory()}
+    assert inventory["a1"]["stock"] == 10
+
+
+if __name__ == "__main__":
+    test_apply_changes_only_touches_given_fields()
+    test_apply_stock_delta()
+    test_apply_changes_rejects_unknown_field()
+    print("🎉 变更集测试通过")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+商品批量导入转换测试脚本
+"""
+
+import io
+import os
+import tempfile
+
+import pandas as pd
+from openpyxl import Workbook
+
+from database import DatabaseManager
+from product_import import (
+    BarcodeMerger, prepare_products, read_chunks, resolve_columns, stream_products, unique_ids,
+)
+
+
+def test_aliases_resolve_in_priority_order():
+    """测试列别名按优先级取第一个存在的列"""
+    columns = resolve_columns(["name", "条码", "barcode", "limit"])
+    assert columns["name"] == "name"
+    assert columns["barcode"] == "条码"
+    assert columns["purchase_limit"] == "limit"
+    assert columns["price"] is None
+
+
+def test_columns_are_converted():
+    """测试中文列名的整列转换"""
+    frame = pd.DataFrame({
+        "商品名称": [" 苹果 ", "香蕉"],
+        "价格": [5.5, None],
+        "库存": [10, 3],
+        "描述": ["红富士", None],
+        "条码": [6901234567890, None],
+        "限购数量": [2.0, None],
+    })
+    products, errors = prepare_products(frame, created_at="2025-01-01T00:00:00")
+    assert errors == []
+    apple, banana = products
+    assert apple["name"] == "苹果"
+    assert apple["price"] == 5.5 and isinstance(apple["price"], float)
+    assert apple["stock"] == 10 and isinstance(apple["stock"], int)
+    assert apple["barcode"] == "6901234567890"
+    assert apple["purchase_limit"] == 2
+    assert apple["created_at"] == "2025-01-01T00:00:00"
+    assert banana["price"] == 0.0
+    assert banana["description"] == ""
+    assert banana["purchase_limit"] == 0
+    # 缺失的条码：名称前3个字 + 6位随机串
+    assert banana["barcode"].startswith("香蕉") and len(banana["barcode"]) == 8
+    print("✅ 整列转换正确")
+
+
+def test_invalid_rows_are_reported():
+    """测试名称为空、数值无法转换的行不导入并记入错误报告"""
+    frame = pd.DataFrame({
+        "name": ["可乐", "", "雪碧", None, "芬达"],
+        "price": ["3", "2", "abc", "1", " 4.5 "],
+        "stock": ["1", "2", "3", "4", "x"],
+    })
+    products, errors = prepare_products(frame, start_row=2)
+    assert [product["name"] for product in products] == ["可乐"]
+    assert products[0]["price"] == 3.0
+    assert [(error["行号"], error["字段"]) for error in errors] == [
+        (3, "商品名称"), (4, "价格"), (5, "商品名称"), (6, "库存"),
+    ]
+    assert errors[1]["值"] == "abc"
+    print(f"✅ 错误报告: {errors}")
+
+
+def test_ids_are_unique():
+    """测试批量生成的ID互不重复且避开已有ID"""
+    ids = unique_ids(5000, taken=["00000000"])
+    assert len(set(ids)) == 5000
+    assert all(len(value) == 8 for value in ids)
+
+    frame = pd.DataFrame({"name": [f"商品{i}" for i in range(1000)]})
+    products, _ = prepare_products(frame, existing_ids=["abcdef12"])
+    product_ids = [product["id"] for product in products]
+    assert len(set(product_ids)) == 1000
+    assert "abcdef12" not in product_ids
+    assert len({product["barcode"] for product in products}) == 1000
+
+
+def make_xlsx(rows):
+    """生成xlsx文件内容，中间夹一行空行"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["商品名称", "价格", "库存", "条码"])
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_chunks_cover_every_row():
+    """测试CSV和xlsx按块读取后行数、内容与整体读取一致"""
+    frame = pd.DataFrame({"商品名称": [f"商品{i}" for i in range(25)], "价格": range(25)})
+    source = io.BytesIO(frame.to_csv(index=False).encode("utf-8"))
+    chunks = list(read_chunks(source, "catalog.csv", chunk_size=10))
+    assert [len(chunk) for chunk, _ in chunks] == [10, 10, 5]
+    assert chunks[-1][1] == 1.0
+    assert pd.concat([chunk for chunk, _ in chunks])["价格"].tolist() == list(range(25))
+
+    rows = [[f"商品{i}", i, i % 5, f"69{i:011d}"] for i in range(12)]
+    source = make_xlsx(rows[:5] + [[None, None, None, None]] + rows[5:])
+    chunks = list(read_chunks(source, "catalog.XLSX", chunk_size=5))
+    assert [len(chunk) for chunk, _ in chunks] == [5, 5, 2]
+    assert chunks[0][0].columns.tolist() == ["商品名称", "价格", "库存", "条码"]
+    assert pd.concat([chunk for chunk, _ in chunks])["商品名称"].tolist() == [row[0] for row in rows]
+    # 索引为文件中的位置，空行占一个位置
+    assert chunks[1][0].index.tolist() == [6, 7, 8, 9, 10]
+
+
+def test_stream_products_numbers_rows_across_chunks():
+    """测试分块转换时行号连续、ID跨块不重复"""
+    frame = pd.DataFrame({"name": [f"商品{i}" if i % 7 else "" for i in range(30)], "price": range(30)})
+    source = io.BytesIO(frame.to_csv(index=False).encode("utf-8"))
+    products, errors = [], []
+    for chunk_products, chunk_errors, row_count, _ in stream_products(source, "catalog.csv", chunk_size=8):
+        assert row_count <= 8
+        products.extend(chunk_products)
+        errors.extend(chunk_errors)
+    assert [error["行号"] for error in errors] == [1, 8, 15, 22, 29]
+    assert len(products) == 25
+    assert len({product["id"] for product in products}) == 25
+    assert len({product["created_at"] for product in products}) == 1
+    print(f"✅ 分块导入 {len(products)} 条，错误 {len(errors)} 条")
+
+
+def test_xlsx_row_numbers_count_blank_rows():
+    """测试xlsx中空行之后的错误仍报告文件中的真实行号"""
+    source = make_xlsx([["a", 1], [None, None], [None, 2], ["b", "x"]])
+    errors = [error for _, chunk_errors, _, _ in stream_products(source, "catalog.xlsx", chunk_size=2)
+              for error in chunk_errors]
+    assert [(error["行号"], error["字段"]) for error in errors] == [(3, "商品名称"), (4, "价格")]
+
+
+def test_merger_updates_by_barcode():
+    """测试按条码合并：已有条码只更新价格、库存、限购，新条码插入，无变化的跳过"""
+    existing = [
+        {"id": "a1", "name": "苹果", "price": 5.0, "stock": 10, "description": "红富士", "barcode": "6901", "purchase_limit": 0},
+        {"id": "b2", "name": "香蕉", "price": 3.0, "stock": 4, "description": "", "barcode": "6902", "purchase_limit": 2},
+    ]
+    frame = pd.DataFrame({
+        "商品名称": ["苹果（新名称）", "香蕉", "橙子", "橙子"],
+        "价格": [5.5, 3.0, 4.0, 4.2],
+        "库存": [20, 4, 8, 9],
+        "条码": ["6901", "6902", "6903", "6903"],
+        "限购数量": [0, 2, 1, 1],
+    })
+    products, _ = prepare_products(frame, existing_ids=["a1", "b2"])
+    merger = BarcodeMerger(existing)
+    rows = merger.merge(products)
+
+    apple = rows[0]
+    assert apple["id"] == "a1"
+    assert apple["name"] == "苹果" and apple["description"] == "红富士"
+    assert (apple["price"], apple["stock"]) == (5.5, 20)
+    assert existing[0]["price"] == 5.0  # 不修改传入的现有商品
+    # 文件中重复的新条码原地更新为最后一行，只写入一行、只计一次新增
+    assert len(rows) == 2
+    assert rows[1]["barcode"] == "6903" and rows[1]["price"] == 4.2 and rows[1]["stock"] == 9
+    assert merger.summary == {"inserted": 1, "updated": 1, "unchanged": 1}
+    assert [(change["条码"], change["字段"], change["原值"], change["新值"]) for change in merger.changes] == [
+        ("6901", "价格", 5.0, 5.5), ("6901", "库存", 10, 20),
+    ]
+
+
+def test_merger_counts_each_barcode_once_across_chunks():
+    """测试条码跨块重复出现时沿用同一ID，新增、更新、无变化都按条码只计一次"""
+    existing = [{"id": "a1", "name": "苹果", "price": 5.0, "stock": 10, "barcode": "6901", "purchase_limit": 0}]
+    merger = BarcodeMerger(existing)
+
+    def product(barcode, price, product_id):
+        return {"id": product_id, "name": "商品", "price": price, "stock": 10, "description": "",
+                "barcode": barcode, "purchase_limit": 0, "created_at": "2025-01-01T00:00:00"}
+
+    first = merger.merge([product("6903", 4.0, "n1"), product("6901", 5.0, "n2")])
+    assert [row["id"] for row in first] == ["n1"]
+    # 第二块：新条码改价沿用第一次的ID；现有商品先无变化、后改价，计为更新
+    second = merger.merge([product("6903", 4.5, "n3"), product("6901", 6.0, "n4"), product("6903", 4.5, "n5")])
+    assert [(row["id"], row["price"]) for row in second] == [("n1", 4.5), ("a1", 6.0)]
+    assert merger.summary == {"inserted": 1, "updated": 1, "unchanged": 0}
+    assert merger.merge([product("6901", 6.0, "n6")]) == []
+
+
+def test_reimport_does_not_duplicate():
+    """测试同一份表格按条码合并重复导入时只更新不新增"""
+    db = DatabaseManager(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'merge.db')}")
+    frame = pd.DataFrame({
+        "name": [f"商品{i}" for i in range(50)],
+        "price": [float(i) for i in range(50)],
+        "stock": range(50),
+        "barcode": [f"0{i:05d}" for i in range(50)],
+    })
+
+    def import_file(data):
+        source = io.BytesIO(data.to_csv(index=False).encode("utf-8"))
+        inventory = db.load_inventory()
+        merger = BarcodeMerger(inventory)
+        existing_ids = [product["id"] for product in inventory]
+        for products, _, _, _ in stream_products(source, "catalog.csv", existing_ids, chunk_size=20):
+            db.save_inventory(merger.merge(products))
+        return merger.summary
+
+    assert import_file(frame)["inserted"] == 50
+    ids = {product["barcode"]: product["id"] for product in db.load_inventory()}
+
+    frame.loc[:9, "stock"] = 99
+    summary = import_file(frame)
+    assert summary == {"inserted": 0, "updated": 10, "unchanged": 40}
+    inventory = db.load_inventory()
+    assert len(inventory) == 50
+    assert {product["barcode"]: product["id"] for product in inventory} == ids
+    assert sorted(product["stock"] for product in inventory)[-10:] == [99] * 10
+    print(f"✅ 按条码合并重复导入: {summary}")
+
+
+if __name__ == "__main__":
+    test_aliases_resolve_in_priority_order()
+    test_columns_are_converted()
+    test_invalid_rows_are_reported()
+    test_ids_are_unique()
+    test_chunks_cover_every_row()
+    test_stream_products_numbers_rows_across_chunks()
+    test_xlsx_row_numbers_count_blank_rows()
+    test_merger_updates_by_barcode()
+    test_merger_counts_each_barcode_once_across_chunks()
+    test_reimport_does_not_duplicate()
+    print("🎉 商品导入测试通过")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+商品索引测试脚本
+"""
+
+from product_index import ProductIndex
+
+
+def make_index():
+    return ProductIndex([
+        {"id": "a1", "name": "苹果", "barcode": "6901", "stock": 3},
+        {"id": "b2", "name": "香蕉", "barcode": "6902", "stock": 0},
+        {"id": "c3", "name": "橙子", "barcode": "6901", "stock": 1},
+        {"id": "d4", "name": "梨"},
+    ], version=7)
+
+
+def test_lookup_by_id_and_barcode():
+    """测试按ID和条码查找"""
+    index = make_index()
+    assert index.version == 7
+    assert len(index) == 4
+    assert index.get("b2")["name"] == "香蕉"
+    assert index.get("zz") is None
+    assert "a1" in index
+    # 重复条码保留第一个商品
+    assert index.get_by_barcode("6901")["id"] == "a1"
+    assert index.get_by_barcode("0000") is None
+    print("✅ 按ID和条码查找正确")
+
+
+def test_barcode_of_defaults():
+    """测试条码缺失或商品不存在时返回默认值"""
+    index = make_index()
+    assert index.barcode_of("a1") == "6901"
+    assert index.barcode_of("d4") == "N/A"
+    assert index.barcode_of("zz") == "N/A"
+    assert index.barcode_of("zz", default="zz") == "zz"
+
+
+if __name__ == "__main__":
+    test_lookup_by_id_and_barcode()
+    test_barcode_of_defaults()
+    print("🎉 商品索引测试通过")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+商品目录筛选分页查询测试脚本
+"""
+
+import os
+import tempfile
+
+from database import DatabaseManager
+
+
+def make_db():
+    """创建带测试商品的临时SQLite数据库"""
+    db_file = os.path.join(tempfile.mkdtemp(), "query_products.db")
+    db = DatabaseManager(f"sqlite:///{db_file}")
+    products = [
+        {"id": f"p{i:03d}", "name": f"Apple {i}" if i % 2 else f"香蕉{i}", "price": float(i),
+         "stock": i % 15, "barcode": f"690{i:04d}", "purchase_limit": 2 if i % 5 == 0 else 0,
+         "created_at": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+        for i in range(1, 121)
+    ]
+    products.append({"id": "x1", "name": "100% 果汁", "price": 9.0, "stock": 3, "barcode": "A_1"})
+    db.save_inventory(products)
+    return db
+
+
+def test_filters_match_in_memory_rules():
+    """测试各筛选条件与原来的列表筛选规则一致"""
+    db = make_db()
+    inventory = db.load_inventory()
+    filters = {"name": "apple", "price_min": 10, "price_max": 80, "stock": "low", "limit": "limited"}
+    expected = sorted(
+        p["id"] for p in inventory
+        if "apple" in p["name"].lower() and 10 <= p["price"] <= 80
+        and 1 <= p["stock"] <= 10 and p["purchase_limit"] > 0
+    )
+    result = db.query_products(filters, page_size=1000)
+
+    assert result["total"] == len(expected)
+    assert sorted(p["id"] for p in result["items"]) == expected
+    assert db.query_products({"stock": "out"}, page_size=1000)["total"] == sum(1 for p in inventory if p["stock"] == 0)
+    assert db.query_products({"barcode": "69001"}, page_size=1000)["total"] == sum(1 for p in inventory if p["barcode"].startswith("69001"))
+    assert db.query_products({"barcode": "6900120"})["total"] == 1
+    print(f"✅ 筛选结果一致: {result['total']} 件")
+
+
+def test_like_wildcards_are_escaped():
+    """测试名称和条码中的%和_按普通字符匹配"""
+    db = make_db()
+    assert [p["id"] for p in db.query_products({"name": "100%"})["items"]] == ["x1"]
+    assert [p["id"] for p in db.query_products({"barcode": "A_"})["items"]] == ["x1"]
+    assert db.query_products({"barcode": "A%"})["total"] == 0
+
+
+def test_pagination_and_sort():
+    """测试分页、排序和页码越界"""
+    db = make_db()
+    first = db.query_products(page=1, page_size=50)
+    assert first["total"] == 121
+    assert first["total_pages"] == 3
+    assert len(first["items"]) == 50
+    assert first["items"][0]["id"] == "p001"
+
+    last = db.query_products(page=99, page_size=50)
+    assert last["page"] == 3
+    assert len(last["items"]) == 21
+
+    by_price = db.query_products(sort=["-price"], page_size=3)
+    assert [p["price"] for p in by_price["items"]] == [120.0, 119.0, 118.0]
+
+    empty = db.query_products({"name": "不存在"})
+    assert empty["total"] == 0 and empty["items"] == [] and empty["page"] == 1
+
+
+def test_rejects_unknown_filter_and_sort():
+    """测试不支持的筛选条件和排序字段"""
+    db = make_db()
+    for kwargs in ({"filters": {"color": "red"}}, {"filters": {"stock": "many"}}, {"sort": ["password"]}):
+        try:
+            db.query_products(**kwargs)
+            assert False, f"应当拒绝: {kwargs}"
+        except ValueError:
+            pass
+
+
+def test_product_stats():
+    """测试商品总数和价格范围"""
+    stats = make_db().get_product_stats()
+    assert stats == {"count": 121, "min_price": 1.0, "max_price": 120.0}
+
+
+if __name__ == "__main__":
+    test_filters_match_in_memory_rules()
+    test_like_wildcards_are_escaped()
+    test_pagination_and_sort()
+    test_rejects_unknown_filter_and_sort()
+    test_product_stats()
+    print("🎉 商品目录查询测试通过")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+数据库结构版本与快速启动测试脚本
+"""
+
+import os
+import tempfile
+
+import database
+from database import DatabaseManager, SchemaVersion, SCHEMA_VERSION
+
+
+class CountingManager(DatabaseManager):
+    """记录初始化次数的数据库管理器"""
+    bootstrap_calls = 0
+
+    def bootstrap_schema(self):
+        CountingManager.bootstrap_calls += 1
+        super().bootstrap_schema()
+
+
+def reconnect(url):
+    """模拟进程重启：丢弃共享引擎后重新连接"""
+    shared = database._engines.pop(url, None)
+    if shared:
+        shared[0].dispose()
+    return CountingManager(url)
+
+
+def test_bootstrap_runs_once():
+    """测试只有首次启动才建表和初始化管理员"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'schema.db')}"
+    CountingManager.bootstrap_calls = 0
+
+    db = reconnect(url)
+    assert CountingManager.bootstrap_calls == 1
+    assert db.get_schema_version() == SCHEMA_VERSION
+    assert any(user["name"] == "管理员666" for user in db.load_users())
+
+    reconnect(url)
+    assert CountingManager.bootstrap_calls == 1
+    print("✅ 已初始化的数据库启动时跳过建表")
+
+
+def test_outdated_version_bootstraps_again():
+    """测试结构版本落后时重新初始化"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'schema_old.db')}"
+    db = reconnect(url)
+    session = db.get_session()
+    try:
+        session.query(SchemaVersion).update({"version": SCHEMA_VERSION - 1})
+        session.commit()
+    finally:
+        session.close()
+
+    CountingManager.bootstrap_calls = 0
+    db = reconnect(url)
+    assert CountingManager.bootstrap_calls == 1
+    assert db.get_schema_version() == SCHEMA_VERSION
+
+
+if __name__ == "__main__":
+    test_bootstrap_runs_once()
+    test_outdated_version_bootstraps_again()
+    print("🎉 结构版本测试通过")
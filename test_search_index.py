@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+商品搜索索引测试脚本
+"""
+
+from search_index import BarcodeIndex, NGramIndex
+
+
+def make_products():
+    return [
+        {"id": "a", "name": "有机纯牛奶", "description": "250ml 整箱"},
+        {"id": "b", "name": "牛奶", "description": ""},
+        {"id": "c", "name": "牛奶巧克力", "description": "进口"},
+        {"id": "d", "name": "酸奶", "description": "含牛奶成分"},
+        {"id": "e", "name": "Green Tea 绿茶", "description": ""},
+        {"id": "f", "name": "牛肉干", "description": "奶香味"},
+    ]
+
+
+def test_search_matches_substring_rule():
+    """测试结果与子串包含判断一致，且不会把非连续的字误判为命中"""
+    index = NGramIndex()
+    index.sync(make_products())
+    assert set(index.search("牛奶")) == {"a", "b", "c", "d"}
+    assert index.search("纯牛奶") == ["a"]
+    assert index.search("牛奶干") == []
+    assert index.search("奶") and "f" in index.search("奶")
+    assert index.search("green") == ["e"]
+    assert index.search("  ") == []
+    print("✅ 搜索结果与子串匹配一致")
+
+
+def test_multi_term_and_ranking():
+    """测试多关键词同时命中，并按匹配质量排序"""
+    index = NGramIndex()
+    index.sync(make_products())
+    # 名称完全相同 > 名称开头 > 名称包含 > 仅描述包含
+    assert index.search("牛奶") == ["b", "c", "a", "d"]
+    assert index.search("牛奶 进口") == ["c"]
+    assert index.search("奶 整箱") == ["a"]
+
+
+def test_incremental_sync():
+    """测试只更新变化的商品"""
+    index = NGramIndex()
+    products = make_products()
+    assert index.sync(products, version=1) == 6
+    assert index.sync(products, version=1) == 0
+
+    products[1] = {"id": "b", "name": "豆浆", "description": ""}
+    products.pop()
+    products.append({"id": "g", "name": "鲜牛奶", "description": ""})
+    assert index.sync(products, version=2) == 3
+    assert "b" not in index.search("牛奶")
+    assert "g" in index.search("牛奶")
+    assert index.search("牛肉") == []
+    assert len(index) == 6
+
+
+def make_barcode_index():
+    index = BarcodeIndex()
+    index.sync([
+        {"id": "a", "barcode": "6901234567892"},
+        {"id": "b", "barcode": "6901234567885"},
+        {"id": "c", "barcode": "6921234567890"},
+        {"id": "d", "barcode": "690123"},
+        {"id": "e", "barcode": ""},
+        {"id": "f"},
+    ], version=1)
+    return index
+
+
+def test_barcode_exact_and_prefix():
+    """测试扫码精确匹配和前几位前缀匹配"""
+    index = make_barcode_index()
+    assert len(index) == 4
+    assert index.lookup("6901234567892") == ["a"]
+    assert index.prefix("690123") == ["d", "b", "a"]
+    # 完全相同的条码排在最前，其余前缀匹配仍然返回
+    assert index.lookup("690123") == ["d", "b", "a"]
+    assert index.lookup("6901234") == ["b", "a"]
+    assert index.lookup("69") == ["d", "b", "a", "c"]
+    assert index.lookup("7") == []
+    assert index.lookup(" ") == []
+    print("✅ 条码精确匹配和前缀匹配正确")
+
+
+def test_barcode_incremental_sync():
+    """测试条码变化时增量更新"""
+    index = make_barcode_index()
+    products = [
+        {"id": "a", "barcode": "6901234567892"},
+        {"id": "b", "barcode": "6931234567880"},
+        {"id": "c", "barcode": "6921234567890"},
+        {"id": "d", "barcode": "690123"},
+        {"id": "e", "barcode": ""},
+        {"id": "f"},
+    ] + [{"id": f"x{i}", "barcode": f"800{i:010d}"} for i in range(40)]
+    index.sync(products, version=2)
+    products[1]["barcode"] = "6901234567885"
+    products[3]["barcode"] = ""
+    assert index.sync(products, version=3) == 2
+    assert index.lookup("690") == ["b", "a"]
+    assert index.exact("690123") == []
+    assert index.prefix("8000000000003") == ["x3"]
+
+
+if __name__ == "__main__":
+    test_search_matches_substring_rule()
+    test_multi_term_and_ranking()
+    test_incremental_sync()
+    test_barcode_exact_and_prefix()
+    test_barcode_incremental_sync()
+    print("🎉 搜索索引测试通过")
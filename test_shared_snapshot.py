@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+共享只读快照测试脚本
+"""
+
+import threading
+
+from shared_snapshot import SharedSnapshot, freeze
+
+
+class Loader:
+    """记录调用次数的假数据源"""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [dict(record, items=list(record.get("items", []))) for record in self.records]
+
+
+def make_records():
+    return [
+        {"id": "a1", "name": "苹果", "price": 5.0, "items": [{"q": 1}]},
+        {"id": "b2", "name": "香蕉", "price": 3.0},
+    ]
+
+
+def test_same_version_returns_same_object():
+    """测试同一版本的所有读取共享同一份快照，只加载一次"""
+    loader = Loader(make_records())
+    snapshot = SharedSnapshot(loader, key="id")
+
+    first = snapshot.get(1)
+    assert snapshot.get(1) is first
+    assert loader.calls == 1
+    assert snapshot.version == 1
+    assert [row["id"] for row in first] == ["a1", "b2"]
+    print("✅ 同一版本只加载一次并共享")
+
+
+def test_rows_are_read_only():
+    """测试快照中的记录（含嵌套列表和字典）不可修改"""
+    rows = SharedSnapshot(Loader(make_records()), key="id").get(1)
+    for mutate in (
+        lambda: rows[0].__setitem__("price", 1),
+        lambda: rows[0]["items"][0].__setitem__("q", 9),
+        lambda: rows[0]["items"].append({}),
+    ):
+        try:
+            mutate()
+            assert False, "快照应当只读"
+        except (TypeError, AttributeError):
+            pass
+    # 调用方复制后可以自由修改
+    product = dict(rows[0])
+    product["sold"] = 3
+    assert "sold" not in rows[0]
+    print("✅ 快照记录只读")
+
+
+def test_new_version_reuses_unchanged_rows():
+    """测试版本变化时整体替换快照，未变化的行复用原对象"""
+    loader = Loader(make_records())
+    snapshot = SharedSnapshot(loader, key="id")
+    old = snapshot.get(1)
+
+    loader.records[1]["price"] = 3.5
+    loader.records.append({"id": "c3", "name": "橙子", "price": 8.0})
+    new = snapshot.get(2)
+
+    assert new is not old
+    assert new[0] is old[0]
+    assert new[1] is not old[1] and new[1]["price"] == 3.5
+    assert old[1]["price"] == 3.0  # 旧快照的读者不受影响
+    assert len(new) == 3 and len(old) == 2
+
+
+def test_stale_version_does_not_reload():
+    """测试持有旧版本号的会话不会触发重新加载，也不会把新数据记为旧版本"""
+    loader = Loader(make_records())
+    snapshot = SharedSnapshot(loader, key="id")
+    snapshot.get(1)
+    newer = snapshot.get(2)
+
+    # 两个会话交替使用旧版本号和新版本号读取
+    for _ in range(3):
+        assert snapshot.get(1) is newer
+        assert snapshot.get(2) is newer
+    assert loader.calls == 2
+    assert snapshot.version == 2
+
+
+def test_concurrent_readers_load_once():
+    """测试多个会话同时读取新版本时只加载一次"""
+    loader = Loader(make_records())
+    snapshot = SharedSnapshot(loader, key="id")
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(snapshot.get(5))) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_freeze():
+    """测试递归冻结"""
+    frozen = freeze({"a": [1, {"b": 2}], "c": "x"})
+    assert frozen == {"a": (1, {"b": 2}), "c": "x"}
+    assert isinstance(frozen["a"], tuple)
+
+
+if __name__ == "__main__":
+    test_same_version_returns_same_object()
+    test_rows_are_read_only()
+    test_new_version_reuses_unchanged_rows()
+    test_stale_version_does_not_reload()
+    test_concurrent_readers_load_once()
+    test_freeze()
+    print("🎉 共享快照测试通过")